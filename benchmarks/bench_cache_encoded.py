@@ -0,0 +1,78 @@
+"""
+Cache 200 gzipped text pages with and without `encoded_at_rest`, and compare
+the bytes the cache holds and the time to read the 50 most visited pages
+back 20 times.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cache_encoded
+"""
+
+import gzip
+import time
+
+from browser.cache import MemoryCache
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.url import HttpFamilyUrl, Url
+
+PAGES = 200
+HOT_PAGES = 50
+READS = 20
+FRESHNESS = Freshness(lifetime=3600, initial_age=0, response_time=time.time())
+
+
+def _page(i: int) -> HttpResponse:
+    body = b"".join(
+        b"<p>Paragraph %d of page %d, with some ordinary prose in it.</p>\n" % (n, i)
+        for n in range(500)
+    )
+    return HttpResponse(
+        version="HTTP/1.1",
+        status_code=200,
+        status_message="OK",
+        headers=HeaderMap({"content-type": "text/html", "content-encoding": "gzip"}),
+        body=body,
+        request=HttpRequest(method="GET", path=f"/{i}", headers={}),
+        encoded_body=gzip.compress(body),
+    )
+
+
+def _url(i: int) -> HttpFamilyUrl:
+    url = HttpFamilyUrl.from_url(Url.parse(f"http://example.com/{i}"))
+    assert url is not None
+    return url
+
+
+def _measure(cache: MemoryCache) -> tuple[int, float]:
+    urls = [_url(i) for i in range(PAGES)]
+    for i, url in enumerate(urls):
+        cache.set(url, _page(i), FRESHNESS)
+    start = time.perf_counter()
+    for _ in range(READS):
+        for url in urls[:HOT_PAGES]:
+            entry = cache.lookup(url)
+            assert entry is not None
+    return cache.stats().bytes, time.perf_counter() - start
+
+
+def main() -> None:
+    decoded_size = len(_page(0).body)
+    encoded_size = len(_page(0).encoded_body or b"")
+    print(
+        f"{PAGES} pages of {decoded_size // 1000} kB, {encoded_size // 1000} kB gzipped"
+    )
+    print(f"{'bodies':<24}{'cache bytes':>14}{'reads':>10}")
+    for name, cache in (
+        ("decoded", MemoryCache()),
+        ("encoded, no LRU", MemoryCache(encoded_at_rest=True, decoded_bytes=0)),
+        ("encoded, 4 MiB LRU", MemoryCache(encoded_at_rest=True)),
+    ):
+        size, seconds = _measure(cache)
+        print(f"{name:<24}{size:>14,}{seconds * 1e3:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
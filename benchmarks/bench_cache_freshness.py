@@ -0,0 +1,124 @@
+"""
+Replay a corpus of responses and the times they were requested again, and
+count how many repeat requests the cache answers under:
+
+- the old policy: only responses with Cache-Control are stored, for their
+  max-age or else 5 seconds,
+- the RFC 9111 freshness model of browser.protocols.http.freshness.
+
+"wrong" counts repeats answered from the cache while the response was stale
+according to RFC 9111, e.g. no-cache responses or an Expires in the past.
+
+The corpus is JSON lines of {"status": 200, "headers": {...}, "revisits":
+[seconds after the first response, ...]}, with header names in lower case
+and dates relative to the first response given as {"date": "+0"} or
+{"expires": "+3600"}. Without --corpus, a corpus with a seeded mix of common
+caching headers is generated. Run from the repository root:
+
+    python -m benchmarks.bench_cache_freshness [--corpus responses.jsonl]
+"""
+
+import argparse
+import json
+import random
+from email.utils import formatdate
+
+from browser.protocols.http.freshness import calculate_freshness
+from browser.protocols.http.headers.cache_control.response import (
+    MaxAge,
+    NoStore,
+    parse_response_cache_control,
+)
+
+START = 1_700_000_000
+DAY = 24 * 60 * 60
+
+# Share of the generated corpus, and headers relative to the response time
+PROFILES: list[tuple[float, dict[str, str]]] = [
+    (0.25, {"cache-control": "public, max-age=31536000", "date": "+0"}),
+    (0.10, {"cache-control": "max-age=300", "date": "+0"}),
+    (0.10, {"expires": "+86400", "date": "+0"}),
+    (0.08, {"cache-control": "public", "expires": "+3600", "date": "+0"}),
+    (0.15, {"last-modified": "-2592000", "date": "+0"}),
+    (0.10, {"cache-control": "no-cache", "date": "+0"}),
+    (0.05, {"cache-control": "private, no-store", "date": "+0"}),
+    (0.05, {"cache-control": "public", "expires": "-3600", "date": "+0"}),
+    (0.12, {"date": "+0"}),
+]
+
+
+def _generate(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in PROFILES]
+    corpus = []
+    for _ in range(count):
+        (_, headers), *_ = rng.choices(PROFILES, weights)
+        # Revisits during a browsing session, most of them minutes apart
+        revisits, elapsed = [], 0.0
+        for _ in range(rng.randint(1, 6)):
+            elapsed += rng.expovariate(1 / 900)
+            revisits.append(elapsed)
+        corpus.append({"status": 200, "headers": headers, "revisits": revisits})
+    return corpus
+
+
+def _resolve_dates(headers: dict[str, str]) -> dict[str, str]:
+    resolved = {}
+    for name, value in headers.items():
+        if name in ("date", "expires", "last-modified") and value[:1] in "+-":
+            value = formatdate(START + int(value), usegmt=True)
+        resolved[name] = value
+    return resolved
+
+
+def _old_lifetime(headers: dict[str, str]) -> float:
+    # HttpHandler before the freshness model
+    if (cache_control := headers.get("cache-control")) is None:
+        return 0
+    directives = parse_response_cache_control(cache_control)
+    if any(isinstance(d, NoStore) for d in directives):
+        return 0
+    max_age = next((d for d in directives if isinstance(d, MaxAge)), None)
+    return max_age.delta_seconds if max_age is not None else 5
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="JSON lines of recorded responses")
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus) as corpus_file:
+            corpus = [json.loads(line) for line in corpus_file if line.strip()]
+    else:
+        corpus = _generate(args.count, args.seed)
+
+    repeats = old_hits = old_wrong = new_hits = 0
+    for record in corpus:
+        headers = _resolve_dates(record["headers"])
+        freshness = calculate_freshness(record["status"], headers, START, START)
+        cacheable = not any(
+            isinstance(d, NoStore)
+            for d in parse_response_cache_control(headers.get("cache-control", ""))
+        )
+        old_lifetime = _old_lifetime(headers)
+        for offset in record["revisits"]:
+            repeats += 1
+            fresh = cacheable and freshness.is_fresh(START + offset)
+            new_hits += fresh
+            if offset < old_lifetime:
+                old_hits += 1
+                old_wrong += not fresh
+
+    print(f"{len(corpus)} responses, {repeats} repeat requests")
+    print(f"{'policy':<20}{'hits':>8}{'hit rate':>10}{'wrong':>8}")
+    print(
+        f"{'max-age or 5s':<20}{old_hits:>8}{old_hits / repeats:>10.1%}{old_wrong:>8}"
+    )
+    print(f"{'RFC 9111':<20}{new_hits:>8}{new_hits / repeats:>10.1%}{0:>8}")
+
+
+if __name__ == "__main__":
+    main()
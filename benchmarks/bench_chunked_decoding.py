@@ -0,0 +1,108 @@
+"""
+Receive 10,000-chunk responses from a local server with Connection.request and
+with the makefile()/readline() decoder it replaced, which grew the body with
+`body += chunk`.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_chunked_decoding
+"""
+
+import socket
+import socketserver
+import threading
+import time
+
+from browser.connection import Connection
+from browser.protocols.http.request import HttpRequest, HttpRequestEncoder
+
+CHUNK_COUNT = 10_000
+
+
+def _chunked_response(chunk_size: int) -> bytes:
+    chunk = b"%x\r\n%s\r\n" % (chunk_size, b"x" * chunk_size)
+    return (
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        + chunk * CHUNK_COUNT
+        + b"0\r\n\r\n"
+    )
+
+
+def _serve(response: bytes) -> socketserver.ThreadingTCPServer:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                while (line := self.rfile.readline()) not in (b"\r\n", b""):
+                    pass
+                if not line:
+                    return
+                self.wfile.write(response)
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_request(sock: socket.socket, reader, request: bytes) -> bytes:
+    sock.sendall(request)
+    reader.readline()
+    headers = dict[str, str]()
+    while (line := reader.readline()) != b"\r\n":
+        name, value = line.decode("iso-8859-1").split(":", 1)
+        headers[name.strip().casefold()] = value.strip()
+
+    body = b""
+    while (line := reader.readline()) != b"\r\n":
+        content_length = int(line.decode("iso-8859-1").strip(), 16)
+        if content_length == 0:
+            break
+        body += reader.read(content_length + 2).strip()
+    # The old decoder left the final CRLF unread, which breaks keep-alive
+    reader.readline()
+    return body
+
+
+def main() -> None:
+    request = HttpRequest(
+        method="GET",
+        path="/",
+        headers={"Host": "127.0.0.1", "Connection": "keep-alive"},
+        version="1.1",
+    )
+    repeat = 5
+    print(
+        f"{'chunk size':<12}{'body':>10}{'legacy':>12}{'Connection':>12}{'speedup':>10}"
+    )
+    for chunk_size in (16, 256, 1024):
+        server = _serve(_chunked_response(chunk_size))
+        port = server.server_address[1]
+
+        sock = socket.create_connection(("127.0.0.1", port))
+        reader = sock.makefile("rb")
+        encoded = HttpRequestEncoder().encode(request)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            legacy_body = legacy_request(sock, reader, encoded)
+        legacy = (time.perf_counter() - start) / repeat
+        sock.close()
+
+        connection = Connection.open("http", "127.0.0.1", port)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = connection.request(request).body
+        current = (time.perf_counter() - start) / repeat
+        connection.close()
+
+        server.shutdown()
+        server.server_close()
+
+        assert body == legacy_body
+        print(
+            f"{chunk_size:<12}{len(body) // 1024:>8}KB"
+            f"{legacy * 1e3:>10.1f}ms{current * 1e3:>10.1f}ms{legacy / current:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Load 50 pages in a freshly started process, like a batch job, with the
+in-memory cache and with a DiskCache left by a previous run.
+
+Every load runs in a new Python process. The local server holds every
+response back for an artificial round trip time, like a distant server.
+Run from the repository root:
+
+    python -m benchmarks.bench_disk_cache
+"""
+
+import argparse
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from browser.cache import MemoryCache
+from browser.disk_cache import DiskCache
+from browser.protocols.http.handler import HttpHandler
+from browser.url import Url
+
+PAGES = 50
+BODY = b"x" * 20_000
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\nCache-Control: max-age=3600\r\n"
+    b"Content-Type: text/plain\r\nContent-Length: %d\r\n\r\n%s" % (len(BODY), BODY)
+)
+
+
+def _serve(rtt: float) -> socketserver.ThreadingTCPServer:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while line := self.rfile.readline():
+                # Answer at the blank line ending each request head
+                if line == b"\r\n":
+                    time.sleep(rtt)
+                    self.wfile.write(RESPONSE)
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _load(port: int, directory: str | None) -> None:
+    # In the child process: print the seconds taken by the page loads
+    cache = MemoryCache() if directory is None else DiskCache(directory)
+    handler = HttpHandler(cache=cache)
+    start = time.perf_counter()
+    for i in range(PAGES):
+        handler.fetch(Url.parse(f"http://127.0.0.1:{port}/{i}"))
+    print(time.perf_counter() - start)
+
+
+def _start(port: int, directory: str | None = None) -> float:
+    command = [sys.executable, "-m", "benchmarks.bench_disk_cache", "--load", str(port)]
+    if directory is not None:
+        command += ["--directory", directory]
+    output = subprocess.run(command, capture_output=True, check=True, text=True)
+    return float(output.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.load is not None:
+        _load(args.load, args.directory)
+        return
+
+    print(f"{PAGES} pages of {len(BODY) // 1000} kB, one process start each")
+    print(f"{'RTT':<8}{'memory':>10}{'disk, cold':>12}{'disk, warm':>12}")
+    for rtt in (0.005, 0.02, 0.05):
+        server = _serve(rtt)
+        port = server.server_address[1]
+        with tempfile.TemporaryDirectory() as directory:
+            memory = _start(port)
+            cold = _start(port, directory)
+            warm = _start(port, directory)
+        server.shutdown()
+        server.server_close()
+        print(
+            f"{rtt * 1e3:>4.0f}ms{memory * 1e3:>10.0f}ms{cold * 1e3:>10.0f}ms"
+            f"{warm * 1e3:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Fetch the subresources of a page over a saturated link: 60 images found
+first in the document, then 4 stylesheets and 2 scripts. Compare how long
+the stylesheets and scripts take when every fetch has the same priority
+(first come, first served) and when each has the priority of its type.
+
+Fetches are simulated: each holds one of 6 slots for 20ms, like requests on
+the 6 connections to one host. Run from the repository root:
+
+    python -m benchmarks.bench_fetch_scheduler
+"""
+
+import time
+
+from browser.scheduler import FetchScheduler, Priority
+from browser.url import Url
+
+FETCH_SECONDS = 0.02
+SLOTS = 6
+RESOURCES = (
+    [("image", Priority.IMAGE)] * 60
+    + [("stylesheet", Priority.STYLESHEET)] * 4
+    + [("script", Priority.SCRIPT)] * 2
+)
+
+
+def _fetch(url: Url) -> float:
+    time.sleep(FETCH_SECONDS)
+    return time.perf_counter()
+
+
+def _load(prioritized: bool) -> tuple[float, float]:
+    """Seconds until the critical resources are fetched, and until all are."""
+    scheduler = FetchScheduler(_fetch, max_per_host=SLOTS, max_total=SLOTS)
+    start = time.perf_counter()
+    scheduled = [
+        (
+            kind,
+            scheduler.submit(
+                Url(scheme="http", host="example.com", path=f"/{kind}/{i}"),
+                priority if prioritized else Priority.DOCUMENT,
+            ),
+        )
+        for i, (kind, priority) in enumerate(RESOURCES)
+    ]
+    scheduler.shutdown()
+    critical = max(fetch.result() for kind, fetch in scheduled if kind != "image")
+    done = max(fetch.result() for _, fetch in scheduled)
+    return critical - start, done - start
+
+
+def main() -> None:
+    print(f"{len(RESOURCES)} fetches of {FETCH_SECONDS * 1e3:.0f}ms on {SLOTS} slots")
+    print(f"{'order':<22}{'critical':>10}{'all':>10}")
+    for name, prioritized in (("first come", False), ("by priority", True)):
+        critical, done = _load(prioritized)
+        print(f"{name:<22}{critical * 1e3:>8.0f}ms{done * 1e3:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Fetch 100 resources of one origin from 100 threads at once, over HTTP/1.1
+(at most 6 connections, one request at a time each) and over one multiplexed
+HTTP/2 connection.
+
+The local server holds every response back for an artificial round trip
+time, like a distant server. Needs the openssl command. Run from the
+repository root:
+
+    python -m benchmarks.bench_http2
+"""
+
+import ssl
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from benchmarks.bench_tls_resumption import _make_certificate
+from browser import connection, tls
+from browser.protocols.http.request import HttpRequest
+from browser.url import HttpFamilyUrl, Url
+from tests.h2_server import H2Server
+
+RESOURCES = 100
+BODY = b"x" * 2048
+
+
+def _fetch_all(port: int) -> float:
+    def fetch(i: int) -> None:
+        url = HttpFamilyUrl.from_url(Url.parse(f"https://127.0.0.1:{port}/{i}"))
+        assert isinstance(url, HttpFamilyUrl)
+        request = HttpRequest(
+            method="GET",
+            path=f"/{i}",
+            headers={"Host": "127.0.0.1", "Connection": "keep-alive"},
+            version="1.1",
+        )
+        assert connection.request_http(url, request).body == BODY
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=RESOURCES) as executor:
+        list(executor.map(fetch, range(RESOURCES)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = _make_certificate(Path(directory))
+        tls.configure_tls(partial(ssl.create_default_context, cafile=certfile))
+
+        print(f"{'RTT':<8}{'HTTP/1.1':>10}{'conns':>7}{'HTTP/2':>10}{'conns':>7}")
+        for rtt in (0.005, 0.02, 0.05):
+            results = []
+            for http2 in (False, True):
+                connection.HTTP2_ENABLED = http2
+                server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                server_context.load_cert_chain(certfile, keyfile)
+                with H2Server(
+                    lambda _: (200, [], BODY), server_context, delay=rtt
+                ) as server:
+                    elapsed = _fetch_all(server.port)
+                results.append((elapsed, server.connections))
+            (h1, h1_connections), (h2, h2_connections) = results
+            print(
+                f"{rtt * 1e3:>4.0f}ms{h1 * 1e3:>10.0f}ms{h1_connections:>5}"
+                f"{h2 * 1e3:>8.0f}ms{h2_connections:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare the sans-IO HttpResponseParser with the readline() parser that
+Connection.request used before.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_http_parser
+"""
+
+import io
+import timeit
+
+from browser.protocols.http.parser import BodyChunk, HttpResponseParser
+
+RECEIVE_BUFFER_SIZE = 64 * 1024
+
+
+def _large_headers(count: int) -> bytes:
+    head = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n"
+    head += b"".join(f"X-Header-{i}: {'v' * 40}\r\n".encode() for i in range(count))
+    return head + b"\r\nok"
+
+
+def _chunked(count: int, size: int) -> bytes:
+    chunk = f"{size:x}\r\n".encode() + b"x" * size + b"\r\n"
+    return (
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        + chunk * count
+        + b"0\r\n\r\n"
+    )
+
+
+def readline_parse(raw: bytes) -> bytes:
+    """The parser Connection.request used, reading from a makefile() reader."""
+    reader = io.BufferedReader(io.BytesIO(raw))
+    reader.readline()
+    headers = dict[str, str]()
+    while (line := reader.readline()) != b"\r\n":
+        name, value = line.decode("iso-8859-1").split(":", 1)
+        headers[name.strip().casefold()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while (line := reader.readline()) != b"\r\n":
+            content_length = int(line.decode("iso-8859-1").strip(), 16)
+            if content_length == 0:
+                break
+            body += reader.read(content_length + 2).strip()
+        return body
+    return reader.read(int(headers["content-length"]))
+
+
+def sans_io_parse(raw: bytes) -> bytes:
+    """Feed the response in socket-sized reads, as Connection.request does."""
+    parser = HttpResponseParser()
+    chunks = []
+    view = memoryview(raw)
+    for i in range(0, len(raw), RECEIVE_BUFFER_SIZE):
+        for event in parser.feed(view[i : i + RECEIVE_BUFFER_SIZE]):
+            if isinstance(event, BodyChunk):
+                chunks.append(event.data)
+    return b"".join(chunks)
+
+
+def main() -> None:
+    cases = {
+        "1,000 headers": _large_headers(1_000),
+        "10,000 x 16 B chunks": _chunked(10_000, 16),
+        "1,000 x 4 KiB chunks": _chunked(1_000, 4096),
+    }
+    print(f"{'case':<24}{'readline':>12}{'sans-io':>12}{'speedup':>10}")
+    for name, raw in cases.items():
+        assert readline_parse(raw) == sans_io_parse(raw)
+        number = 20
+        old = min(
+            timeit.repeat(lambda raw=raw: readline_parse(raw), number=number, repeat=5)
+        )
+        new = min(
+            timeit.repeat(lambda raw=raw: sans_io_parse(raw), number=number, repeat=5)
+        )
+        print(
+            f"{name:<24}{old / number * 1e3:>10.2f}ms{new / number * 1e3:>10.2f}ms"
+            f"{old / new:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Fetch 32 small resources from a local server that adds an artificial round
+trip time, one request per round trip and pipelined.
+
+The server sleeps for one RTT every time request bytes arrive, then answers
+every complete request it has, like a distant server answering one flight of
+requests.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipelining
+"""
+
+import socketserver
+import threading
+import time
+
+from browser.connection import PIPELINE_DEPTH, Connection
+from browser.protocols.http.request import HttpRequest
+
+RESOURCES = 32
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+
+def _serve(rtt: float) -> socketserver.ThreadingTCPServer:
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            buffer = b""
+            while data := self.request.recv(65536):
+                time.sleep(rtt)
+                buffer += data
+                *heads, buffer = buffer.split(b"\r\n\r\n")
+                self.request.sendall(RESPONSE * len(heads))
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    requests = [
+        HttpRequest(
+            method="GET",
+            path=f"/{i}",
+            headers={"Host": "127.0.0.1", "Connection": "keep-alive"},
+            version="1.1",
+        )
+        for i in range(RESOURCES)
+    ]
+    print(f"{'RTT':<8}{'sequential':>12}{'pipelined':>12}{'round trips':>14}")
+    for rtt in (0.005, 0.02, 0.05):
+        server = _serve(rtt)
+        port = server.server_address[1]
+
+        connection = Connection.open("http", "127.0.0.1", port)
+        start = time.perf_counter()
+        for request in requests:
+            connection.request(request)
+        sequential = time.perf_counter() - start
+        connection.close()
+
+        connection = Connection.open("http", "127.0.0.1", port)
+        start = time.perf_counter()
+        for i in range(0, RESOURCES, PIPELINE_DEPTH):
+            connection.request_pipelined(requests[i : i + PIPELINE_DEPTH])
+        pipelined = time.perf_counter() - start
+        connection.close()
+
+        server.shutdown()
+        server.server_close()
+        print(
+            f"{rtt * 1e3:>4.0f}ms{sequential * 1e3:>12.0f}ms{pipelined * 1e3:>10.0f}ms"
+            f"{round(sequential / rtt):>7} -> {round(pipelined / rtt)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Look up cached responses from 1 to 8 threads at once, in one MemoryCache and
+in a ShardedMemoryCache, and report the lookups per second.
+
+Threads only run in parallel on a free-threaded build of Python (3.14t); with
+the GIL, this measures the cost of the locks. Run from the repository root:
+
+    python -m benchmarks.bench_sharded_cache
+"""
+
+import sys
+import threading
+import time
+
+from browser.cache import HttpCache, MemoryCache, ShardedMemoryCache
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.url import HttpFamilyUrl, Url
+
+URLS = 1000
+LOOKUPS = 200_000
+
+
+def _fill(cache: HttpCache) -> list[HttpFamilyUrl]:
+    urls = []
+    for i in range(URLS):
+        url = HttpFamilyUrl.from_url(Url.parse(f"http://example.com/{i}"))
+        assert url is not None
+        response = HttpResponse(
+            version="HTTP/1.1",
+            status_code=200,
+            status_message="OK",
+            headers=HeaderMap({"cache-control": "max-age=3600"}),
+            body=b"page %d" % i,
+            request=HttpRequest(method="GET", path=f"/{i}", headers={}),
+        )
+        cache.set(url, response, Freshness(3600, 0, time.time()))
+        urls.append(url)
+    return urls
+
+
+def _measure(cache: HttpCache, urls: list[HttpFamilyUrl], threads: int) -> float:
+    start = threading.Barrier(threads + 1)
+
+    def work(offset: int) -> None:
+        start.wait()
+        for i in range(LOOKUPS // threads):
+            cache.lookup(urls[(i + offset) % URLS])
+
+    workers = [
+        threading.Thread(target=work, args=(thread * 97,)) for thread in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return LOOKUPS / (time.perf_counter() - began)
+
+
+def main() -> None:
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    print(f"{'threads':<10}{'MemoryCache':>18}{'ShardedMemoryCache':>22}")
+    caches = [MemoryCache(), ShardedMemoryCache()]
+    urls = [_fill(cache) for cache in caches]
+    for threads in (1, 2, 4, 8):
+        rates = [_measure(cache, u, threads) for cache, u in zip(caches, urls)]
+        print(f"{threads:<10}{rates[0]:>16,.0f}/s{rates[1]:>20,.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Open HTTPS connections to a local TLS server with a self-signed certificate,
+comparing:
+
+- a new SSLContext per connection, as Connection.open used to do,
+- the shared context with full handshakes only,
+- the shared context resuming cached sessions.
+
+Needs the openssl command. Run from the repository root:
+
+    python -m benchmarks.bench_tls_resumption
+"""
+
+import socket
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+from browser import tls
+from browser.connection import Connection
+from browser.protocols.http.request import HttpRequest
+
+CONNECTIONS = 200
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+
+def _make_certificate(directory: Path) -> tuple[Path, Path]:
+    certfile, keyfile = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-days", "1", "-subj", "/CN=127.0.0.1",
+            "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", keyfile, "-out", certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return certfile, keyfile
+
+
+def _serve(context: ssl.SSLContext) -> socketserver.ThreadingTCPServer:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            while True:
+                while (line := self.rfile.readline()) not in (b"\r\n", b""):
+                    pass
+                if not line:
+                    return
+                self.wfile.write(RESPONSE)
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _request() -> HttpRequest:
+    return HttpRequest(
+        method="GET",
+        path="/",
+        headers={"Host": "127.0.0.1", "Connection": "keep-alive"},
+        version="1.1",
+    )
+
+
+def context_per_connection(port: int, cafile: Path) -> None:
+    sock = socket.create_connection(("127.0.0.1", port))
+    context = ssl.create_default_context(cafile=cafile)
+    connection = Connection(context.wrap_socket(sock, server_hostname="127.0.0.1"))
+    connection.request(_request())
+    connection.close()
+
+
+def shared_context(port: int, resume: bool) -> None:
+    if not resume:
+        for sessions in tls._state.sessions.values():
+            sessions.clear()
+    connection = Connection.open("https", "127.0.0.1", port)
+    connection.request(_request())
+    connection.close()
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = _make_certificate(Path(directory))
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(certfile, keyfile)
+        server = _serve(server_context)
+        port = server.server_address[1]
+        tls.configure_tls(partial(ssl.create_default_context, cafile=certfile))
+
+        cases = {
+            "context per connection": lambda: context_per_connection(port, certfile),
+            "shared, full handshakes": lambda: shared_context(port, resume=False),
+            "shared, resumed sessions": lambda: shared_context(port, resume=True),
+        }
+        print(f"{'':<28}{'per connection':>16}{'full':>8}{'resumed':>10}")
+        for name, connect in cases.items():
+            before = tls.tls_stats()
+            start = time.perf_counter()
+            for _ in range(CONNECTIONS):
+                connect()
+            elapsed = (time.perf_counter() - start) / CONNECTIONS
+            after = tls.tls_stats()
+            print(
+                f"{name:<28}{elapsed * 1e3:>14.2f}ms"
+                f"{after.full_handshakes - before.full_handshakes:>8}"
+                f"{after.resumed_handshakes - before.resumed_handshakes:>10}"
+            )
+
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Content-addressed store of response bodies, so byte-identical bodies of
+different URLs (mirrors, query string variants, shared assets) are held once.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Final
+
+__all__ = (
+    "BlobStore",
+    "BlobStoreStats",
+    "body_digest",
+)
+
+
+def body_digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+@dataclass(frozen=True)
+class BlobStoreStats:
+    # Distinct bodies held, and the references to them
+    blobs: int
+    references: int
+    # Bytes held, and the bytes the references would hold without sharing
+    stored_bytes: int
+    referenced_bytes: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.referenced_bytes - self.stored_bytes
+
+
+class _Blob:
+    __slots__ = ("body", "references")
+
+    def __init__(self, body: bytes) -> None:
+        self.body: Final = body
+        self.references = 1
+
+
+class BlobStore:
+    """
+    Bodies keyed by their digest and counted by reference: a body is dropped
+    when its last reference is released. Not thread-safe; the owner locks.
+    """
+
+    def __init__(self) -> None:
+        self._blobs: Final = dict[str, _Blob]()
+        self._references = 0
+        self._stored_bytes = 0
+        self._referenced_bytes = 0
+
+    def add(self, body: bytes) -> tuple[str, bytes]:
+        """
+        Take a reference to `body`. Returns its digest and the stored body to
+        use instead of `body`, which is the same bytes object if identical
+        content is already held.
+        """
+        digest = body_digest(body)
+        if (blob := self._blobs.get(digest)) is not None:
+            blob.references += 1
+        else:
+            blob = self._blobs[digest] = _Blob(body)
+            self._stored_bytes += len(body)
+        self._references += 1
+        self._referenced_bytes += len(body)
+        return digest, blob.body
+
+    def release(self, digest: str) -> None:
+        blob = self._blobs[digest]
+        blob.references -= 1
+        self._references -= 1
+        self._referenced_bytes -= len(blob.body)
+        if blob.references == 0:
+            del self._blobs[digest]
+            self._stored_bytes -= len(blob.body)
+
+    @property
+    def stored_bytes(self) -> int:
+        return self._stored_bytes
+
+    def stats(self) -> BlobStoreStats:
+        return BlobStoreStats(
+            blobs=len(self._blobs),
+            references=self._references,
+            stored_bytes=self._stored_bytes,
+            referenced_bytes=self._referenced_bytes,
+        )
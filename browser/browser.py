@@ -6,6 +6,7 @@ from typing import Literal, assert_never
 from browser.content import Content, HtmlContent
 from browser.content_fetcher import fetch_content
 from browser.renderer import _render_html_to_text
+from browser.sharded import ShardedMap
 
 from .url import AboutUrl, Url, UrlParseError
 
@@ -154,13 +155,13 @@ def _get_vertical_scroll_bar(
     )
 
 
-_image_cache: dict[str, tkinter.PhotoImage] = {}
+# Loaded images by path. The map is thread-safe, but Tk objects may only be
+# created and used on the thread running Tk.
+_image_cache = ShardedMap[str, tkinter.PhotoImage]()
 
 
 def _load_image(path: str) -> tkinter.PhotoImage:
-    if path not in _image_cache:
-        _image_cache[path] = tkinter.PhotoImage(file=path)
-    return _image_cache[path]
+    return _image_cache.get_or_compute(path, lambda: tkinter.PhotoImage(file=path))
 
 
 def _get_display_list(
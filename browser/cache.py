@@ -1,33 +1,815 @@
+import asyncio
+import contextlib
+import dataclasses
+import functools
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import StrEnum
 from typing import Final, Protocol
 
+from browser.blob_store import BlobStore
+from browser.protocols.http.content_coding import decode_content
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.headers.cache_control import request as request_directive
+from browser.protocols.http.headers.cache_control.request import (
+    RequestCacheControlToken,
+)
+from browser.protocols.http.request import HttpRequest
 from browser.protocols.http.response import HttpResponse
+from browser.sharded import shard_index
 
 from .url import HttpFamilyUrl
 
 
+@dataclass(frozen=True)
+class CacheEntry:
+    response: HttpResponse
+    freshness: Freshness
+
+    @functools.cached_property
+    def size(self) -> int:
+        """Approximate bytes held: the body and the header fields."""
+        return len(self.response.body) + sum(
+            len(name) + len(value) for name, value in self.response.headers.items()
+        )
+
+    def is_expired(self, now: float) -> bool:
+        """
+        Whether the entry is of no more use: stale past the windows it may be
+        served in, and without validators to revalidate it.
+        """
+        freshness = self.freshness
+        usable_stale = max(freshness.stale_while_revalidate, freshness.stale_if_error)
+        return (
+            freshness.remaining(now) + usable_stale <= 0
+            and not self.response.has_validators
+        )
+
+
+# Selecting header fields of a request, as (lower case name, normalized
+# value or None when absent) pairs
+VariantKey = tuple[tuple[str, str | None], ...]
+
+
+def vary_field_names(response: HttpResponse) -> tuple[str, ...] | None:
+    """
+    Lower case, sorted names of the request fields a response varies on
+    (ref https://httpwg.org/specs/rfc9110.html#field.vary), or None for
+    `Vary: *`, which no later request matches.
+    """
+    if (vary := response.headers.get("vary")) is None:
+        return ()
+    names = {name.strip().lower() for name in vary.split(",")} - {""}
+    if "*" in names:
+        return None
+    return tuple(sorted(names))
+
+
+def variant_key(names: tuple[str, ...], request: HttpRequest | None) -> VariantKey:
+    """
+    Values of the fields `names` in `request`, normalized so that requests
+    differing only in whitespace select the same variant
+    (ref https://httpwg.org/specs/rfc9111.html#caching.negotiated.responses).
+    """
+    if not names:
+        return ()
+    headers = HeaderMap(request.headers if request is not None else None)
+    return tuple((name, _normalize_field(headers.get(name))) for name in names)
+
+
+def _normalize_field(value: str | None) -> str | None:
+    if value is None:
+        return None
+    return ", ".join(" ".join(member.split()) for member in value.split(","))
+
+
 class HttpCache(Protocol):
     """
     Protocol to cache only HTTP/S responses (not other schemes like file:, data:).
+
+    A URL may have several stored responses, one per variant selected by
+    their Vary header. `request` picks the variant; without it, only a
+    variant selected by the absence of the fields matches.
     """
 
-    def get(self, url: HttpFamilyUrl) -> HttpResponse | None: ...
+    # Whether content-coded responses are stored as received, which `set`
+    # needs their HttpResponse.encoded_body for
+    encoded_at_rest: bool = False
 
-    def set(self, url: HttpFamilyUrl, response: HttpResponse, expires: int) -> None: ...
+    def get(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> HttpResponse | None:
+        """Return the stored response for `url` if it is still fresh."""
+        ...
+
+    def lookup(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> CacheEntry | None:
+        """Return the entry stored for `url`, even if it is stale."""
+        ...
+
+    def set(
+        self, url: HttpFamilyUrl, response: HttpResponse, freshness: Freshness
+    ) -> None:
+        """Store `response`, as the variant selected by `response.request`."""
+        ...
+
+
+# Default bounds of a MemoryCache
+MEMORY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+MEMORY_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+# Seconds between sweeps of expired entries
+MEMORY_CACHE_SWEEP_INTERVAL = 60
+# Budget for the decoded bodies of the most recently read entries, when
+# bodies are stored content-coded
+MEMORY_CACHE_DECODED_BYTES = 4 * 1024 * 1024
+# Shards of a ShardedMemoryCache. Few enough that each shard's share of
+# MEMORY_CACHE_MAX_BYTES still fits a MEMORY_CACHE_MAX_ENTRY_BYTES response.
+MEMORY_CACHE_SHARDS = 8
+
+
+@dataclass(frozen=True)
+class MemoryCacheStats:
+    entries: int
+    # Bytes held, each distinct body counted once
+    bytes: int
+    max_bytes: int
+    # Distinct bodies, and the bytes saved by sharing identical ones
+    unique_bodies: int
+    dedup_saved_bytes: int
+    # Lookups that found an entry, fresh or stale, and those that did not
+    hits: int
+    misses: int
+    # Entries dropped to stay within the byte budget, and expired entries
+    # dropped by sweeps
+    evictions: int
+    expirations: int
+    # With bodies stored content-coded: bytes of the decoded bodies kept for
+    # hot entries, reads that decoded a body, and reads that found it decoded
+    decoded_bytes: int
+    decodes: int
+    decoded_hits: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass(frozen=True)
+class _Stored:
+    entry: CacheEntry
+    # Of the body, held in the blob store
+    digest: str
+    # Whether the body is the content-coded payload, decoded when read
+    encoded: bool = False
+
+    @property
+    def head_size(self) -> int:
+        return self.entry.size - len(self.entry.response.body)
+
+
+@dataclass
+class _Variants:
+    # Fields the stored responses of a URL vary on
+    vary: tuple[str, ...]
+    entries: dict[VariantKey, _Stored] = field(default_factory=dict)
 
 
 class MemoryCache(HttpCache):
-    def __init__(self):
-        self._cache: Final = dict[HttpFamilyUrl, tuple[HttpResponse, int]]()
+    """
+    Keeps at most `max_bytes` of entries, evicting the least recently used
+    URL, with all its variants, first. Responses larger than
+    `max_entry_bytes` are not stored. Identical bodies are held once, so the
+    budget is spent on distinct content.
 
-    def get(self, url: HttpFamilyUrl) -> HttpResponse | None:
-        if (cached := self._cache.get(url)) is None:
-            return None
-        response, expire_at = cached
-        if expire_at < time.time():
-            _ = self._cache.pop(url)
+    With `encoded_at_rest`, content-coded responses are stored as received,
+    e.g. gzipped, and decoded when they are read. The decoded bodies of the
+    most recently read entries are kept, up to `decoded_bytes`.
+
+    Stale entries are kept, since they may be revalidated or served stale,
+    until they are evicted or expire (see CacheEntry.is_expired). Expired
+    entries are swept every `sweep_interval` seconds, when the cache is used.
+
+    Every method is safe to call from any thread, and `get`, `lookup`, `set`
+    and `sweep` are atomic. One lock guards the cache, so threads contend for
+    it; see ShardedMemoryCache.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MEMORY_CACHE_MAX_BYTES,
+        max_entry_bytes: int = MEMORY_CACHE_MAX_ENTRY_BYTES,
+        sweep_interval: float = MEMORY_CACHE_SWEEP_INTERVAL,
+        encoded_at_rest: bool = False,
+        decoded_bytes: int = MEMORY_CACHE_DECODED_BYTES,
+    ):
+        self.max_bytes: Final = max_bytes
+        self.max_entry_bytes: Final = min(max_entry_bytes, max_bytes)
+        self.sweep_interval: Final = sweep_interval
+        self.encoded_at_rest: Final = encoded_at_rest
+        self.decoded_bytes: Final = decoded_bytes
+        # Least recently used first
+        self._cache: Final = OrderedDict[HttpFamilyUrl, _Variants]()
+        # Held briefly: bodies are decoded outside of it
+        self._lock: Final = threading.Lock()
+        self._blobs: Final = BlobStore()
+        # Bytes of the entries besides their bodies
+        self._head_bytes = 0
+        # Decoded bodies by digest, least recently read first
+        self._decoded: Final = OrderedDict[str, bytes]()
+        self._decoded_bytes = 0
+        self._last_sweep = time.time()
+        self._hits = self._misses = self._evictions = self._expirations = 0
+        self._decodes = self._decoded_hits = 0
+
+    def get(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> HttpResponse | None:
+        entry = self.lookup(url, request)
+        if entry is None or not entry.freshness.is_fresh(time.time()):
             return None
-        return response
+        return entry.response
+
+    def lookup(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> CacheEntry | None:
+        with self._lock:
+            self._sweep_if_due()
+            variants = self._cache.get(url)
+            stored = (
+                None
+                if variants is None
+                else variants.entries.get(variant_key(variants.vary, request))
+            )
+            if stored is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._cache.move_to_end(url)
+            if not stored.encoded:
+                return stored.entry
+            if (body := self._decoded.get(stored.digest)) is not None:
+                self._decoded.move_to_end(stored.digest)
+                self._decoded_hits += 1
+
+        response = stored.entry.response
+        if body is None:
+            # Outside the lock, which decoding would hold for long
+            body = decode_content(
+                response.headers.get("content-encoding"), response.body
+            )
+            with self._lock:
+                self._remember_decoded(stored.digest, body)
+        return CacheEntry(
+            dataclasses.replace(response, body=body, encoded_body=response.body),
+            stored.entry.freshness,
+        )
+
+    def set(
+        self, url: HttpFamilyUrl, response: HttpResponse, freshness: Freshness
+    ) -> None:
+        vary = vary_field_names(response)
+        encoded = self.encoded_at_rest and response.encoded_body is not None
+        if encoded or response.encoded_body is not None:
+            # Hold one form of the body
+            response = dataclasses.replace(
+                response,
+                body=response.encoded_body if encoded else response.body,
+                encoded_body=None,
+            )
+        entry = CacheEntry(response, freshness)
+        with self._lock:
+            self._sweep_if_due()
+            variants = self._cache.get(url)
+            if variants is not None and variants.vary != vary:
+                # The response varies differently now, which outdates the
+                # other variants
+                self._remove(url)
+                variants = None
+            if vary is None:
+                return
+
+            key = variant_key(vary, response.request)
+            # The previous entry is outdated, even if the new one is too large
+            if (
+                variants is not None
+                and (previous := variants.entries.pop(key, None)) is not None
+            ):
+                self._release(previous)
+            if entry.size > self.max_entry_bytes:
+                if variants is not None and not variants.entries:
+                    del self._cache[url]
+                return
+
+            if variants is None:
+                variants = self._cache[url] = _Variants(vary)
+            variants.entries[key] = self._hold(entry, encoded)
+            self._cache.move_to_end(url)
+            while self._held_bytes() > self.max_bytes:
+                evicted_url = next(iter(self._cache))
+                self._evictions += len(self._cache[evicted_url].entries)
+                self._remove(evicted_url)
+
+    def sweep(self) -> None:
+        """Drop the expired entries."""
+        with self._lock:
+            self._sweep(time.time())
+
+    def stats(self) -> MemoryCacheStats:
+        with self._lock:
+            blobs = self._blobs.stats()
+            return MemoryCacheStats(
+                entries=sum(len(variants.entries) for variants in self._cache.values()),
+                bytes=self._held_bytes(),
+                max_bytes=self.max_bytes,
+                unique_bodies=blobs.blobs,
+                dedup_saved_bytes=blobs.saved_bytes,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                decoded_bytes=self._decoded_bytes,
+                decodes=self._decodes,
+                decoded_hits=self._decoded_hits,
+            )
+
+    def _hold(self, entry: CacheEntry, encoded: bool) -> _Stored:
+        digest, body = self._blobs.add(entry.response.body)
+        if body is not entry.response.body:
+            # Share the body already held, and let this copy go
+            entry = CacheEntry(
+                dataclasses.replace(entry.response, body=body), entry.freshness
+            )
+        stored = _Stored(entry, digest, encoded)
+        self._head_bytes += stored.head_size
+        return stored
+
+    def _release(self, stored: _Stored) -> None:
+        self._blobs.release(stored.digest)
+        self._head_bytes -= stored.head_size
+
+    def _remember_decoded(self, digest: str, body: bytes) -> None:
+        self._decodes += 1
+        if len(body) > self.decoded_bytes or digest in self._decoded:
+            return
+        self._decoded[digest] = body
+        self._decoded_bytes += len(body)
+        while self._decoded_bytes > self.decoded_bytes:
+            _, evicted = self._decoded.popitem(last=False)
+            self._decoded_bytes -= len(evicted)
+
+    def _held_bytes(self) -> int:
+        return self._head_bytes + self._blobs.stored_bytes
+
+    def _remove(self, url: HttpFamilyUrl) -> None:
+        for stored in self._cache.pop(url).entries.values():
+            self._release(stored)
+
+    def _sweep_if_due(self) -> None:
+        now = time.time()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        for url, variants in list(self._cache.items()):
+            expired = [
+                key
+                for key, stored in variants.entries.items()
+                if stored.entry.is_expired(now)
+            ]
+            for key in expired:
+                self._release(variants.entries.pop(key))
+            self._expirations += len(expired)
+            if not variants.entries:
+                del self._cache[url]
+
+
+class ShardedMemoryCache(HttpCache):
+    """
+    A MemoryCache split into `shards` by URL, each with its own lock and an
+    even share of the budgets, so threads fetching different URLs do not
+    contend. The least recently used entries are evicted per shard, and
+    identical bodies are only shared within a shard.
+
+    Like MemoryCache, every method is safe to call from any thread, and
+    `get`, `lookup` and `set` are atomic. `stats` and `sweep` visit the shards
+    one at a time.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MEMORY_CACHE_MAX_BYTES,
+        max_entry_bytes: int = MEMORY_CACHE_MAX_ENTRY_BYTES,
+        sweep_interval: float = MEMORY_CACHE_SWEEP_INTERVAL,
+        encoded_at_rest: bool = False,
+        decoded_bytes: int = MEMORY_CACHE_DECODED_BYTES,
+        shards: int = MEMORY_CACHE_SHARDS,
+    ):
+        if shards < 1:
+            raise ValueError("Expected at least one shard")
+        self.encoded_at_rest: Final = encoded_at_rest
+        self._shards: Final = tuple(
+            MemoryCache(
+                max_bytes // shards,
+                max_entry_bytes,
+                sweep_interval,
+                encoded_at_rest,
+                decoded_bytes // shards,
+            )
+            for _ in range(shards)
+        )
+
+    def get(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> HttpResponse | None:
+        return self._shard(url).get(url, request)
+
+    def lookup(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> CacheEntry | None:
+        return self._shard(url).lookup(url, request)
+
+    def set(
+        self, url: HttpFamilyUrl, response: HttpResponse, freshness: Freshness
+    ) -> None:
+        self._shard(url).set(url, response, freshness)
+
+    def sweep(self) -> None:
+        """Drop the expired entries."""
+        for shard in self._shards:
+            shard.sweep()
+
+    def stats(self) -> MemoryCacheStats:
+        """The stats of the shards, added up."""
+        stats = [shard.stats() for shard in self._shards]
+        return MemoryCacheStats(
+            **{
+                field.name: sum(getattr(shard, field.name) for shard in stats)
+                for field in dataclasses.fields(MemoryCacheStats)
+            }
+        )
+
+    def _shard(self, url: HttpFamilyUrl) -> MemoryCache:
+        return self._shards[shard_index(url, len(self._shards))]
+
+
+class CacheStatus(StrEnum):
+    # A stored response was fresh enough for the request
+    HIT = "hit"
+    # A stale stored response was accepted with `max-stale`
+    STALE_HIT = "stale-hit"
+    # A stale stored response was served while it is refreshed in the
+    # background (`stale-while-revalidate`)
+    STALE_WHILE_REVALIDATE = "stale-while-revalidate"
+    # The origin could not be reached or failed, and a stale stored response
+    # was served instead (`stale-if-error`)
+    STALE_IF_ERROR = "stale-if-error"
+    # A stored response was validated by the server (304 Not Modified)
+    REVALIDATED = "revalidated"
+    # The response came from the network
+    MISS = "miss"
+    # The response came from the network, fetched for an identical request
+    # made at the same time
+    COALESCED = "coalesced"
+    # `only-if-cached` with no usable stored response; answered with 504
+    UNAVAILABLE = "unavailable"
+    # A redirect remembered from an earlier response was followed without a
+    # request
+    REMEMBERED_REDIRECT = "remembered-redirect"
+
+
+@dataclass(frozen=True)
+class CacheLookup:
+    url: HttpFamilyUrl
+    status: CacheStatus
+
+
+def select_cached_response(
+    entry: CacheEntry | None,
+    directives: list[RequestCacheControlToken],
+    now: float,
+) -> CacheStatus:
+    """
+    Decide whether a stored entry may answer a request with the Cache-Control
+    `directives` (ref https://httpwg.org/specs/rfc9111.html#constructing.responses.from.caches).
+    Returns MISS when the request has to go to the network, where a stored
+    response with validators can be revalidated, or UNAVAILABLE when it must
+    not (`only-if-cached`). STALE_WHILE_REVALIDATE asks the caller to refresh
+    the entry after serving it.
+    """
+    offline = any(isinstance(d, request_directive.OnlyIfCached) for d in directives)
+    miss = CacheStatus.UNAVAILABLE if offline else CacheStatus.MISS
+    if entry is None or any(
+        isinstance(d, request_directive.NoCache) for d in directives
+    ):
+        return miss
+
+    age = entry.freshness.current_age(now)
+    # Seconds the response stays fresh (negative once it is stale)
+    remaining = entry.freshness.remaining(now)
+    for directive in directives:
+        match directive:
+            case request_directive.MaxAge(delta_seconds=max_age) if age > max_age:
+                return miss
+            case request_directive.MinFresh(delta_seconds=min_fresh) if (
+                remaining < min_fresh
+            ):
+                return miss
+    if remaining > 0:
+        return CacheStatus.HIT
+
+    if entry.freshness.must_revalidate:
+        return miss
+    max_stale = next(
+        (d for d in directives if isinstance(d, request_directive.MaxStale)), None
+    )
+    if max_stale is not None and (
+        max_stale.delta_seconds is None or -remaining <= max_stale.delta_seconds
+    ):
+        return CacheStatus.STALE_HIT
+    if not offline and -remaining <= entry.freshness.stale_while_revalidate:
+        return CacheStatus.STALE_WHILE_REVALIDATE
+    return miss
+
+
+def may_serve_on_error(entry: CacheEntry | None, now: float) -> bool:
+    """
+    Whether a stale entry may stand in for a response the origin failed to
+    give (ref https://www.rfc-editor.org/rfc/rfc5861#section-4).
+    """
+    if entry is None or entry.freshness.must_revalidate:
+        return False
+    return -entry.freshness.remaining(now) <= entry.freshness.stale_if_error
+
+
+def conditional_request(request: HttpRequest, stored: HttpResponse) -> HttpRequest:
+    """
+    Make `request` conditional on the validators of a stored response
+    (ref https://httpwg.org/specs/rfc9111.html#validation.sent).
+    """
+    headers = dict(request.headers)
+    if (etag := stored.etag) is not None:
+        headers["If-None-Match"] = etag
+    if (last_modified := stored.last_modified) is not None:
+        headers["If-Modified-Since"] = last_modified
+    return dataclasses.replace(request, headers=headers)
+
+
+# Describe the stored body, so a 304 must not replace them
+_BODY_FIELDS = frozenset(
+    ("content-encoding", "content-length", "content-range", "transfer-encoding")
+)
+
+
+def freshen_response(stored: HttpResponse, not_modified: HttpResponse) -> HttpResponse:
+    """
+    Update a stored response with the header fields of a 304 that validated
+    it (ref https://httpwg.org/specs/rfc9111.html#freshening.responses).
+    """
+    headers = dict(stored.headers)
+    headers.update(
+        (name, value)
+        for name, value in not_modified.headers.items()
+        if name not in _BODY_FIELDS
+    )
+    return dataclasses.replace(
+        stored, headers=HeaderMap(headers), request=not_modified.request
+    )
+
+
+def gateway_timeout(request: HttpRequest) -> HttpResponse:
+    """Answer to an `only-if-cached` request that the cache cannot satisfy."""
+    return HttpResponse(
+        version="HTTP/1.1",
+        status_code=504,
+        status_message="Gateway Timeout",
+        headers=HeaderMap({"content-length": "0"}),
+        body=b"",
+        request=request,
+    )
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    # Requests answered from the cache without going to the network
+    hits: int
+    # Conditional requests sent, and those answered with 304 Not Modified
+    revalidations: int
+    not_modified: int
+    # Body bytes not transferred thanks to hits and 304 responses
+    bytes_saved: int
+    # Refreshes started in the background, and requests for a refresh that
+    # joined one already running
+    background_refreshes: int
+    coalesced_refreshes: int
+    # Fetches that joined an identical fetch in flight instead of sending
+    # their own request
+    coalesced_fetches: int
+
+
+class _CacheCounters:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        self.background_refreshes = 0
+        self.coalesced_refreshes = 0
+        self.coalesced_fetches = 0
+
+
+_counters = _CacheCounters()
+
+
+def count_hit(stored: HttpResponse) -> None:
+    with _counters.lock:
+        _counters.hits += 1
+        _counters.bytes_saved += len(stored.body)
+
+
+def count_revalidation(stored: HttpResponse, not_modified: bool) -> None:
+    with _counters.lock:
+        _counters.revalidations += 1
+        if not_modified:
+            _counters.not_modified += 1
+            _counters.bytes_saved += len(stored.body)
+
+
+def cache_stats() -> CacheStats:
+    with _counters.lock:
+        return CacheStats(
+            hits=_counters.hits,
+            revalidations=_counters.revalidations,
+            not_modified=_counters.not_modified,
+            bytes_saved=_counters.bytes_saved,
+            background_refreshes=_counters.background_refreshes,
+            coalesced_refreshes=_counters.coalesced_refreshes,
+            coalesced_fetches=_counters.coalesced_fetches,
+        )
+
+
+# Worker threads refreshing stale entries
+REFRESH_WORKERS = 4
+
+
+class BackgroundRefresher:
+    """
+    Runs refreshes of stale entries on worker threads. A URL is refreshed
+    only once at a time: asking again while its refresh runs does nothing.
+    """
+
+    def __init__(self, max_workers: int = REFRESH_WORKERS) -> None:
+        self._executor: Final = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="cache-refresh"
+        )
+        self._lock: Final = threading.Lock()
+        self._refreshing: Final = set[HttpFamilyUrl]()
+
+    def refresh(
+        self, url: HttpFamilyUrl, refresh: Callable[[], None]
+    ) -> Future[None] | None:
+        """
+        Call `refresh` in the background, unless `url` is being refreshed.
+        Returns its future, or None when coalesced with the running refresh.
+        """
+        with self._lock:
+            if url in self._refreshing:
+                with _counters.lock:
+                    _counters.coalesced_refreshes += 1
+                return None
+            self._refreshing.add(url)
+        with _counters.lock:
+            _counters.background_refreshes += 1
+
+        def run() -> None:
+            try:
+                refresh()
+            finally:
+                with self._lock:
+                    self._refreshing.discard(url)
+
+        try:
+            return self._executor.submit(run)
+        except RuntimeError:
+            # Shut down
+            with self._lock:
+                self._refreshing.discard(url)
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+class InFlightFetches[K: Hashable, T]:
+    """
+    The fetches in flight by key, so that callers making the same fetch at
+    the same time share one network transaction: the first caller fetches,
+    and the others wait for its result, or its exception.
+
+    Callers may be threads or coroutines of any event loop. A thread running
+    an event loop does not wait for other callers, which could be coroutines
+    of that loop, and fetches on its own instead.
+    """
+
+    def __init__(self) -> None:
+        self._lock: Final = threading.Lock()
+        self._flights: Final = dict[K, Future[T]]()
+
+    def run(self, key: K, fetch: Callable[[], T]) -> tuple[T, bool]:
+        """
+        Call `fetch`, or wait for the same fetch in flight. Returns the
+        result and whether it was shared.
+        """
+        if _has_running_loop():
+            return fetch(), False
+        flight, leading = self._join(key)
+        if not leading:
+            return flight.result(), True
+        try:
+            result = fetch()
+        except BaseException as error:
+            self._land(key, flight).set_exception(error)
+            raise
+        self._land(key, flight).set_result(result)
+        return result, False
+
+    async def run_async(
+        self, key: K, fetch: Callable[[], Awaitable[T]]
+    ) -> tuple[T, bool]:
+        """Same as `run`, for coroutines."""
+        flight, leading = self._join(key)
+        if not leading:
+            return await asyncio.wrap_future(flight), True
+        try:
+            result = await fetch()
+        except BaseException as error:
+            self._land(key, flight).set_exception(error)
+            raise
+        self._land(key, flight).set_result(result)
+        return result, False
+
+    def _join(self, key: K) -> tuple[Future[T], bool]:
+        with self._lock:
+            if (flight := self._flights.get(key)) is not None:
+                with _counters.lock:
+                    _counters.coalesced_fetches += 1
+                return flight, False
+            flight = self._flights[key] = Future()
+            # Running futures cannot be cancelled, e.g. by a waiting coroutine
+            # that is cancelled
+            flight.set_running_or_notify_cancel()
+            return flight, True
+
+    def _land(self, key: K, flight: Future[T]) -> Future[T]:
+        # Later callers start a new fetch
+        with self._lock:
+            del self._flights[key]
+        return flight
+
+
+def _has_running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@dataclass
+class NavigationCache:
+    """Cache policy and cache report of one navigation."""
+
+    # Cache-Control directives sent with its requests, e.g. "no-cache" for a
+    # reload or "only-if-cached" for an offline mode
+    cache_control: str | None = None
+    # Every lookup made, including those of redirects
+    lookups: list[CacheLookup] = field(default_factory=list)
+
+
+_current_navigation: ContextVar[NavigationCache | None] = ContextVar(
+    "current_navigation", default=None
+)
+
+
+def current_navigation() -> NavigationCache | None:
+    return _current_navigation.get()
+
 
-    def set(self, url: HttpFamilyUrl, response: HttpResponse, expires: int) -> None:
-        self._cache[url] = (response, expires)
+@contextlib.contextmanager
+def navigation_cache(cache_control: str | None = None) -> Iterator[NavigationCache]:
+    """Apply `cache_control` to the fetches made inside, and record their lookups."""
+    navigation = NavigationCache(cache_control)
+    token = _current_navigation.set(navigation)
+    try:
+        yield navigation
+    finally:
+        _current_navigation.reset(token)
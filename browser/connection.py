@@ -1,19 +1,66 @@
+import asyncio
+import dataclasses
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator, Mapping
 from dataclasses import dataclass
+from http import HTTPStatus
+import select
 import socket
 import ssl
+import threading
 import time
 from typing import Final, Literal
+import weakref
+from browser import tls
+from browser.connection_pool import AsyncConnectionPool, ConnectionPool, PoolStats
+from browser.sharded import ShardedMap
+from browser.resolver import (
+    CONNECTION_ATTEMPT_DELAY,
+    CachingResolver,
+    Resolver,
+    SystemResolver,
+    race_connect,
+)
+from browser.protocols.http.body import BodyBuffer, BodyStream
+from browser.protocols.http.content_coding import ContentDecoder, decode_chunks
+from browser.protocols.http.h2 import (
+    DataReceived,
+    ErrorCode,
+    H2Connection,
+    H2Error,
+    H2Event,
+    HeadersReceived,
+    StreamReset,
+)
 from browser.protocols.http.header_map import HeaderMap
-from browser.protocols.http.request import (
-    HTTP_LINE_SEPARATOR,
-    HttpRequest,
-    HttpRequestEncoder,
+from browser.protocols.http.headers.keep_alive import parse_keep_alive
+from browser.protocols.http.parser import (
+    BodyChunk,
+    EndOfMessage,
+    Headers,
+    HttpParseError,
+    HttpResponseParser,
+    ResponseEvent,
+    StatusLine,
 )
-from browser.protocols.http.response import HttpResponse
+from browser.protocols.http.request import HttpRequest, HttpRequestEncoder
+from browser.protocols.http.response import HttpResponse, StreamingHttpResponse
+from browser.protocols.http.timing import ConnectTiming, ResourceTiming
 from browser.url import HttpFamilyUrl
 
 
-__all__ = ("Connection",)
+__all__ = (
+    "AsyncConnection",
+    "Connection",
+    "Http2Connection",
+    "Timeouts",
+    "async_connection_pool_stats",
+    "connection_pool_stats",
+    "request_http",
+    "request_http_async",
+    "request_http_pipelined",
+    "request_http_stream",
+)
 
 HTTP_FAMILY_SCHEME = Literal["http", "https"]
 
@@ -23,36 +70,185 @@ DEFAULT_PORT: dict[HTTP_FAMILY_SCHEME, int] = {
 }
 
 
+RECEIVE_BUFFER_SIZE = 64 * 1024
+# Bodies are preallocated from their Content-Length up to this size, and grow
+# as they arrive beyond it
+BODY_PREALLOCATE_MAX_SIZE = 1024 * 1024
+# Body bytes are received straight into the body when at least this many are
+# expected next. Below it, one recv() of a whole buffer takes several small
+# chunks at once, where receiving each on its own would take one call each.
+DIRECT_RECEIVE_MIN_SIZE = 4 * 1024
+
+# Offer HTTP/2 to HTTPS servers with ALPN
+# (ref https://httpwg.org/specs/rfc9113.html#discover-https)
+HTTP2_ENABLED = True
+ALPN_PROTOCOLS = ("h2", "http/1.1")
+
+# Requests that may be pipelined, since a request left unanswered when the
+# connection closes may have to be sent again
+PIPELINE_METHODS = frozenset(("GET", "HEAD"))
+
+# Requests sent again once when a reused connection turns out to have been
+# closed by the server (ref https://httpwg.org/specs/rfc9112.html#persistent.retrying.requests)
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"))
+
+# Unit is seconds. A connection is not reused this long before the idle
+# timeout its server sent runs out, since the server may close it while a
+# request is on its way.
+KEEP_ALIVE_TIMEOUT_MARGIN = 1
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    """Deadlines of a connection. Unit is seconds; None waits forever."""
+
+    # Resolving, connecting and the TLS handshake
+    connect: float | None = 10
+    # Each wait for data from the peer
+    read: float | None = 30
+
+
+# Used by connections opened without explicit timeouts or resolver
+DEFAULT_TIMEOUTS = Timeouts()
+DEFAULT_RESOLVER: Resolver = CachingResolver(SystemResolver())
+
+
 def get_default_port(scheme: HTTP_FAMILY_SCHEME) -> int:
     return DEFAULT_PORT[scheme]
 
 
+class _Stopwatch:
+    """Times one request and its response on a connection."""
+
+    def __init__(
+        self, connect: ConnectTiming | None, reused: bool, bytes_sent: int
+    ) -> None:
+        self.request_start: Final = time.monotonic()
+        self.connect: Final = connect
+        self.reused: Final = reused
+        self.bytes_sent: Final = bytes_sent
+        self.bytes_received = 0
+        self.response_start: float | None = None
+
+    def received(self, size: int) -> None:
+        if self.response_start is None:
+            self.response_start = time.monotonic()
+        self.bytes_received += size
+
+    def timed(self, response: HttpResponse) -> HttpResponse:
+        response_end = time.monotonic()
+        fetch_start = self.request_start
+        if self.connect is not None:
+            fetch_start = self.connect.connect_start
+            if self.connect.dns_start is not None:
+                fetch_start = self.connect.dns_start
+        timing = ResourceTiming(
+            fetch_start=fetch_start,
+            connect=self.connect,
+            request_start=self.request_start,
+            response_start=self.response_start or response_end,
+            response_end=response_end,
+            reused_connection=self.reused,
+            bytes_sent=self.bytes_sent,
+            bytes_received=self.bytes_received,
+        )
+        return dataclasses.replace(response, timing=timing)
+
+
 class Connection:
     """HTTP connection"""
 
-    def __init__(self, socket: ssl.SSLSocket | socket.socket) -> None:
+    def __init__(
+        self,
+        socket: ssl.SSLSocket | socket.socket,
+        host: str | None = None,
+        port: int | None = None,
+    ) -> None:
         self._socket: Final[ssl.SSLSocket | socket.socket] = socket
-        self._reader = socket.makefile("rb", newline=HTTP_LINE_SEPARATOR)
+        self._parser: HttpResponseParser | None = None
+        self._origin: Final = (host, port)
+        self.reusable = True
+        # Responses received, which tells a reused connection from a new one
+        self.responses = 0
+        # Seconds the server keeps the connection open while idle, from the
+        # Keep-Alive header of its last response
+        self.keep_alive_timeout: int | None = None
+        # When `open` opened the connection
+        self.connect_timing: ConnectTiming | None = None
 
     @classmethod
-    def open(cls, scheme: Literal["http", "https"], host: str, port: int | None = None):
-        _socket = socket.socket(
-            family=socket.AF_INET, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP
-        )
-
-        if scheme == "https":
-            context = ssl.create_default_context()
-            _socket = context.wrap_socket(_socket, server_hostname=host)
+    def open(
+        cls,
+        scheme: Literal["http", "https"],
+        host: str,
+        port: int | None = None,
+        *,
+        resolver: Resolver | None = None,
+        timeouts: Timeouts | None = None,
+        http2: bool | None = None,
+    ):
+        """
+        Connect to `host`, racing its IPv6 and IPv4 addresses
+        (ref https://www.rfc-editor.org/rfc/rfc8305).
 
+        HTTPS connections offer HTTP/2 unless `http2` is False (default:
+        HTTP2_ENABLED). An Http2Connection is returned if the server picks it.
+        """
+        resolver = resolver or DEFAULT_RESOLVER
+        timeouts = timeouts or DEFAULT_TIMEOUTS
         port = port or DEFAULT_PORT[scheme]
+        offer_http2 = HTTP2_ENABLED if http2 is None else http2
 
-        _socket.connect((host, port))
+        dns_start = time.monotonic()
+        addresses = resolver.resolve(host, port)
+        connect_start = time.monotonic()
+        _socket = race_connect(addresses, timeouts.connect)
+        connect_end = time.monotonic()
+        tls_start = tls_end = None
+        try:
+            if scheme == "https":
+                _socket.settimeout(timeouts.connect)
+                tls_start = time.monotonic()
+                _socket = tls.wrap_socket(
+                    _socket, host, port, ALPN_PROTOCOLS if offer_http2 else ()
+                )
+                tls_end = time.monotonic()
+            _socket.settimeout(timeouts.read)
+            if (
+                isinstance(_socket, ssl.SSLSocket)
+                and _socket.selected_alpn_protocol() == "h2"
+            ):
+                connection = Http2Connection(_socket, host, port)
+            else:
+                connection = cls(_socket, host, port)
+        except BaseException:
+            _socket.close()
+            raise
 
-        return cls(_socket)
+        connection.connect_timing = ConnectTiming(
+            dns_start, connect_start, connect_start, connect_end, tls_start, tls_end
+        )
+        return connection
 
     def close(self):
         self._socket.close()
 
+    def is_alive(self) -> bool:
+        """
+        Check an idle connection before reusing it. An idle keep-alive socket
+        must not be readable; if it is, the peer either closed it or sent
+        something we cannot match to a request.
+        """
+        if self._socket.fileno() == -1:
+            return False
+        readable, _, _ = select.select([self._socket], [], [], 0)
+        return not readable
+
+    @property
+    def idle_timeout(self) -> float | None:
+        """How long the connection may stay idle and still be reused."""
+        return _idle_timeout(self.keep_alive_timeout)
+
     def request(
         self,
         request: HttpRequest,
@@ -60,55 +256,751 @@ class Connection:
     ) -> HttpResponse:
         encoder = encoder or HttpRequestEncoder()
 
-        _sent_bytes = self._socket.send(encoder.encode(request))
-
-        statusline = self._reader.readline().decode("iso-8859-1")
-        # print("request", request)
-        # print("statusline", statusline.encode())
-        version, status_code, status_message = statusline.split(" ", 2)
-
-        headers = dict[str, str]()
-        while (line := self._reader.readline()) != b"\r\n":
-            name, value = line.decode("iso-8859-1").split(":", 1)
-            headers[name.strip().casefold()] = value.strip()
-
-        if headers.get("transfer-encoding") == "chunked":
-            # https://httpwg.org/specs/rfc9112.html#chunked.encoding
-            # Chunk length is represented in hexadecimal
-            body = b""
-            while (line := self._reader.readline()) != b"\r\n":
-                content_length = int(line.decode("iso-8859-1").strip(), 16)
-                if content_length == 0:
+        data = encoder.encode(request)
+        stopwatch = _stopwatch(self, len(data))
+        self._socket.sendall(data)
+        return self._receive_response(request, stopwatch)
+
+    def request_pipelined(
+        self,
+        requests: list[HttpRequest],
+        encoder: HttpRequestEncoder | None = None,
+    ) -> list[HttpResponse]:
+        """
+        Send `requests` back to back without waiting for their responses
+        (ref https://httpwg.org/specs/rfc9112.html#pipelining), then receive
+        the responses in the same order.
+
+        Fewer responses than requests are returned when the server stops
+        keeping the connection open part way: it closed the connection or
+        answered with `Connection: close` or HTTP/1.0. The remaining requests
+        were not answered and must be sent again on another connection.
+        """
+        if not all(request.method in PIPELINE_METHODS for request in requests):
+            raise ValueError("Only safe, idempotent requests may be pipelined")
+        encoder = encoder or HttpRequestEncoder()
+
+        encoded = [encoder.encode(request) for request in requests]
+        # Only the first request is charged with opening the connection
+        stopwatches = [
+            _stopwatch(self, len(data), reused=i > 0) for i, data in enumerate(encoded)
+        ]
+        self._socket.sendall(b"".join(encoded))
+
+        responses = []
+        for request, stopwatch in zip(requests, stopwatches, strict=True):
+            try:
+                responses.append(self._receive_response(request, stopwatch))
+            except ConnectionError:
+                # The connection closed before this response started
+                if not responses:
+                    raise
+                self.reusable = False
+            if not self.reusable:
+                break
+        return responses
+
+    def _receive_response(
+        self, request: HttpRequest, stopwatch: _Stopwatch
+    ) -> HttpResponse:
+        parser = self._parser = _start_response(self._parser, request)
+        assembler = _ResponseAssembler(request, parser)
+        if events := parser.feed():
+            # Received along with the previous response
+            stopwatch.received(0)
+        while (response := assembler.receive(events)) is None:
+            if (
+                assembler.is_identity
+                and (size := parser.direct_body_size()) >= DIRECT_RECEIVE_MIN_SIZE
+            ):
+                # Receive body bytes straight into the response body. The
+                # size comes from the peer, so the buffer only grows with
+                # what actually arrives.
+                with assembler.body.reserve(min(size, RECEIVE_BUFFER_SIZE)) as view:
+                    received = self._socket.recv_into(view)
+                if received:
+                    stopwatch.received(received)
+                    assembler.body.commit(received)
+                    events = parser.consume_body(received)
+                else:
+                    events = parser.feed_eof()
+            elif data := self._socket.recv(RECEIVE_BUFFER_SIZE):
+                stopwatch.received(len(data))
+                events = parser.feed(data)
+            else:
+                events = parser.feed_eof()
+
+        self._finish_response(parser, response.version, response.headers)
+        return stopwatch.timed(response)
+
+    def request_stream(
+        self,
+        request: HttpRequest,
+        encoder: HttpRequestEncoder | None = None,
+    ) -> StreamingHttpResponse:
+        """
+        Send a request and return as soon as the response head has arrived.
+        The body is received and decoded while it is read; the connection must
+        not be used for another request before the body has been closed.
+        """
+        encoder = encoder or HttpRequestEncoder()
+
+        self._socket.sendall(encoder.encode(request))
+
+        parser = self._parser = _start_response(self._parser, request)
+
+        def on_close(
+            complete: bool, status: StatusLine, headers: Mapping[str, str]
+        ) -> None:
+            if not complete:
+                self.reusable = False
+            self._finish_response(parser, status.version, headers)
+
+        return _streaming_response(request, self._receive_events(parser), on_close)
+
+    def _finish_response(
+        self, parser: HttpResponseParser, version: str, headers: Mapping[str, str]
+    ) -> None:
+        self.responses += 1
+        if not _is_reusable(parser, version, headers):
+            self.reusable = False
+        if (timeout := _keep_alive_timeout(headers)) is not None:
+            self.keep_alive_timeout = timeout
+        self._remember_tls_session()
+
+    def _remember_tls_session(self) -> None:
+        host, port = self._origin
+        if isinstance(self._socket, ssl.SSLSocket) and host and port:
+            tls.remember_session(self._socket, host, port)
+
+    def _receive_events(self, parser: HttpResponseParser) -> Iterator[ResponseEvent]:
+        events = parser.feed()
+        while True:
+            yield from events
+            if parser.is_complete:
+                return
+            if data := self._socket.recv(RECEIVE_BUFFER_SIZE):
+                events = parser.feed(data)
+            else:
+                events = parser.feed_eof()
+
+
+class Http2Connection(Connection):
+    """
+    HTTP/2 connection (ref https://httpwg.org/specs/rfc9113.html), returned by
+    `Connection.open` when the server picks HTTP/2 during the TLS handshake.
+
+    Unlike Connection, it is shared: threads may send requests at the same
+    time, each on its own stream. A thread waiting for its response reads
+    from the socket on behalf of all of them and hands frames of other
+    streams over to their threads. Socket reads and writes never overlap,
+    since an SSLSocket must not be used by two threads at once.
+    """
+
+    def __init__(
+        self,
+        socket: ssl.SSLSocket,
+        host: str | None = None,
+        port: int | None = None,
+    ) -> None:
+        super().__init__(socket, host, port)
+        self._h2: Final = H2Connection()
+        # Guards `_h2`, `_streams` and the socket
+        self._condition: Final = threading.Condition()
+        # Events received for each stream that its thread has not taken yet
+        self._streams: dict[int, deque[H2Event]] = {}
+        # Whether a thread is waiting for the socket to become readable
+        self._reading = False
+        self._error: BaseException | None = None
+        # Close once the last stream finishes
+        self._closing = False
+        with self._condition:
+            self._h2.initiate()
+            self._flush()
+
+    def close(self):
+        with self._condition:
+            self._closing = True
+            self.reusable = False
+            if self._error is None:
+                self._error = ConnectionError("Connection closed")
+                try:
+                    self._h2.close()
+                    self._flush()
+                except OSError:
+                    pass
+            self._condition.notify_all()
+        self._socket.close()
+
+    def close_when_idle(self) -> None:
+        """Stop taking new requests and close once in-flight streams finish."""
+        with self._condition:
+            self._closing = True
+            idle = not self._streams
+        if idle:
+            self.close()
+
+    def is_alive(self) -> bool:
+        """
+        Whether new requests can be sent. Frames that arrived meanwhile are
+        processed first, so a GOAWAY or a closed socket is noticed.
+        """
+        with self._condition:
+            if not self._reading and self._error is None:
+                try:
+                    while (
+                        self._socket.pending()
+                        or select.select([self._socket], [], [], 0)[0]
+                    ):
+                        self._receive()
+                except (OSError, H2Error, ConnectionError) as error:
+                    self._fail(error)
+            return (
+                self._error is None
+                and self._h2.terminated is None
+                and not self._closing
+            )
+
+    def request(
+        self,
+        request: HttpRequest,
+        encoder: HttpRequestEncoder | None = None,
+    ) -> HttpResponse:
+        stopwatch = _stopwatch(self, 0)
+        return self._receive_response(request, self._open_stream(request), stopwatch)
+
+    def request_pipelined(
+        self,
+        requests: list[HttpRequest],
+        encoder: HttpRequestEncoder | None = None,
+    ) -> list[HttpResponse]:
+        """
+        Send `requests` on concurrent streams and return their responses in
+        order. Any method may be multiplexed; requests beyond the server's
+        stream limit are sent as earlier responses complete.
+        """
+        pending = deque[tuple[HttpRequest, int, _Stopwatch]]()
+        responses = []
+        for request in requests:
+            while pending and not self._can_open_stream():
+                responses.append(self._receive_response(*pending.popleft()))
+            stopwatch = _stopwatch(self, 0, reused=bool(responses or pending))
+            pending.append((request, self._open_stream(request), stopwatch))
+        while pending:
+            responses.append(self._receive_response(*pending.popleft()))
+        return responses
+
+    def request_stream(
+        self,
+        request: HttpRequest,
+        encoder: HttpRequestEncoder | None = None,
+    ) -> StreamingHttpResponse:
+        """
+        Send a request and return as soon as the response head has arrived.
+        Closing the body before its end cancels the stream only.
+        """
+        stream_id = self._open_stream(request)
+
+        def on_close(
+            complete: bool, status: StatusLine, headers: Mapping[str, str]
+        ) -> None:
+            self._finish_stream(stream_id)
+
+        try:
+            return _streaming_response(
+                request, self._response_events(stream_id), on_close
+            )
+        except BaseException:
+            self._finish_stream(stream_id)
+            raise
+
+    def _receive_response(
+        self, request: HttpRequest, stream_id: int, stopwatch: _Stopwatch
+    ) -> HttpResponse:
+        assembler = _ResponseAssembler(request, None)
+        try:
+            for event in self._response_events(stream_id):
+                stopwatch.received(
+                    len(event.data) if isinstance(event, BodyChunk) else 0
+                )
+                if (response := assembler.receive([event])) is not None:
+                    with self._condition:
+                        self.responses += 1
+                    return stopwatch.timed(response)
+        finally:
+            self._finish_stream(stream_id)
+        raise AssertionError("Response ended without EndOfMessage")
+
+    def _can_open_stream(self) -> bool:
+        with self._condition:
+            return self._h2.can_open_stream()
+
+    def _open_stream(self, request: HttpRequest) -> int:
+        headers = self._request_headers(request)
+        with self._condition:
+            while True:
+                self._raise_if_unusable()
+                if self._h2.can_open_stream():
                     break
-                body += self._reader.read(content_length + 2).strip()
-        elif headers.get("content-length") is not None:
-            content_length = int(headers["content-length"])
-            body = self._reader.read(content_length)
-        else:
-            body = self._reader.read()
-
-        match headers.get("content-encoding"):
-            case "gzip":
-                import gzip
-
-                body = gzip.decompress(body)
-            case None:
-                pass
-            case _:
-                raise Exception("Unknown content encoding")
-
-        return HttpResponse(
-            version=version,
-            status_code=int(status_code),
-            status_message=status_message,
-            headers=HeaderMap(headers),
-            body=body,
-            request=request,
+                # Wait for a stream to finish and free a slot
+                self._condition.wait()
+            stream_id = self._h2.send_headers(headers)
+            self._streams[stream_id] = deque()
+            self._flush()
+        return stream_id
+
+    def _finish_stream(self, stream_id: int) -> None:
+        """Stop receiving a stream, cancelling it if its response is incomplete."""
+        with self._condition:
+            if self._streams.pop(stream_id, None) is None:
+                return
+            self._h2.reset_stream(stream_id)
+            try:
+                self._flush()
+            except OSError as error:
+                self._fail(error)
+            self._condition.notify_all()
+            close = self._closing and not self._streams
+            if not close:
+                self._remember_tls_session()
+        if close:
+            self.close()
+
+    def _request_headers(self, request: HttpRequest) -> list[tuple[str, str]]:
+        # (ref https://httpwg.org/specs/rfc9113.html#HttpRequest)
+        fields = HeaderMap(request.headers)
+        authority = fields.get("host")
+        if authority is None:
+            host, port = self._origin
+            authority = host if port in (None, 443) else f"{host}:{port}"
+        return [
+            (":method", request.method),
+            (":scheme", "https"),
+            (":authority", authority),
+            (":path", request.path),
+        ] + [
+            (name, value)
+            for name, value in fields.items()
+            if name not in _CONNECTION_SPECIFIC_FIELDS
+            and (name != "te" or value == "trailers")
+        ]
+
+    def _response_events(self, stream_id: int) -> Iterator[ResponseEvent]:
+        """Translate the frames of a stream into HTTP/1.1 parser events."""
+        final = False
+        while True:
+            match self._next_event(stream_id):
+                case HeadersReceived(headers=fields, end_stream=end_stream):
+                    if final:
+                        yield EndOfMessage(_response_fields(fields))
+                        return
+                    status_code, headers = _response_head(fields)
+                    if 100 <= status_code < 200 and not end_stream:
+                        # Interim responses (e.g. 103 Early Hints) precede the final one
+                        continue
+                    final = True
+                    try:
+                        status_message = HTTPStatus(status_code).phrase
+                    except ValueError:
+                        status_message = ""
+                    yield StatusLine("HTTP/2", status_code, status_message)
+                    yield Headers(headers)
+                    if end_stream:
+                        yield EndOfMessage({})
+                        return
+                case DataReceived(
+                    data=data, end_stream=end_stream, flow_controlled_length=length
+                ):
+                    if not final:
+                        raise HttpParseError("DATA frame before the response head")
+                    if data:
+                        yield BodyChunk(data)
+                    # Only give the window back once the data was consumed
+                    with self._condition:
+                        self._h2.acknowledge_received_data(stream_id, length)
+                        self._flush()
+                    if end_stream:
+                        yield EndOfMessage({})
+                        return
+                case StreamReset(error_code=error_code):
+                    raise ConnectionError(
+                        f"Stream reset by the server: {_error_name(error_code)}"
+                    )
+
+    def _next_event(self, stream_id: int) -> H2Event:
+        while True:
+            with self._condition:
+                while not (queue := self._streams[stream_id]) and self._reading:
+                    self._condition.wait()
+                if queue:
+                    return queue.popleft()
+                self._raise_if_failed()
+                self._reading = True
+            # Wait without holding the lock, so that other threads can send
+            try:
+                if not self._socket.pending():
+                    readable, _, _ = select.select(
+                        [self._socket], [], [], self._socket.gettimeout()
+                    )
+                    if not readable:
+                        raise TimeoutError("timed out")
+            except BaseException as error:
+                with self._condition:
+                    self._reading = False
+                    self._fail(error)
+                raise
+            with self._condition:
+                self._reading = False
+                try:
+                    self._receive()
+                except BaseException as error:
+                    self._fail(error)
+                    raise
+                finally:
+                    self._condition.notify_all()
+
+    def _receive(self) -> None:
+        # Called with the lock held and the socket readable
+        data = self._socket.recv(RECEIVE_BUFFER_SIZE)
+        if not data:
+            raise ConnectionError("Connection closed by the server")
+        for event in self._h2.receive_data(data):
+            if isinstance(event, HeadersReceived | DataReceived | StreamReset):
+                if (queue := self._streams.get(event.stream_id)) is not None:
+                    queue.append(event)
+                continue
+            # GOAWAY: streams above the last one were not processed and may
+            # be retried on a new connection
+            self.reusable = False
+            for stream_id, queue in self._streams.items():
+                if stream_id > event.last_stream_id:
+                    queue.append(StreamReset(stream_id, ErrorCode.REFUSED_STREAM))
+        self._flush()
+
+    def _flush(self) -> None:
+        if data := self._h2.data_to_send():
+            self._socket.sendall(data)
+
+    def _fail(self, error: BaseException) -> None:
+        # Every stream fails with the connection
+        if self._error is None:
+            self._error = error
+        self.reusable = False
+        self._condition.notify_all()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise ConnectionError("HTTP/2 connection failed") from self._error
+
+    def _raise_if_unusable(self) -> None:
+        self._raise_if_failed()
+        if self._closing or self._h2.terminated is not None:
+            raise ConnectionError("HTTP/2 connection is shutting down")
+
+
+# HTTP/2 does not use these header fields
+# (ref https://httpwg.org/specs/rfc9113.html#ConnectionSpecific)
+_CONNECTION_SPECIFIC_FIELDS = frozenset(
+    (
+        "connection",
+        "host",
+        "keep-alive",
+        "proxy-connection",
+        "transfer-encoding",
+        "upgrade",
+    )
+)
+
+
+def _response_head(fields: list[tuple[str, str]]) -> tuple[int, dict[str, str]]:
+    status = None
+    for name, value in fields:
+        if name == ":status":
+            status = value
+    if status is None or not status.isdigit() or len(status) != 3:
+        raise HttpParseError(f"Invalid :status pseudo-header: {status!r}")
+    return int(status), _response_fields(fields)
+
+
+def _response_fields(fields: list[tuple[str, str]]) -> dict[str, str]:
+    headers = dict[str, str]()
+    for name, value in fields:
+        if name.startswith(":"):
+            continue
+        # Cookies are split into one field each to compress better
+        separator = "; " if name == "cookie" else ", "
+        headers[name] = (
+            f"{headers[name]}{separator}{value}" if name in headers else value
+        )
+    return headers
+
+
+def _error_name(error_code: int) -> str:
+    try:
+        return ErrorCode(error_code).name
+    except ValueError:
+        return str(error_code)
+
+
+def _streaming_response(
+    request: HttpRequest,
+    events: Iterator[ResponseEvent],
+    on_close: Callable[[bool, StatusLine, Mapping[str, str]], None],
+) -> StreamingHttpResponse:
+    status = next(events)
+    headers = next(events)
+    assert isinstance(status, StatusLine) and isinstance(headers, Headers)
+
+    def body_chunks() -> Iterator[bytes]:
+        for event in events:
+            match event:
+                case BodyChunk(data=data):
+                    yield bytes(data)
+                case EndOfMessage(trailers=trailers):
+                    body.trailers = HeaderMap(trailers)
+
+    body = BodyStream(
+        decode_chunks(headers.headers.get("content-encoding"), body_chunks()),
+        lambda complete: on_close(complete, status, headers.headers),
+    )
+    return StreamingHttpResponse(
+        version=status.version,
+        status_code=status.status_code,
+        status_message=status.status_message,
+        headers=HeaderMap(headers.headers),
+        body=body,
+        request=request,
+    )
+
+
+class AsyncConnection:
+    """HTTP connection driven by asyncio streams"""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        read_timeout: float | None = None,
+    ) -> None:
+        self._reader: Final = reader
+        self._writer: Final = writer
+        self._read_timeout: Final = read_timeout
+        self._parser: HttpResponseParser | None = None
+        self.reusable = True
+        self.responses = 0
+        # Seconds the server keeps the connection open while idle, from the
+        # Keep-Alive header of its last response
+        self.keep_alive_timeout: int | None = None
+        # asyncio resolves, connects and shakes hands in one call, all of
+        # which is timed as connecting
+        self.connect_timing: ConnectTiming | None = None
+
+    @classmethod
+    async def open(
+        cls,
+        scheme: Literal["http", "https"],
+        host: str,
+        port: int | None = None,
+        *,
+        timeouts: Timeouts | None = None,
+    ):
+        # asyncio resolves the name itself and races addresses like Connection
+        timeouts = timeouts or DEFAULT_TIMEOUTS
+        connect_start = time.monotonic()
+        async with asyncio.timeout(timeouts.connect):
+            reader, writer = await asyncio.open_connection(
+                host,
+                port or DEFAULT_PORT[scheme],
+                ssl=tls.get_ssl_context() if scheme == "https" else None,
+                happy_eyeballs_delay=CONNECTION_ATTEMPT_DELAY,
+                interleave=1,
+            )
+        # asyncio cannot resume a cached session, but its handshakes are counted
+        if (ssl_object := writer.get_extra_info("ssl_object")) is not None:
+            tls.count_handshake(ssl_object)
+        connection = cls(reader, writer, timeouts.read)
+        connection.connect_timing = ConnectTiming(
+            None, None, connect_start, time.monotonic()
         )
+        return connection
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
 
+    def is_alive(self) -> bool:
+        # The event loop feeds EOF to the reader as soon as the peer closes
+        return not (self._writer.is_closing() or self._reader.at_eof())
+
+    @property
+    def idle_timeout(self) -> float | None:
+        """How long the connection may stay idle and still be reused."""
+        return _idle_timeout(self.keep_alive_timeout)
+
+    async def request(
+        self,
+        request: HttpRequest,
+        encoder: HttpRequestEncoder | None = None,
+    ) -> HttpResponse:
+        encoder = encoder or HttpRequestEncoder()
 
-# Unit is seconds
+        data = encoder.encode(request)
+        stopwatch = _stopwatch(self, len(data))
+        self._writer.write(data)
+        await self._writer.drain()
+
+        parser = self._parser = _start_response(self._parser, request)
+        assembler = _ResponseAssembler(request, parser)
+        events = parser.feed()
+        while (response := assembler.receive(events)) is None:
+            async with asyncio.timeout(self._read_timeout):
+                data = await self._reader.read(RECEIVE_BUFFER_SIZE)
+            if data:
+                stopwatch.received(len(data))
+                events = parser.feed(data)
+            else:
+                events = parser.feed_eof()
+
+        self.responses += 1
+        if not _is_reusable(parser, response.version, response.headers):
+            self.reusable = False
+        if (timeout := _keep_alive_timeout(response.headers)) is not None:
+            self.keep_alive_timeout = timeout
+        return stopwatch.timed(response)
+
+
+class _ResponseAssembler:
+    """
+    Collects the events of one response into an HttpResponse. A content-coded
+    body is decoded chunk by chunk as it arrives, so `body` holds decoded bytes;
+    the payload as received is kept too if the request asks for it.
+    """
+
+    def __init__(self, request: HttpRequest, parser: HttpResponseParser | None) -> None:
+        self._request: Final = request
+        self._parser: Final = parser
+        self._status: StatusLine | None = None
+        self._headers: dict[str, str] = {}
+        # None while the body is not content-coded
+        self._decoder: ContentDecoder | None = None
+        # None unless the request keeps the encoded body
+        self._encoded = BodyBuffer() if request.keep_encoded_body else None
+        self.body = BodyBuffer()
+
+    @property
+    def is_identity(self) -> bool:
+        """Whether received body bytes can be written to `body` as they are"""
+        return self._decoder is None
+
+    def receive(self, events: list[ResponseEvent]) -> HttpResponse | None:
+        for event in events:
+            match event:
+                case StatusLine():
+                    self._status = event
+                case Headers(headers=headers):
+                    self._headers = headers
+                    decoder = ContentDecoder(headers.get("content-encoding"))
+                    if not decoder.is_identity:
+                        self._decoder = decoder
+                    elif self._parser is not None and isinstance(
+                        content_length := self._parser.framing, int
+                    ):
+                        # Preallocated up to a bound, since the length comes
+                        # from the peer and may be anything
+                        self.body = BodyBuffer(
+                            min(content_length, BODY_PREALLOCATE_MAX_SIZE)
+                        )
+                case BodyChunk(data=data):
+                    if self._decoder is None:
+                        self.body.extend(data)
+                    else:
+                        if self._encoded is not None:
+                            self._encoded.extend(data)
+                        self.body.extend(self._decoder.decode(data))
+                case EndOfMessage(trailers=trailers):
+                    assert self._status is not None
+                    if self._decoder is not None:
+                        self.body.extend(self._decoder.flush())
+                    return HttpResponse(
+                        version=self._status.version,
+                        status_code=self._status.status_code,
+                        status_message=self._status.status_message,
+                        headers=HeaderMap(self._headers),
+                        body=self.body.getvalue(),
+                        request=self._request,
+                        trailers=HeaderMap(trailers),
+                        encoded_body=None
+                        if self._decoder is None or self._encoded is None
+                        else self._encoded.getvalue(),
+                    )
+        return None
+
+
+def _stopwatch(
+    connection: Connection | AsyncConnection, bytes_sent: int, reused: bool = False
+) -> _Stopwatch:
+    # The first request on a connection is charged with opening it
+    reused = reused or connection.responses > 0
+    return _Stopwatch(None if reused else connection.connect_timing, reused, bytes_sent)
+
+
+def _started_at(response: HttpResponse, fetch_start: float) -> HttpResponse:
+    if response.timing is None:
+        return response
+    return dataclasses.replace(response, timing=response.timing.started_at(fetch_start))
+
+
+def _start_response(
+    parser: HttpResponseParser | None, request: HttpRequest
+) -> HttpResponseParser:
+    # Each connection keeps one parser so that bytes received past the end of
+    # a response are not lost.
+    if parser is None:
+        return HttpResponseParser(request.method)
+    parser.start(request.method)
+    return parser
+
+
+def _is_reusable(
+    parser: HttpResponseParser, version: str, headers: Mapping[str, str]
+) -> bool:
+    # A body delimited by the peer closing the connection leaves nothing to reuse
+    if parser.framing is None:
+        return False
+    # The server answers no more requests on the connection
+    keep_alive = headers.get("keep-alive")
+    if keep_alive is not None and parse_keep_alive(keep_alive).max == 0:
+        return False
+    return _is_persistent(version, headers)
+
+
+def _keep_alive_timeout(headers: Mapping[str, str]) -> int | None:
+    if (keep_alive := headers.get("keep-alive")) is None:
+        return None
+    return parse_keep_alive(keep_alive).timeout
+
+
+def _idle_timeout(keep_alive_timeout: int | None) -> float | None:
+    if keep_alive_timeout is None:
+        return None
+    return max(keep_alive_timeout - KEEP_ALIVE_TIMEOUT_MARGIN, 0)
+
+
+def _is_persistent(version: str, headers: Mapping[str, str]) -> bool:
+    connection = headers.get("connection")
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+# Unit is seconds. A connection idle for longer than this is not reused.
 CONNECTION_LIFETIME = 119
+# Unit is seconds. Idle connections that expired or were closed by their
+# server are closed this often, instead of when their origin is next visited.
+CONNECTION_REAP_INTERVAL = 5
 
 
 @dataclass(frozen=True, eq=True)
@@ -118,8 +1010,189 @@ class ConnectionCacheKey:
     port: int
 
 
-# Key is ConnectionCacheKey, value is tuple of Connection and expiration time
-_connection_cache: dict[ConnectionCacheKey, tuple[Connection, int]] = {}
+# Connection state is shared by every thread making requests. The pool locks
+# itself, and the HTTP/2 state below is guarded by `_http2_lock`, which is
+# never held while connecting or sending. A Connection is used by one request
+# at a time; an Http2Connection by any number of threads.
+_connection_pool = ConnectionPool[ConnectionCacheKey, Connection](
+    idle_timeout=CONNECTION_LIFETIME, reap_interval=CONNECTION_REAP_INTERVAL
+)
+
+
+def connection_pool_stats() -> PoolStats:
+    return _connection_pool.stats()
+
+
+# Unit is seconds. What is learned about an origin's server, e.g. that it
+# does not speak HTTP/2, is forgotten after this long, so that a server that
+# changed since gets another chance.
+ORIGIN_MEMO_TTL = 10 * 60
+# Origins remembered by each memo, the least recently used dropped first
+ORIGIN_MEMO_MAX_ENTRIES = 1024
+
+
+class _OriginMemo:
+    """Origins remembered for ORIGIN_MEMO_TTL, safe to use from any thread"""
+
+    def __init__(self) -> None:
+        self._expires = ShardedMap[ConnectionCacheKey, float](ORIGIN_MEMO_MAX_ENTRIES)
+
+    def add(self, cache_key: ConnectionCacheKey) -> None:
+        self._expires.set(cache_key, time.monotonic() + ORIGIN_MEMO_TTL)
+
+    def __contains__(self, cache_key: ConnectionCacheKey) -> bool:
+        if (expires := self._expires.get(cache_key)) is None:
+            return False
+        if expires > time.monotonic():
+            return True
+        self._expires.discard(cache_key)
+        return False
+
+
+# HTTP/2 connections are shared by every request to their origin instead of
+# being checked out of the pool by one request at a time
+_http2_connections: dict[ConnectionCacheKey, Http2Connection] = {}
+# HTTPS origins that answered over HTTP/1.1, whose connections are opened in
+# parallel. Other HTTPS origins are connected to once first, to learn whether
+# one shared HTTP/2 connection will do.
+_http1_origins = _OriginMemo()
+_first_connection_locks = ShardedMap[ConnectionCacheKey, threading.Lock](
+    ORIGIN_MEMO_MAX_ENTRIES
+)
+_http2_lock = threading.Lock()
+
+
+def _checkout(cache_key: ConnectionCacheKey) -> Connection:
+    if (shared := _get_http2(cache_key)) is not None:
+        return shared
+    if cache_key.scheme != "https" or cache_key in _http1_origins:
+        return _checkout_pooled(cache_key)
+
+    first_connection = _first_connection_locks.get_or_compute(cache_key, threading.Lock)
+    with first_connection:
+        if (shared := _get_http2(cache_key)) is not None:
+            return shared
+        connection = _checkout_pooled(cache_key)
+        if not isinstance(connection, Http2Connection):
+            _http1_origins.add(cache_key)
+            return connection
+        _connection_pool.detach(cache_key, connection)
+        with _http2_lock:
+            _http2_connections[cache_key] = connection
+        return connection
+
+
+def _checkout_pooled(cache_key: ConnectionCacheKey) -> Connection:
+    return _connection_pool.checkout(
+        cache_key,
+        lambda: Connection.open(
+            scheme=cache_key.scheme, host=cache_key.host, port=cache_key.port
+        ),
+    )
+
+
+def _get_http2(cache_key: ConnectionCacheKey) -> Http2Connection | None:
+    with _http2_lock:
+        shared = _http2_connections.get(cache_key)
+    if shared is None or shared.is_alive():
+        return shared
+    _forget_http2(cache_key, shared)
+    return None
+
+
+def _checkin(
+    cache_key: ConnectionCacheKey, connection: Connection, reusable: bool
+) -> None:
+    """
+    Return a connection taken by `_checkout`. A failed request or an
+    unfinished body closes an HTTP/1.1 connection, but only the stream of an
+    HTTP/2 one.
+    """
+    if not isinstance(connection, Http2Connection):
+        _connection_pool.checkin(
+            cache_key,
+            connection,
+            reusable=reusable,
+            idle_timeout=connection.idle_timeout,
+        )
+    elif not connection.reusable:
+        _forget_http2(cache_key, connection)
+
+
+def _forget_http2(cache_key: ConnectionCacheKey, connection: Http2Connection) -> None:
+    with _http2_lock:
+        if _http2_connections.get(cache_key) is connection:
+            del _http2_connections[cache_key]
+    connection.close_when_idle()
+
+
+# Errors of a request on a connection that the server had already closed
+_STALE_CONNECTION_ERRORS = (ConnectionError, ssl.SSLEOFError)
+
+
+def _send[R](
+    cache_key: ConnectionCacheKey,
+    request: HttpRequest,
+    send: Callable[[Connection], R],
+) -> tuple[Connection, R]:
+    """
+    Call `send` with a connection taken by `_checkout`, and return both.
+
+    A server may close an idle connection just as a request is sent on it,
+    which the pool's checks cannot foresee. An idempotent request failing
+    that way on a reused HTTP/1.1 connection is sent once more on another
+    connection. On error the connection is returned to the pool closed.
+    """
+    connection = _checkout(cache_key)
+    reused = connection.responses > 0
+    try:
+        return connection, send(connection)
+    except _STALE_CONNECTION_ERRORS:
+        _checkin(cache_key, connection, reusable=False)
+        if (
+            not reused
+            or isinstance(connection, Http2Connection)
+            or request.method not in IDEMPOTENT_METHODS
+        ):
+            raise
+    except BaseException:
+        _checkin(cache_key, connection, reusable=False)
+        raise
+
+    connection = _checkout(cache_key)
+    try:
+        return connection, send(connection)
+    except BaseException:
+        _checkin(cache_key, connection, reusable=False)
+        raise
+
+
+def request_http_stream(
+    url: HttpFamilyUrl,
+    request: HttpRequest,
+    encoder: HttpRequestEncoder | None = None,
+) -> StreamingHttpResponse:
+    """
+    Like `request_http`, but the body is received while it is read. The
+    connection returns to the pool when the body is closed.
+    """
+    cache_key = ConnectionCacheKey(
+        scheme=url.scheme,
+        host=url.host,
+        port=url.port or get_default_port(url.scheme),
+    )
+
+    connection, response = _send(
+        cache_key,
+        request,
+        lambda connection: connection.request_stream(request, encoder),
+    )
+
+    def on_close(complete: bool) -> None:
+        _checkin(cache_key, connection, reusable=complete and connection.reusable)
+
+    response.body.add_close_callback(on_close)
+    return response
 
 
 def request_http(
@@ -133,31 +1206,150 @@ def request_http(
         port=url.port or get_default_port(url.scheme),
     )
 
-    cached = _connection_cache.get(cache_key)
-    if cached is None:
-        connection = Connection.open(scheme=url.scheme, host=url.host, port=url.port)
-        _connection_cache[cache_key] = (
-            connection,
-            int(time.time()) + CONNECTION_LIFETIME,
-        )
-    else:
-        connection, expiration_time = cached
-        current_time = time.time()
-        if expiration_time < current_time:
-            connection, _ = _connection_cache.pop(cache_key)
-            connection.close()
-
-            connection = Connection.open(
-                scheme=url.scheme, host=url.host, port=url.port
-            )
-            _connection_cache[cache_key] = (
-                connection,
-                int(time.time()) + CONNECTION_LIFETIME,
+    # Includes waiting for a connection, or opening one
+    fetch_start = time.monotonic()
+    connection, response = _send(
+        cache_key,
+        request,
+        lambda connection: connection.request(request, encoder),
+    )
+    _checkin(cache_key, connection, reusable=connection.reusable)
+    return _started_at(response, fetch_start)
+
+
+# Pipelined requests are sent in batches of at most this many
+PIPELINE_DEPTH = 8
+
+# Origins that stopped answering a pipelined batch part way get one request
+# at a time for ORIGIN_MEMO_TTL
+_no_pipelining = _OriginMemo()
+
+
+def request_http_pipelined(
+    url: HttpFamilyUrl,
+    requests: list[HttpRequest],
+    encoder: HttpRequestEncoder | None = None,
+) -> list[HttpResponse]:
+    """
+    Like `request_http` for several requests to the origin of `url`, but
+    pipelined on one connection. Requests left unanswered when the server
+    stops pipelining are sent again one at a time. Over HTTP/2 they are all
+    sent at once on concurrent streams instead.
+    """
+    cache_key = ConnectionCacheKey(
+        scheme=url.scheme,
+        host=url.host,
+        port=url.port or get_default_port(url.scheme),
+    )
+
+    responses: list[HttpResponse] = []
+    while len(responses) < len(requests):
+        remaining = requests[len(responses) :]
+        if cache_key in _no_pipelining:
+            responses.extend(
+                request_http(url, request, encoder) for request in remaining
             )
+            break
+
+        connection, received = _send(
+            cache_key,
+            remaining[0],
+            lambda connection, remaining=remaining: connection.request_pipelined(
+                _pipelined_batch(connection, remaining), encoder
+            ),
+        )
+        _checkin(cache_key, connection, reusable=connection.reusable)
 
-    response = connection.request(request, encoder)
-    if response.headers.get("connection") == "close":
-        connection, _ = _connection_cache.pop(cache_key)
-        connection.close()
+        if len(received) < len(_pipelined_batch(connection, remaining)):
+            _no_pipelining.add(cache_key)
+        responses.extend(received)
+    return responses
 
-    return response
+
+def _pipelined_batch(
+    connection: Connection, requests: list[HttpRequest]
+) -> list[HttpRequest]:
+    if isinstance(connection, Http2Connection):
+        return requests
+    return requests[:PIPELINE_DEPTH]
+
+
+# asyncio streams are bound to the event loop that opened them, so each loop
+# pools its AsyncConnections apart, with the limits of `_connection_pool`
+_async_connection_pools = weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, AsyncConnectionPool[ConnectionCacheKey, AsyncConnection]
+]()
+
+
+def _async_connection_pool() -> AsyncConnectionPool[
+    ConnectionCacheKey, AsyncConnection
+]:
+    loop = asyncio.get_running_loop()
+    if (pool := _async_connection_pools.get(loop)) is None:
+        pool = _async_connection_pools[loop] = AsyncConnectionPool(
+            idle_timeout=CONNECTION_LIFETIME, reap_interval=CONNECTION_REAP_INTERVAL
+        )
+    return pool
+
+
+def async_connection_pool_stats() -> PoolStats:
+    """Stats of the running event loop's pool."""
+    return _async_connection_pool().stats()
+
+
+async def _request_async(
+    pool: AsyncConnectionPool[ConnectionCacheKey, AsyncConnection],
+    cache_key: ConnectionCacheKey,
+    connection: AsyncConnection,
+    request: HttpRequest,
+    encoder: HttpRequestEncoder | None,
+) -> HttpResponse:
+    # On error the connection is returned to the pool closed
+    try:
+        return await connection.request(request, encoder)
+    except BaseException:
+        await pool.discard(cache_key, connection)
+        raise
+
+
+async def request_http_async(
+    url: HttpFamilyUrl,
+    request: HttpRequest,
+    encoder: HttpRequestEncoder | None = None,
+) -> HttpResponse:
+    """
+    Like `request_http`, on a connection of the running event loop's pool.
+    As in `_send`, an idempotent request is sent once more when a reused
+    connection turns out to have been closed by the server.
+    """
+    fetch_start = time.monotonic()
+    cache_key = ConnectionCacheKey(
+        scheme=url.scheme,
+        host=url.host,
+        port=url.port or get_default_port(url.scheme),
+    )
+    pool = _async_connection_pool()
+
+    def open_connection() -> Awaitable[AsyncConnection]:
+        return AsyncConnection.open(
+            scheme=cache_key.scheme, host=cache_key.host, port=cache_key.port
+        )
+
+    connection = await pool.checkout(cache_key, open_connection)
+    reused = connection.responses > 0
+    try:
+        response = await _request_async(pool, cache_key, connection, request, encoder)
+    except _STALE_CONNECTION_ERRORS:
+        if not reused or request.method not in IDEMPOTENT_METHODS:
+            raise
+        # Once, on a new connection: another idle one may be as stale
+        connection = await pool.checkout(cache_key, open_connection, fresh=True)
+        response = await _request_async(pool, cache_key, connection, request, encoder)
+
+    await pool.checkin(
+        cache_key,
+        connection,
+        reusable=connection.reusable,
+        idle_timeout=connection.idle_timeout,
+    )
+    return _started_at(response, fetch_start)
@@ -0,0 +1,474 @@
+import abc
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+from typing import Protocol
+
+__all__ = (
+    "AsyncConnectionPool",
+    "AsyncPooledConnection",
+    "ConnectionPool",
+    "PoolStats",
+    "PoolTimeout",
+    "PooledConnection",
+)
+
+
+class _Connection(Protocol):
+    def is_alive(self) -> bool: ...
+
+
+class PooledConnection(_Connection, Protocol):
+    def close(self) -> None: ...
+
+
+class AsyncPooledConnection(_Connection, Protocol):
+    async def close(self) -> None: ...
+
+
+class PoolTimeout(Exception):
+    def __init__(self, key: Hashable):
+        super().__init__(f"Timed out waiting for a free connection to {key}")
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    # Checkouts served by an idle connection.
+    hits: int
+    # Checkouts that had to open a new connection.
+    misses: int
+    # Idle connections closed to make room for another origin.
+    evictions: int
+    # Idle connections found dead or expired on checkout.
+    discarded: int
+    # Idle connections found dead or expired by `reap`.
+    reaped: int
+    idle: int
+    in_use: int
+
+
+@dataclass
+class _IdleEntry[C]:
+    connection: C
+    idle_since: float
+    # Seconds the connection may stay idle before it is not reused
+    idle_timeout: float
+
+
+@dataclass
+class _Origin[C]:
+    # Stack of idle connections, most recently used last.
+    idle: list[_IdleEntry[C]] = field(default_factory=list)
+    # Number of open connections (idle + checked out).
+    open: int = 0
+
+
+class _Pool[K: Hashable, C: _Connection](abc.ABC):
+    """
+    The bookkeeping of ConnectionPool and AsyncConnectionPool: everything but
+    waiting for a connection and closing one, which they do their own way.
+    Methods starting with an underscore expect `_condition` to be held.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 6,
+        max_total: int = 64,
+        idle_timeout: float = 119,
+        clock: Callable[[], float] = time.monotonic,
+        reap_interval: float | None = None,
+    ) -> None:
+        if max_per_host < 1 or max_total < max_per_host:
+            raise ValueError("Expected 1 <= max_per_host <= max_total")
+
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self._clock = clock
+        self._reaper: threading.Thread | asyncio.Task[None] | None = None
+
+        self._condition = threading.Condition()
+        self._origins: dict[K, _Origin[C]] = {}
+        # Every idle entry in least recently used order, keyed by id(entry)
+        self._lru: OrderedDict[int, tuple[K, _IdleEntry[C]]] = OrderedDict()
+        self._total_open = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._discarded = 0
+        self._reaped = 0
+
+    def detach(self, key: K, connection: C) -> None:
+        """
+        Free the slot of a connection taken by `checkout` without closing it,
+        for a connection that is managed elsewhere from then on.
+        """
+        with self._condition:
+            self._forget(key, self._origins[key])
+
+    def stats(self) -> PoolStats:
+        with self._condition:
+            idle = len(self._lru)
+            return PoolStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                discarded=self._discarded,
+                reaped=self._reaped,
+                idle=idle,
+                in_use=self._total_open - idle,
+            )
+
+    def _take(self, key: K, to_close: list[C], fresh: bool = False) -> C | bool:
+        """
+        Take an idle connection for `key`, or else a slot to open a new one
+        in (True). False when the caller has to wait for a slot to be freed.
+        Connections found dead or evicted are added to `to_close`. With
+        `fresh`, idle connections are only closed to make room.
+        """
+        while True:
+            origin = self._origins.setdefault(key, _Origin())
+            if fresh:
+                if origin.open >= self.max_per_host and origin.idle:
+                    entry = self._pop_idle(key, origin)
+                    assert entry is not None
+                    self._forget(key, origin)
+                    self._evictions += 1
+                    to_close.append(entry.connection)
+                    continue
+            elif (entry := self._pop_idle(key, origin)) is not None:
+                if self._is_reusable(entry):
+                    self._hits += 1
+                    return entry.connection
+                self._forget(key, origin)
+                self._discarded += 1
+                to_close.append(entry.connection)
+                continue
+
+            if origin.open < self.max_per_host:
+                if self._total_open < self.max_total:
+                    origin.open += 1
+                    self._total_open += 1
+                    self._misses += 1
+                    return True
+                if self._lru:
+                    to_close.append(self._evict_lru())
+                    continue
+            return False
+
+    def _give_up(self, key: K) -> None:
+        # A checkout that timed out leaves no trace of an origin it opened
+        # nothing to
+        if (origin := self._origins.get(key)) is not None and origin.open == 0:
+            del self._origins[key]
+
+    def _add_idle(self, key: K, connection: C, idle_timeout: float | None) -> None:
+        if idle_timeout is None or idle_timeout > self.idle_timeout:
+            idle_timeout = self.idle_timeout
+        entry = _IdleEntry(
+            connection=connection,
+            idle_since=self._clock(),
+            idle_timeout=idle_timeout,
+        )
+        self._origins[key].idle.append(entry)
+        self._lru[id(entry)] = (key, entry)
+        self._wake(all_waiters=False)
+        if self.reap_interval is not None and self._reaper is None:
+            self._start_reaper(self.reap_interval)
+
+    def _expire(self) -> list[C]:
+        """Forget the idle connections that expired or were closed by the peer."""
+        expired = [
+            (key, entry)
+            for key, entry in self._lru.values()
+            if not self._is_reusable(entry)
+        ]
+        for key, entry in expired:
+            del self._lru[id(entry)]
+            origin = self._origins[key]
+            origin.idle.remove(entry)
+            self._forget(key, origin)
+        self._reaped += len(expired)
+        return [entry.connection for _, entry in expired]
+
+    def _drain(self) -> list[C]:
+        """Forget every idle connection."""
+        entries = list(self._lru.values())
+        self._lru.clear()
+        for key, entry in entries:
+            origin = self._origins[key]
+            origin.idle.remove(entry)
+            self._forget(key, origin)
+        return [entry.connection for _, entry in entries]
+
+    def _pop_idle(self, key: K, origin: _Origin[C]) -> _IdleEntry[C] | None:
+        if not origin.idle:
+            return None
+        entry = origin.idle.pop()
+        del self._lru[id(entry)]
+        return entry
+
+    def _is_reusable(self, entry: _IdleEntry[C]) -> bool:
+        if self._clock() - entry.idle_since > entry.idle_timeout:
+            return False
+        return entry.connection.is_alive()
+
+    @abc.abstractmethod
+    def _start_reaper(self, interval: float) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _wake(self, all_waiters: bool) -> None:
+        """Wake checkouts waiting for a slot, since one may be free."""
+
+    def _evict_lru(self) -> C:
+        _, (key, entry) = self._lru.popitem(last=False)
+        origin = self._origins[key]
+        origin.idle.remove(entry)
+        self._forget(key, origin)
+        self._evictions += 1
+        return entry.connection
+
+    def _forget(self, key: K, origin: _Origin[C]) -> None:
+        origin.open -= 1
+        self._total_open -= 1
+        if origin.open == 0:
+            del self._origins[key]
+        self._wake(all_waiters=True)
+
+
+class ConnectionPool[K: Hashable, C: PooledConnection](_Pool[K, C]):
+    """
+    Keeps several idle connections per origin.
+
+    Limits apply to open connections (idle and checked out). When an origin
+    is at `max_per_host`, `checkout` waits until a connection is returned.
+    When the pool is at `max_total`, the least recently used idle connection
+    of any origin is closed to make room.
+
+    Idle connections are checked when they are checked out again. With
+    `reap_interval`, a background thread also closes those that expired or
+    were closed by the peer every `reap_interval` seconds, so their sockets
+    are not held until the next request to their origin. The thread starts
+    with the first checkin and ends once the pool is garbage collected.
+    """
+
+    def checkout(
+        self,
+        key: K,
+        open: Callable[[], C],
+        timeout: float | None = None,
+        fresh: bool = False,
+    ) -> C:
+        """
+        Return an idle connection for `key`, or open a new one with `open`.
+        With `fresh`, a new one is always opened.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        to_close: list[C] = []
+        try:
+            with self._condition:
+                while (taken := self._take(key, to_close, fresh)) is False:
+                    remaining = None if deadline is None else deadline - self._clock()
+                    if remaining is not None and remaining <= 0:
+                        self._give_up(key)
+                        raise PoolTimeout(key)
+                    self._condition.wait(remaining)
+        finally:
+            for connection in to_close:
+                connection.close()
+
+        if taken is not True:
+            return taken
+        try:
+            return open()
+        except BaseException:
+            with self._condition:
+                self._forget(key, self._origins[key])
+            raise
+
+    def checkin(
+        self,
+        key: K,
+        connection: C,
+        reusable: bool = True,
+        idle_timeout: float | None = None,
+    ) -> None:
+        """
+        Return a connection taken by `checkout`. `idle_timeout` shortens the
+        pool's own for this connection, e.g. to the limit its server sent.
+        """
+        if not reusable:
+            self.discard(key, connection)
+            return
+        with self._condition:
+            self._add_idle(key, connection, idle_timeout)
+
+    def discard(self, key: K, connection: C) -> None:
+        """Close a connection taken by `checkout` and free its slot."""
+        self.detach(key, connection)
+        connection.close()
+
+    def reap(self) -> int:
+        """
+        Close the idle connections that expired or were closed by the peer.
+        Returns how many were closed.
+        """
+        with self._condition:
+            expired = self._expire()
+        for connection in expired:
+            connection.close()
+        return len(expired)
+
+    def clear(self) -> None:
+        """Close every idle connection."""
+        with self._condition:
+            idle = self._drain()
+        for connection in idle:
+            connection.close()
+
+    def _start_reaper(self, interval: float) -> None:
+        # The thread only holds a weak reference, so that it does not keep
+        # the pool alive
+        self._reaper = threading.Thread(
+            target=_reap_periodically,
+            args=(weakref.ref(self), interval),
+            name="connection-reaper",
+            daemon=True,
+        )
+        self._reaper.start()
+
+    def _wake(self, all_waiters: bool) -> None:
+        if all_waiters:
+            self._condition.notify_all()
+        else:
+            self._condition.notify()
+
+
+class AsyncConnectionPool[K: Hashable, C: AsyncPooledConnection](_Pool[K, C]):
+    """
+    ConnectionPool for asyncio connections, with the same limits and expiry.
+
+    Connections are bound to the event loop that opened them, so a pool is
+    used from one loop only: checkouts at `max_per_host` wait on it, and with
+    `reap_interval` a task of the loop does the reaping. The task starts with
+    the first checkin and ends once the pool is garbage collected.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 6,
+        max_total: int = 64,
+        idle_timeout: float = 119,
+        clock: Callable[[], float] = time.monotonic,
+        reap_interval: float | None = None,
+    ) -> None:
+        super().__init__(max_per_host, max_total, idle_timeout, clock, reap_interval)
+        # Set whenever a slot may have been freed
+        self._freed = asyncio.Event()
+
+    async def checkout(
+        self,
+        key: K,
+        open: Callable[[], Awaitable[C]],
+        timeout: float | None = None,
+        fresh: bool = False,
+    ) -> C:
+        """Like ConnectionPool.checkout."""
+        to_close: list[C] = []
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    with self._condition:
+                        if (taken := self._take(key, to_close, fresh)) is False:
+                            self._freed.clear()
+                    if taken is not False:
+                        break
+                    await self._freed.wait()
+        except TimeoutError:
+            with self._condition:
+                self._give_up(key)
+            raise PoolTimeout(key) from None
+        finally:
+            for connection in to_close:
+                await connection.close()
+
+        if taken is not True:
+            return taken
+        try:
+            return await open()
+        except BaseException:
+            with self._condition:
+                self._forget(key, self._origins[key])
+            raise
+
+    async def checkin(
+        self,
+        key: K,
+        connection: C,
+        reusable: bool = True,
+        idle_timeout: float | None = None,
+    ) -> None:
+        """Like ConnectionPool.checkin."""
+        if not reusable:
+            await self.discard(key, connection)
+            return
+        with self._condition:
+            self._add_idle(key, connection, idle_timeout)
+
+    async def discard(self, key: K, connection: C) -> None:
+        """Close a connection taken by `checkout` and free its slot."""
+        self.detach(key, connection)
+        await connection.close()
+
+    async def reap(self) -> int:
+        """Like ConnectionPool.reap."""
+        with self._condition:
+            expired = self._expire()
+        for connection in expired:
+            await connection.close()
+        return len(expired)
+
+    async def clear(self) -> None:
+        """Close every idle connection."""
+        with self._condition:
+            idle = self._drain()
+        for connection in idle:
+            await connection.close()
+
+    def _start_reaper(self, interval: float) -> None:
+        # Like the reaper thread of ConnectionPool, the task only holds a
+        # weak reference
+        self._reaper = asyncio.get_running_loop().create_task(
+            _reap_periodically_async(weakref.ref(self), interval)
+        )
+
+    def _wake(self, all_waiters: bool) -> None:
+        # Every waiter wakes and checks again, there are few per loop
+        self._freed.set()
+
+
+def _reap_periodically(pool_ref: weakref.ref[ConnectionPool], interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        if (pool := pool_ref()) is None:
+            return
+        pool.reap()
+        del pool
+
+
+async def _reap_periodically_async(
+    pool_ref: weakref.ref[AsyncConnectionPool], interval: float
+) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        if (pool := pool_ref()) is None:
+            return
+        await pool.reap()
+        del pool
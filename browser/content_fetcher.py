@@ -1,3 +1,6 @@
+from dataclasses import dataclass
+
+from browser.cache import CacheLookup, navigation_cache
 from browser.content import Content
 from browser.handler import RedirectInfo, UrlHandler
 from browser.protocols.about import AboutUrlHandler
@@ -5,10 +8,15 @@ from browser.protocols.data.handler import DataUrlHandler
 from browser.protocols.file.handler import FileUrlHandler
 from browser.protocols.http.handler import HttpHandler
 from browser.protocols.view_source import ViewSourceUrlHandler
+from browser.scheduler import FetchScheduler, Priority, ScheduledFetch
 from browser.url import AboutUrl, Url, UrlParseError
 
+# Redirects followed by one fetch, including upgrades to https
+MAX_REDIRECTS = 20
+
 # Lazy initialization to avoid circular imports
 _handlers: dict[str, UrlHandler] | None = None
+_scheduler: FetchScheduler[Content] | None = None
 
 
 def _initialize_handlers() -> dict[str, UrlHandler]:
@@ -34,28 +42,90 @@ def get_handler(scheme: str) -> UrlHandler | None:
     return handler
 
 
+@dataclass(frozen=True)
+class Navigation:
+    content: Content
+    # HTTP cache lookups of the navigation, one per fetch (redirects included)
+    cache_lookups: list[CacheLookup]
+
+
+def navigate(url_or_str: Url | str, cache_control: str | None = None) -> Navigation:
+    """
+    Fetch like `fetch_content` and report whether each HTTP fetch was served
+    by the cache. `cache_control` is sent as the Cache-Control header of the
+    requests, e.g. "no-cache" to reload or "only-if-cached" to stay offline.
+    """
+    with navigation_cache(cache_control) as navigation:
+        content = fetch_content(url_or_str)
+    return Navigation(content, navigation.lookups)
+
+
+def schedule_fetch(
+    url_or_str: Url | str, priority: Priority = Priority.DOCUMENT
+) -> ScheduledFetch[Content]:
+    """
+    Queue a fetch like `fetch_content`, to run on a worker thread once the
+    more important fetches and the per-host and total limits allow it.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FetchScheduler(fetch_content)
+    return _scheduler.submit(_parse_url(url_or_str), priority)
+
+
 def fetch_content(url_or_str: Url | str) -> Content:
     url = _parse_url(url_or_str)
     return _fetch_content(url)
 
 
-def _fetch_content(url: Url, max_redirects: int = 20) -> Content:
-    if max_redirects <= 0:
-        raise ValueError("Max redirects exceeded")
+def _fetch_content(url: Url, max_redirects: int = MAX_REDIRECTS) -> Content:
+    redirects = _RedirectChain(url, max_redirects)
+    while True:
+        if (handler := get_handler(url.scheme)) is None:
+            raise ValueError(f"Cannot handle {url}")
 
-    result = None
+        match result := handler.fetch(url):
+            case RedirectInfo():
+                url = redirects.follow(_parse_url(result.url))
+            case _:
+                return result
+
+
+async def fetch_content_async(url_or_str: Url | str) -> Content:
+    """
+    Same as `fetch_content`, but lets the caller keep many fetches in flight,
+    e.g. `await asyncio.gather(*map(fetch_content_async, urls))`.
+    """
+    url = _parse_url(url_or_str)
+    redirects = _RedirectChain(url)
     while True:
         if (handler := get_handler(url.scheme)) is None:
             raise ValueError(f"Cannot handle {url}")
 
-        result = handler.fetch(url)
-        match result:
+        match result := await handler.fetch_async(url):
             case RedirectInfo():
-                return _fetch_content(_parse_url(result.url), max_redirects - 1)
+                url = redirects.follow(_parse_url(result.url))
             case _:
                 return result
 
 
+class _RedirectChain:
+    """The URLs a fetch was redirected through, to stop loops and long chains."""
+
+    def __init__(self, url: Url, max_redirects: int = MAX_REDIRECTS) -> None:
+        self._seen = {url}
+        self._remaining = max_redirects
+
+    def follow(self, url: Url) -> Url:
+        if url in self._seen:
+            raise ValueError(f"Redirect loop at {url}")
+        if self._remaining <= 0:
+            raise ValueError("Max redirects exceeded")
+        self._seen.add(url)
+        self._remaining -= 1
+        return url
+
+
 def _parse_url(url_or_str: str | Url) -> Url:
     if isinstance(url_or_str, Url):
         return url_or_str
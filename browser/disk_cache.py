@@ -0,0 +1,362 @@
+"""
+HTTP cache persisted in a directory, so it survives restarts and can be
+shared by several processes.
+
+The index is a SQLite database and every distinct body is a file in
+`bodies/`, named by its digest. Entries with identical bodies share the
+file, which is deleted with the last entry using it. SQLite's database lock
+is the cross-process lock: the index and the body files only change inside
+an immediate (write) transaction, so a writer never sees the half-written
+files of another.
+"""
+
+import contextlib
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Final
+
+from browser.blob_store import body_digest
+from browser.cache import CacheEntry, HttpCache, variant_key, vary_field_names
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.url import HttpFamilyUrl
+
+__all__ = (
+    "DiskCache",
+    "DiskCacheStats",
+)
+
+# Default budget for the bodies of a DiskCache
+DISK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Seconds to wait for another process writing to the cache
+DISK_CACHE_LOCK_TIMEOUT = 30
+
+_INDEX_FILE = "index.sqlite3"
+_BODIES_DIRECTORY = "bodies"
+
+# Bumped when the index changes; an index of another version is dropped
+_SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE entries (
+    key TEXT NOT NULL,
+    -- The selecting header fields (see browser.cache.variant_key)
+    variant TEXT NOT NULL,
+    vary TEXT NOT NULL,
+    head TEXT NOT NULL,
+    freshness TEXT NOT NULL,
+    body_file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (key, variant)
+);
+CREATE INDEX entries_by_last_used ON entries (last_used);
+CREATE INDEX entries_by_body_file ON entries (body_file);
+"""
+
+
+@dataclass(frozen=True)
+class DiskCacheStats:
+    entries: int
+    # Bytes of the stored bodies, each distinct body counted once, and the
+    # bytes saved by sharing identical ones
+    bytes: int
+    max_bytes: int
+    dedup_saved_bytes: int
+    # Entries dropped by this instance to stay within the budget
+    evictions: int
+    # Entries dropped by the integrity check when the cache was opened
+    repaired: int
+
+
+class DiskCache(HttpCache):
+    """
+    Keeps at most `max_bytes` of distinct bodies in `directory`, evicting the
+    least recently used entries first.
+
+    Opening the cache checks it: a corrupt index is replaced by an empty
+    one, entries whose body file is missing or has the wrong size are
+    dropped, and body files the index does not know are deleted.
+    """
+
+    def __init__(
+        self, directory: str | os.PathLike[str], max_bytes: int = DISK_CACHE_MAX_BYTES
+    ):
+        self.directory: Final = Path(directory)
+        self.max_bytes: Final = max_bytes
+        self._bodies: Final = self.directory / _BODIES_DIRECTORY
+        self._bodies.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the threads of this process
+        self._lock: Final = threading.Lock()
+        self._evictions = 0
+        self._db = self._open()
+        self._repaired: Final = self._check_integrity()
+
+    def get(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> HttpResponse | None:
+        entry = self.lookup(url, request)
+        if entry is None or not entry.freshness.is_fresh(time.time()):
+            return None
+        return entry.response
+
+    def lookup(
+        self, url: HttpFamilyUrl, request: HttpRequest | None = None
+    ) -> CacheEntry | None:
+        with self._lock:
+            # Usually one variant
+            rows = self._db.execute(
+                "SELECT rowid, variant, vary, head, freshness, body_file"
+                " FROM entries WHERE key = ?",
+                (_key(url),),
+            ).fetchall()
+            row = next(
+                (
+                    row
+                    for row in rows
+                    if row[1] == _variant(tuple(json.loads(row[2])), request)
+                ),
+                None,
+            )
+            if row is None:
+                return None
+            rowid, _, _, head, freshness, body_file = row
+            self._db.execute(
+                "UPDATE entries SET last_used = ? WHERE rowid = ?", (time.time(), rowid)
+            )
+        try:
+            body = self._read_body(body_file)
+        except FileNotFoundError:
+            # Replaced or evicted by another process since the index was read
+            return None
+        return CacheEntry(
+            _decode_response(json.loads(head), body),
+            Freshness(**json.loads(freshness)),
+        )
+
+    def set(
+        self, url: HttpFamilyUrl, response: HttpResponse, freshness: Freshness
+    ) -> None:
+        key = _key(url)
+        vary = vary_field_names(response)
+        variant = None if vary is None else _variant(vary, response.request)
+        with self._transaction() as db:
+            outdated = []
+            for rowid, stored_variant, stored_vary, body_file in db.execute(
+                "SELECT rowid, variant, vary, body_file FROM entries WHERE key = ?",
+                (key,),
+            ).fetchall():
+                # Replaced, or outdated by a response that varies differently
+                if stored_variant == variant or stored_vary != json.dumps(vary):
+                    db.execute("DELETE FROM entries WHERE rowid = ?", (rowid,))
+                    outdated.append(body_file)
+            if variant is not None and len(response.body) <= self.max_bytes:
+                self._insert(db, key, variant, vary, response, freshness)
+            # After the insert, which may share one of them
+            for body_file in outdated:
+                self._release_body(db, body_file)
+
+    def _insert(
+        self,
+        db: sqlite3.Connection,
+        key: str,
+        variant: str,
+        vary: tuple[str, ...],
+        response: HttpResponse,
+        freshness: Freshness,
+    ) -> None:
+        body_file = body_digest(response.body)
+        path = self._bodies / body_file
+        if not path.exists():
+            # Renamed into place, so the name never refers to a partial body
+            partial = path.with_suffix(".partial")
+            partial.write_bytes(response.body)
+            partial.replace(path)
+        db.execute(
+            "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                variant,
+                json.dumps(vary),
+                json.dumps(_encode_response(response)),
+                json.dumps(dataclasses.asdict(freshness)),
+                body_file,
+                len(response.body),
+                time.time(),
+            ),
+        )
+        self._evict(db)
+
+    def stats(self) -> DiskCacheStats:
+        with self._lock:
+            entries, referenced = self._db.execute(
+                "SELECT count(*), coalesce(sum(size), 0) FROM entries"
+            ).fetchone()
+            size = _stored_bytes(self._db)
+            return DiskCacheStats(
+                entries=entries,
+                bytes=size,
+                max_bytes=self.max_bytes,
+                dedup_saved_bytes=referenced - size,
+                evictions=self._evictions,
+                repaired=self._repaired,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _open(self) -> sqlite3.Connection:
+        path = self.directory / _INDEX_FILE
+        try:
+            db = _connect(path)
+            if db.execute("PRAGMA quick_check").fetchone() != ("ok",):
+                db.close()
+                raise sqlite3.DatabaseError("index failed quick_check")
+            return db
+        except sqlite3.DatabaseError:
+            # Start over with an empty index; the integrity check then deletes
+            # the bodies it referred to
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{path}{suffix}").unlink(missing_ok=True)
+            return _connect(path)
+
+    def _check_integrity(self) -> int:
+        repaired = 0
+        with self._transaction() as db:
+            known = set[str]()
+            for rowid, body_file, size in db.execute(
+                "SELECT rowid, body_file, size FROM entries"
+            ).fetchall():
+                try:
+                    intact = (self._bodies / body_file).stat().st_size == size
+                except FileNotFoundError:
+                    intact = False
+                if intact:
+                    known.add(body_file)
+                else:
+                    db.execute("DELETE FROM entries WHERE rowid = ?", (rowid,))
+                    repaired += 1
+            # Left by a writer that crashed, or by a dropped index
+            for path in self._bodies.iterdir():
+                if path.name not in known:
+                    path.unlink(missing_ok=True)
+        return repaired
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        size = _stored_bytes(db)
+        if size <= self.max_bytes:
+            return
+        for rowid, body_file, entry_size in db.execute(
+            "SELECT rowid, body_file, size FROM entries ORDER BY last_used"
+        ).fetchall():
+            db.execute("DELETE FROM entries WHERE rowid = ?", (rowid,))
+            self._evictions += 1
+            # Only the last entry sharing a body frees its bytes
+            if self._release_body(db, body_file):
+                size -= entry_size
+                if size <= self.max_bytes:
+                    break
+
+    def _read_body(self, body_file: str) -> bytes:
+        # HttpResponse.body is bytes, so the body is read into one directly:
+        # the file is sized up front and read in a single call
+        return (self._bodies / body_file).read_bytes()
+
+    def _release_body(self, db: sqlite3.Connection, body_file: str) -> bool:
+        """Delete the body file if no entry uses it any more."""
+        if db.execute(
+            "SELECT 1 FROM entries WHERE body_file = ? LIMIT 1", (body_file,)
+        ).fetchone():
+            return False
+        (self._bodies / body_file).unlink(missing_ok=True)
+        return True
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    db = sqlite3.connect(
+        path,
+        timeout=DISK_CACHE_LOCK_TIMEOUT,
+        # Transactions are begun explicitly
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        (version,) = db.execute("PRAGMA user_version").fetchone()
+        if version != _SCHEMA_VERSION:
+            # Its body files are deleted by the integrity check
+            db.execute("DROP TABLE IF EXISTS entries")
+            for statement in filter(str.strip, _SCHEMA.split(";")):
+                db.execute(statement)
+            db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    db.execute("COMMIT")
+    return db
+
+
+def _stored_bytes(db: sqlite3.Connection) -> int:
+    (size,) = db.execute(
+        "SELECT coalesce(sum(size), 0)"
+        " FROM (SELECT DISTINCT body_file, size FROM entries)"
+    ).fetchone()
+    return size
+
+
+def _key(url: HttpFamilyUrl) -> str:
+    return json.dumps(dataclasses.astuple(url))
+
+
+def _variant(vary: tuple[str, ...], request: HttpRequest | None) -> str:
+    return json.dumps(variant_key(vary, request))
+
+
+def _encode_response(response: HttpResponse) -> dict:
+    request = response.request
+    return {
+        "version": response.version,
+        "status_code": response.status_code,
+        "status_message": response.status_message,
+        "headers": list(response.headers.items()),
+        "trailers": list(response.trailers.items()),
+        "request": {
+            "method": request.method,
+            "path": request.path,
+            "headers": request.headers,
+            "version": request.version,
+        },
+    }
+
+
+def _decode_response(head: dict, body: bytes) -> HttpResponse:
+    return HttpResponse(
+        version=head["version"],
+        status_code=head["status_code"],
+        status_message=head["status_message"],
+        headers=HeaderMap(map(tuple, head["headers"])),
+        body=body,
+        request=HttpRequest(**head["request"]),
+        trailers=HeaderMap(map(tuple, head["trailers"])),
+    )
@@ -14,3 +14,10 @@ class UrlHandler(abc.ABC):
     @abc.abstractmethod
     def fetch(self, url: Url) -> Content | RedirectInfo:
         pass
+
+    async def fetch_async(self, url: Url) -> Content | RedirectInfo:
+        """
+        Handlers that do network I/O override this so that many fetches can be
+        in flight at once. The rest answer synchronously.
+        """
+        return self.fetch(url)
@@ -0,0 +1,160 @@
+import codecs
+import contextlib
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from typing import Self
+
+from browser.protocols.http.header_map import HeaderMap
+
+__all__ = (
+    "BodyBuffer",
+    "BodyStream",
+    "iter_text",
+)
+
+
+class BodyBuffer:
+    """
+    Growable buffer that a message body is received into.
+
+    Sockets write into the free space returned by `reserve` (e.g. with
+    `socket.recv_into`), so body bytes are not copied between intermediate
+    objects while the message arrives. Capacity doubles when it runs out,
+    which keeps receiving a body of any number of chunks linear in its size.
+    """
+
+    def __init__(self, capacity: int = 0) -> None:
+        self._data = bytearray(capacity)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def reserve(self, size: int) -> memoryview:
+        """Return a writable view of `size` free bytes at the end of the body."""
+        needed = self._length + size
+        if needed > len(self._data):
+            self._data += bytes(max(needed, 2 * len(self._data)) - len(self._data))
+        return memoryview(self._data)[self._length : needed]
+
+    def commit(self, size: int) -> None:
+        """Mark `size` bytes written into the reserved space as part of the body."""
+        if self._length + size > len(self._data):
+            raise ValueError("Committed more bytes than reserved")
+        self._length += size
+
+    def extend(self, data: bytes | bytearray | memoryview) -> None:
+        with self.reserve(len(data)) as view:
+            view[:] = data
+        self.commit(len(data))
+
+    def getvalue(self) -> bytes:
+        with memoryview(self._data) as view, view[: self._length] as body:
+            return bytes(body)
+
+
+# Bodies larger than this are moved from memory to a temporary file by
+# `BodyStream.spool`. Unit is bytes.
+DEFAULT_SPOOL_THRESHOLD = 8 * 1024 * 1024
+
+
+class BodyStream:
+    """
+    Message body that is received while it is being read.
+
+    Iterate over it for chunks as they arrive, or call `read` for a number of
+    bytes. `close` must be called (or the stream used as a context manager) so
+    that the connection underneath can be reused or closed.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterator[bytes],
+        on_close: Callable[[bool], None] | None = None,
+    ) -> None:
+        self._chunks = chunks
+        self._close_callbacks = [] if on_close is None else [on_close]
+        self._pending = b""
+        self._closed = False
+        self.complete = False
+        # Filled in once the whole body has been received
+        self.trailers = HeaderMap()
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._pending:
+            pending, self._pending = self._pending, b""
+            yield pending
+        while (chunk := self._next_chunk()) is not None:
+            yield chunk
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            return b"".join(self)
+
+        parts = [self._pending]
+        length = len(self._pending)
+        while length < size and (chunk := self._next_chunk()) is not None:
+            parts.append(chunk)
+            length += len(chunk)
+        data = b"".join(parts)
+        self._pending = data[size:]
+        return data[:size]
+
+    def spool(
+        self, max_memory: int = DEFAULT_SPOOL_THRESHOLD
+    ) -> tempfile.SpooledTemporaryFile[bytes]:
+        """
+        Receive the rest of the body into a file object positioned at its
+        start. It stays in memory until it grows past `max_memory` bytes and
+        is moved to a temporary file from then on.
+        """
+        with contextlib.ExitStack() as stack:
+            file = stack.enter_context(
+                tempfile.SpooledTemporaryFile(max_size=max_memory)
+            )
+            for chunk in self:
+                file.write(chunk)
+            # Only closed if receiving fails; the caller owns it from here
+            stack.pop_all()
+        file.seek(0)
+        return file
+
+    def add_close_callback(self, callback: Callable[[bool], None]) -> None:
+        """Call `callback(complete)` when the stream is closed."""
+        self._close_callbacks.append(callback)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for callback in self._close_callbacks:
+            callback(self.complete)
+
+    def _next_chunk(self) -> bytes | None:
+        if self._closed:
+            return None
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self.complete = True
+            self.close()
+            return None
+        except BaseException:
+            self.close()
+            raise
+
+
+def iter_text(chunks: Iterable[bytes], charset: str) -> Iterator[str]:
+    """Decode a body chunk by chunk, even when a character spans two chunks."""
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    for chunk in chunks:
+        if text := decoder.decode(chunk):
+            yield text
+    if text := decoder.decode(b"", final=True):
+        yield text
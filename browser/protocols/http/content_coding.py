@@ -0,0 +1,230 @@
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import Protocol
+
+try:
+    from compression import zstd
+except ImportError:
+    # Python may be built without libzstd
+    zstd = None
+
+__all__ = (
+    "ContentDecoder",
+    "DecodedSizeExceeded",
+    "UnsupportedContentEncoding",
+    "accept_encoding",
+    "decode_chunks",
+    "decode_content",
+    "supported_content_codings",
+)
+
+
+# Ceiling on the decoded size of one body, so that a small compressed body
+# (a "compression bomb") cannot exhaust memory. None disables it. Unit is bytes.
+MAX_DECODED_SIZE: int | None = 256 * 1024 * 1024
+
+
+class UnsupportedContentEncoding(Exception):
+    def __init__(self, content_coding: str):
+        super().__init__(f"Unknown content encoding: {content_coding}")
+
+
+class DecodedSizeExceeded(Exception):
+    def __init__(self, max_size: int):
+        super().__init__(f"Decoded body is larger than {max_size} bytes")
+
+
+class _Decompressor(Protocol):
+    """Decoder of a single content coding"""
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        """Return at most `max_length` bytes (no limit when it is 0)."""
+        ...
+
+    def flush(self) -> bytes: ...
+
+
+class _ZlibDecompressor:
+    def __init__(self, wbits: int) -> None:
+        self._wbits = wbits
+        self._decompressor = zlib.decompressobj(wbits)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        output = self._decompressor.decompress(data, max_length)
+        # A gzip body may hold several members, each needing a new decompressor
+        while self._decompressor.eof and (unused := self._decompressor.unused_data):
+            self._decompressor = zlib.decompressobj(self._wbits)
+            if max_length and len(output) >= max_length:
+                return output
+            remaining = max_length - len(output) if max_length else 0
+            output += self._decompressor.decompress(unused, remaining)
+        return output
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+
+class _DeflateDecompressor:
+    """
+    "deflate" is zlib-wrapped deflate (ref https://httpwg.org/specs/rfc9110.html#deflate.coding),
+    but some servers send raw deflate data. Fall back to it if the first bytes
+    are not a zlib header.
+    """
+
+    def __init__(self) -> None:
+        self._decompressor: _ZlibDecompressor | None = None
+        # Bytes held back until the two header bytes have arrived
+        self._head = b""
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        if self._decompressor is None:
+            self._head += data
+            if len(self._head) < 2:
+                return b""
+            data, self._head = self._head, b""
+            wbits = zlib.MAX_WBITS if _is_zlib_header(data) else -zlib.MAX_WBITS
+            self._decompressor = _ZlibDecompressor(wbits)
+        return self._decompressor.decompress(data, max_length)
+
+    def flush(self) -> bytes:
+        if self._decompressor is None:
+            if self._head:
+                raise zlib.error("Truncated deflate body")
+            return b""
+        return self._decompressor.flush()
+
+
+def _is_zlib_header(data: bytes) -> bool:
+    # ref https://www.rfc-editor.org/rfc/rfc1950#section-2.2
+    return data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0
+
+
+class _ZstdDecompressor:
+    def __init__(self) -> None:
+        assert zstd is not None
+        self._decompressor = zstd.ZstdDecompressor()
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        assert zstd is not None
+        output = self._decompressor.decompress(data, max_length or -1)
+        # Frames may be concatenated, each needing a new decompressor
+        while self._decompressor.eof and (unused := self._decompressor.unused_data):
+            self._decompressor = zstd.ZstdDecompressor()
+            if max_length and len(output) >= max_length:
+                return output
+            remaining = max_length - len(output) if max_length else -1
+            output += self._decompressor.decompress(unused, remaining)
+        return output
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _create_decompressor(content_coding: str) -> _Decompressor:
+    match content_coding:
+        case "gzip" | "x-gzip":
+            return _ZlibDecompressor(16 + zlib.MAX_WBITS)
+        case "deflate":
+            return _DeflateDecompressor()
+        case "zstd" if zstd is not None:
+            return _ZstdDecompressor()
+        case _:
+            raise UnsupportedContentEncoding(content_coding)
+
+
+def supported_content_codings() -> list[str]:
+    return ["gzip", "deflate"] + (["zstd"] if zstd is not None else [])
+
+
+def accept_encoding() -> str:
+    """Value of the Accept-Encoding request header"""
+    return ", ".join(supported_content_codings())
+
+
+class ContentDecoder:
+    """
+    Decodes a body, chunk by chunk, from the codings listed in its
+    Content-Encoding header (ref https://httpwg.org/specs/rfc9110.html#field.content-encoding).
+    """
+
+    def __init__(
+        self, content_encoding: str | None, max_size: int | None = None
+    ) -> None:
+        self.max_size = MAX_DECODED_SIZE if max_size is None else max_size
+        self._decoded_size = 0
+        # Codings are listed in the order they were applied, so undo them in reverse
+        self._decompressors = [
+            _create_decompressor(coding)
+            for coding in reversed(_parse_content_encoding(content_encoding))
+        ]
+
+    @property
+    def is_identity(self) -> bool:
+        return not self._decompressors
+
+    def decode(self, data: bytes | memoryview) -> bytes:
+        output = bytes(data)
+        for decompressor in self._decompressors:
+            output = decompressor.decompress(output, self._max_length())
+            self._check_size(output)
+        self._count(output)
+        return output
+
+    def flush(self) -> bytes:
+        output = b""
+        for decompressor in self._decompressors:
+            if output:
+                output = decompressor.decompress(output, self._max_length())
+            output += decompressor.flush()
+            self._check_size(output)
+        self._count(output)
+        return output
+
+    def _max_length(self) -> int:
+        # One byte over the limit is enough to tell that it was exceeded
+        if self.max_size is None:
+            return 0
+        return self.max_size - self._decoded_size + 1
+
+    def _check_size(self, output: bytes) -> None:
+        if (
+            self.max_size is not None
+            and self._decoded_size + len(output) > self.max_size
+        ):
+            raise DecodedSizeExceeded(self.max_size)
+
+    def _count(self, output: bytes) -> None:
+        self._decoded_size += len(output)
+
+
+def decode_chunks(
+    content_encoding: str | None,
+    chunks: Iterable[bytes],
+    max_size: int | None = None,
+) -> Iterator[bytes]:
+    decoder = ContentDecoder(content_encoding, max_size)
+    if decoder.is_identity:
+        yield from chunks
+        return
+
+    for chunk in chunks:
+        if data := decoder.decode(chunk):
+            yield data
+    if data := decoder.flush():
+        yield data
+
+
+def decode_content(
+    content_encoding: str | None, body: bytes, max_size: int | None = None
+) -> bytes:
+    return b"".join(decode_chunks(content_encoding, [body], max_size))
+
+
+def _parse_content_encoding(content_encoding: str | None) -> list[str]:
+    if content_encoding is None:
+        return []
+    return [
+        coding
+        for coding in map(str.strip, content_encoding.casefold().split(","))
+        if coding and coding != "identity"
+    ]
@@ -0,0 +1,183 @@
+"""
+Freshness of stored responses (ref https://httpwg.org/specs/rfc9111.html#expiration.model).
+"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import UTC
+from email.utils import parsedate_to_datetime
+
+from browser.protocols.http.headers.cache_control import response as directive
+from browser.protocols.http.headers.cache_control.response import (
+    ResponseCacheControlToken,
+    parse_response_cache_control,
+)
+
+__all__ = (
+    "Freshness",
+    "calculate_freshness",
+    "parse_http_date",
+)
+
+# Heuristic lifetime: this fraction of the time since Last-Modified, as the
+# RFC suggests, but no longer than a week
+# (ref https://httpwg.org/specs/rfc9111.html#heuristic.freshness)
+HEURISTIC_FRACTION = 0.1
+MAX_HEURISTIC_LIFETIME = 7 * 24 * 60 * 60
+
+# Status codes that may be cached without explicit freshness
+# (ref https://httpwg.org/specs/rfc9110.html#overview.of.status.codes)
+HEURISTICALLY_CACHEABLE_STATUS = frozenset(
+    (200, 203, 204, 206, 300, 301, 308, 404, 405, 410, 414, 501)
+)
+
+
+@dataclass(frozen=True)
+class Freshness:
+    """
+    Lifetime and age of a response. Times are epoch seconds, durations are
+    seconds.
+    """
+
+    # How long the response is fresh from its origin
+    lifetime: float
+    # Its age when it was received
+    # (ref https://httpwg.org/specs/rfc9111.html#age.calculations)
+    initial_age: float
+    response_time: float
+    # Whether the lifetime was guessed from Last-Modified
+    heuristic: bool = False
+    # Stale copies must be validated before use, even when asked for with
+    # max-stale (must-revalidate, or no-cache which makes it stale at once)
+    must_revalidate: bool = False
+    # Seconds past its lifetime a stale copy may still be served while it is
+    # refreshed, or when the origin cannot be reached
+    # (ref https://www.rfc-editor.org/rfc/rfc5861)
+    stale_while_revalidate: float = 0
+    stale_if_error: float = 0
+
+    def current_age(self, now: float) -> float:
+        return self.initial_age + (now - self.response_time)
+
+    def remaining(self, now: float) -> float:
+        """Seconds the response stays fresh; negative once it is stale."""
+        return self.lifetime - self.current_age(now)
+
+    def is_fresh(self, now: float) -> bool:
+        return self.remaining(now) > 0
+
+    @property
+    def expires(self) -> float:
+        """When the response becomes stale"""
+        return self.response_time + self.lifetime - self.initial_age
+
+
+def calculate_freshness(
+    status_code: int,
+    headers: Mapping[str, str],
+    request_time: float,
+    response_time: float,
+    shared: bool = False,
+) -> Freshness:
+    """
+    `headers` are the response header fields (lower case names), received
+    between `request_time` and `response_time`. A browser cache is private;
+    pass `shared` to honour s-maxage instead.
+    """
+    cache_control = headers.get("cache-control")
+    directives = parse_response_cache_control(cache_control) if cache_control else []
+    date = parse_http_date(headers.get("date"))
+    lifetime, heuristic = _freshness_lifetime(
+        status_code, headers, directives, date, response_time, shared
+    )
+    must_revalidate = any(
+        isinstance(d, directive.MustRevalidate | directive.NoCache)
+        or (shared and isinstance(d, directive.SMaxAge))
+        for d in directives
+    )
+    stale_while_revalidate = stale_if_error = 0
+    for d in directives:
+        match d:
+            case directive.StaleWhileRevalidate(delta_seconds=seconds):
+                stale_while_revalidate = seconds
+            case directive.StaleIfError(delta_seconds=seconds):
+                stale_if_error = seconds
+    return Freshness(
+        lifetime=lifetime,
+        initial_age=_initial_age(headers, date, request_time, response_time),
+        response_time=response_time,
+        heuristic=heuristic,
+        must_revalidate=must_revalidate,
+        stale_while_revalidate=stale_while_revalidate,
+        stale_if_error=stale_if_error,
+    )
+
+
+def _freshness_lifetime(
+    status_code: int,
+    headers: Mapping[str, str],
+    directives: list[ResponseCacheControlToken],
+    date: float | None,
+    response_time: float,
+    shared: bool,
+) -> tuple[float, bool]:
+    # (ref https://httpwg.org/specs/rfc9111.html#calculating.freshness.lifetime)
+    max_age = s_maxage = None
+    for d in directives:
+        match d:
+            case directive.NoCache():
+                # Stored, but validated before every use
+                return 0, False
+            case directive.MaxAge(delta_seconds=seconds) if max_age is None:
+                max_age = seconds
+            case directive.SMaxAge(delta_seconds=seconds) if s_maxage is None:
+                s_maxage = seconds
+    if shared and s_maxage is not None:
+        return s_maxage, False
+    if max_age is not None:
+        return max_age, False
+
+    if (expires_value := headers.get("expires")) is not None:
+        # An invalid date, like "0", means already expired
+        if (expires := parse_http_date(expires_value)) is None:
+            return 0, False
+        return max(0.0, expires - (date if date is not None else response_time)), False
+
+    last_modified = parse_http_date(headers.get("last-modified"))
+    if last_modified is not None and (
+        status_code in HEURISTICALLY_CACHEABLE_STATUS
+        or any(isinstance(d, directive.Public) for d in directives)
+    ):
+        since_modified = (date if date is not None else response_time) - last_modified
+        return min(
+            max(0.0, since_modified * HEURISTIC_FRACTION), MAX_HEURISTIC_LIFETIME
+        ), True
+    return 0, False
+
+
+def _initial_age(
+    headers: Mapping[str, str],
+    date: float | None,
+    request_time: float,
+    response_time: float,
+) -> float:
+    # (ref https://httpwg.org/specs/rfc9111.html#age.calculations)
+    age_value = headers.get("age", "").strip()
+    age = int(age_value) if age_value.isdigit() else 0
+    apparent_age = max(0.0, response_time - date) if date is not None else 0.0
+    response_delay = response_time - request_time
+    return max(apparent_age, age + response_delay)
+
+
+def parse_http_date(value: str | None) -> float | None:
+    """Epoch seconds of an HTTP-date (ref https://httpwg.org/specs/rfc9110.html#http.date)"""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        # asctime dates have no zone but are in UTC, like every HTTP-date
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.timestamp()
@@ -0,0 +1,441 @@
+"""
+Sans-IO HTTP/2 client connection (ref https://httpwg.org/specs/rfc9113.html).
+
+`H2Connection` turns requests into frames to send and received bytes into
+events. The caller does all I/O: it sends `data_to_send()` and passes what
+it receives to `receive_data`.
+"""
+
+import struct
+from dataclasses import dataclass, field
+from enum import IntEnum, IntFlag
+
+from browser.protocols.http.hpack import HpackDecoder, HpackEncoder, HpackError
+
+__all__ = (
+    "ConnectionTerminated",
+    "DataReceived",
+    "ErrorCode",
+    "H2Connection",
+    "H2Error",
+    "HeadersReceived",
+    "StreamReset",
+)
+
+PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+
+class FrameType(IntEnum):
+    DATA = 0x0
+    HEADERS = 0x1
+    PRIORITY = 0x2
+    RST_STREAM = 0x3
+    SETTINGS = 0x4
+    PUSH_PROMISE = 0x5
+    PING = 0x6
+    GOAWAY = 0x7
+    WINDOW_UPDATE = 0x8
+    CONTINUATION = 0x9
+
+
+class Flag(IntFlag):
+    END_STREAM = 0x1
+    ACK = 0x1
+    END_HEADERS = 0x4
+    PADDED = 0x8
+    PRIORITY = 0x20
+
+
+class ErrorCode(IntEnum):
+    NO_ERROR = 0x0
+    PROTOCOL_ERROR = 0x1
+    INTERNAL_ERROR = 0x2
+    FLOW_CONTROL_ERROR = 0x3
+    SETTINGS_TIMEOUT = 0x4
+    STREAM_CLOSED = 0x5
+    FRAME_SIZE_ERROR = 0x6
+    REFUSED_STREAM = 0x7
+    CANCEL = 0x8
+    COMPRESSION_ERROR = 0x9
+    CONNECT_ERROR = 0xA
+    ENHANCE_YOUR_CALM = 0xB
+    INADEQUATE_SECURITY = 0xC
+    HTTP_1_1_REQUIRED = 0xD
+
+
+class Setting(IntEnum):
+    HEADER_TABLE_SIZE = 0x1
+    ENABLE_PUSH = 0x2
+    MAX_CONCURRENT_STREAMS = 0x3
+    INITIAL_WINDOW_SIZE = 0x4
+    MAX_FRAME_SIZE = 0x5
+    MAX_HEADER_LIST_SIZE = 0x6
+
+
+# Initial values of settings (ref https://httpwg.org/specs/rfc9113.html#SettingValues)
+DEFAULT_SETTINGS: dict[int, int] = {
+    Setting.HEADER_TABLE_SIZE: 4096,
+    Setting.ENABLE_PUSH: 1,
+    # Unlimited until the peer says otherwise
+    Setting.MAX_CONCURRENT_STREAMS: 2**31 - 1,
+    Setting.INITIAL_WINDOW_SIZE: 65535,
+    Setting.MAX_FRAME_SIZE: 16384,
+    Setting.MAX_HEADER_LIST_SIZE: 2**31 - 1,
+}
+
+MAX_WINDOW_SIZE = 2**31 - 1
+MAX_STREAM_ID = 2**31 - 1
+
+# Flow-control window granted to the server for each stream and for the
+# whole connection. Unit is bytes.
+RECEIVE_WINDOW_SIZE = 4 * 1024 * 1024
+
+_FRAME_HEADER = struct.Struct(">HBBBI")
+
+
+class H2Error(Exception):
+    """Connection error; the whole connection is unusable"""
+
+    def __init__(self, message: str, error_code: ErrorCode = ErrorCode.PROTOCOL_ERROR):
+        super().__init__(message)
+        self.error_code = error_code
+
+
+@dataclass(frozen=True)
+class HeadersReceived:
+    stream_id: int
+    headers: list[tuple[str, str]]
+    end_stream: bool
+
+
+@dataclass(frozen=True)
+class DataReceived:
+    stream_id: int
+    data: bytes
+    end_stream: bool
+    # Bytes of flow-control window taken, padding included
+    flow_controlled_length: int
+
+
+@dataclass(frozen=True)
+class StreamReset:
+    stream_id: int
+    error_code: int
+
+
+@dataclass(frozen=True)
+class ConnectionTerminated:
+    """GOAWAY: streams above `last_stream_id` were not processed."""
+
+    error_code: int
+    last_stream_id: int
+
+
+type H2Event = HeadersReceived | DataReceived | StreamReset | ConnectionTerminated
+
+
+def encode_frame(
+    frame_type: FrameType, flags: int, stream_id: int, payload: bytes = b""
+) -> bytes:
+    length = len(payload)
+    return (
+        _FRAME_HEADER.pack(length >> 8, length & 0xFF, frame_type, flags, stream_id)
+        + payload
+    )
+
+
+@dataclass
+class _Stream:
+    # Flow-control window we granted, and bytes consumed but not yet given back
+    receive_window: int
+    unacknowledged: int = 0
+    headers_received: bool = False
+
+
+@dataclass
+class _HeaderBlock:
+    stream_id: int
+    end_stream: bool
+    fragments: list[bytes] = field(default_factory=list)
+
+
+class H2Connection:
+    """Client side of an HTTP/2 connection."""
+
+    def __init__(self, receive_window_size: int = RECEIVE_WINDOW_SIZE) -> None:
+        self.remote_settings = dict(DEFAULT_SETTINGS)
+        self.remote_settings_received = False
+        self._receive_window_size = receive_window_size
+        self._encoder = HpackEncoder()
+        self._decoder = HpackDecoder()
+        self._outbound = bytearray()
+        self._buffer = bytearray()
+        # Streams that are not closed yet
+        self._streams: dict[int, _Stream] = {}
+        self._next_stream_id = 1
+        self._receive_window = receive_window_size
+        self._unacknowledged = 0
+        self._header_block: _HeaderBlock | None = None
+        self.terminated: ConnectionTerminated | None = None
+
+    def initiate(self) -> None:
+        """Queue the connection preface (ref https://httpwg.org/specs/rfc9113.html#preface)."""
+        settings = {
+            Setting.ENABLE_PUSH: 0,
+            Setting.INITIAL_WINDOW_SIZE: self._receive_window_size,
+        }
+        self._outbound += PREFACE
+        self._outbound += encode_frame(
+            FrameType.SETTINGS,
+            0,
+            0,
+            b"".join(struct.pack(">HI", key, value) for key, value in settings.items()),
+        )
+        # The connection window does not follow INITIAL_WINDOW_SIZE
+        if (
+            increment := self._receive_window_size
+            - DEFAULT_SETTINGS[Setting.INITIAL_WINDOW_SIZE]
+        ):
+            self._outbound += _window_update(0, increment)
+
+    @property
+    def open_streams(self) -> int:
+        return len(self._streams)
+
+    def can_open_stream(self) -> bool:
+        # The first request need not wait for the server's SETTINGS, but the
+        # others wait to learn its limit on concurrent streams
+        return (
+            self.terminated is None
+            and self._next_stream_id <= MAX_STREAM_ID
+            and (self.remote_settings_received or not self._streams)
+            and self.open_streams < self.remote_settings[Setting.MAX_CONCURRENT_STREAMS]
+        )
+
+    def send_headers(
+        self, headers: list[tuple[str, str]], end_stream: bool = True
+    ) -> int:
+        """Open a stream with a request head and return its identifier."""
+        if not self.can_open_stream():
+            raise H2Error("No stream can be opened", ErrorCode.REFUSED_STREAM)
+        stream_id = self._next_stream_id
+        self._next_stream_id += 2
+        self._streams[stream_id] = _Stream(receive_window=self._receive_window_size)
+
+        block = self._encoder.encode(headers)
+        max_size = self.remote_settings[Setting.MAX_FRAME_SIZE]
+        fragments = [block[i : i + max_size] for i in range(0, len(block), max_size)]
+        fragments = fragments or [b""]
+        for i, fragment in enumerate(fragments):
+            flags = Flag.END_HEADERS if i == len(fragments) - 1 else 0
+            if i == 0:
+                frame_type = FrameType.HEADERS
+                flags |= Flag.END_STREAM if end_stream else 0
+            else:
+                frame_type = FrameType.CONTINUATION
+            self._outbound += encode_frame(frame_type, flags, stream_id, fragment)
+        return stream_id
+
+    def reset_stream(
+        self, stream_id: int, error_code: ErrorCode = ErrorCode.CANCEL
+    ) -> None:
+        if self._streams.pop(stream_id, None) is not None:
+            self._outbound += encode_frame(
+                FrameType.RST_STREAM, 0, stream_id, struct.pack(">I", error_code)
+            )
+
+    def close(self, error_code: ErrorCode = ErrorCode.NO_ERROR) -> None:
+        """Queue a GOAWAY frame."""
+        self._outbound += encode_frame(
+            FrameType.GOAWAY, 0, 0, struct.pack(">II", 0, error_code)
+        )
+
+    def acknowledge_received_data(self, stream_id: int, size: int) -> None:
+        """
+        Give `size` bytes of stream flow-control window back to the server
+        once the data of a DataReceived event was consumed. Window updates are
+        batched until half of a window was consumed.
+
+        The connection window is given back as soon as data arrives instead,
+        so that a stream whose data is not read does not stall the others.
+        """
+        if (stream := self._streams.get(stream_id)) is None:
+            return
+        stream.unacknowledged += size
+        if stream.unacknowledged >= self._receive_window_size // 2:
+            self._outbound += _window_update(stream_id, stream.unacknowledged)
+            stream.receive_window += stream.unacknowledged
+            stream.unacknowledged = 0
+
+    def data_to_send(self) -> bytes:
+        data = bytes(self._outbound)
+        self._outbound.clear()
+        return data
+
+    def receive_data(self, data: bytes) -> list[H2Event]:
+        self._buffer += data
+        events: list[H2Event] = []
+        max_size = DEFAULT_SETTINGS[Setting.MAX_FRAME_SIZE]
+        while len(self._buffer) >= _FRAME_HEADER.size:
+            high, low, frame_type, flags, stream_id = _FRAME_HEADER.unpack_from(
+                self._buffer
+            )
+            length = high << 8 | low
+            if length > max_size:
+                raise H2Error("Frame is too large", ErrorCode.FRAME_SIZE_ERROR)
+            end = _FRAME_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            payload = bytes(self._buffer[_FRAME_HEADER.size : end])
+            del self._buffer[:end]
+            self._receive_frame(
+                frame_type, flags, stream_id & MAX_STREAM_ID, payload, events
+            )
+        return events
+
+    def _receive_frame(
+        self,
+        frame_type: int,
+        flags: int,
+        stream_id: int,
+        payload: bytes,
+        events: list[H2Event],
+    ) -> None:
+        if self._header_block is not None and (
+            frame_type != FrameType.CONTINUATION
+            or stream_id != self._header_block.stream_id
+        ):
+            raise H2Error("Expected a CONTINUATION frame")
+
+        match frame_type:
+            case FrameType.DATA:
+                self._receive_data_frame(flags, stream_id, payload, events)
+            case FrameType.HEADERS:
+                payload = _strip_padding(flags, payload)
+                if flags & Flag.PRIORITY:
+                    payload = payload[5:]
+                self._header_block = _HeaderBlock(
+                    stream_id, end_stream=bool(flags & Flag.END_STREAM)
+                )
+                self._receive_header_fragment(flags, payload, events)
+            case FrameType.CONTINUATION:
+                if self._header_block is None:
+                    raise H2Error("Unexpected CONTINUATION frame")
+                self._receive_header_fragment(flags, payload, events)
+            case FrameType.RST_STREAM:
+                if len(payload) != 4:
+                    raise H2Error(
+                        "Invalid RST_STREAM frame", ErrorCode.FRAME_SIZE_ERROR
+                    )
+                self._streams.pop(stream_id, None)
+                (error_code,) = struct.unpack(">I", payload)
+                events.append(StreamReset(stream_id, error_code))
+            case FrameType.SETTINGS:
+                self._receive_settings(flags, payload)
+            case FrameType.PUSH_PROMISE:
+                raise H2Error("Server push was disabled")
+            case FrameType.PING:
+                if len(payload) != 8:
+                    raise H2Error("Invalid PING frame", ErrorCode.FRAME_SIZE_ERROR)
+                if not flags & Flag.ACK:
+                    self._outbound += encode_frame(FrameType.PING, Flag.ACK, 0, payload)
+            case FrameType.GOAWAY:
+                if len(payload) < 8:
+                    raise H2Error("Invalid GOAWAY frame", ErrorCode.FRAME_SIZE_ERROR)
+                last_stream_id, error_code = struct.unpack_from(">II", payload)
+                self.terminated = ConnectionTerminated(
+                    error_code, last_stream_id & MAX_STREAM_ID
+                )
+                events.append(self.terminated)
+            case FrameType.WINDOW_UPDATE:
+                # Requests have no body, so the send windows are not tracked
+                if len(payload) != 4:
+                    raise H2Error(
+                        "Invalid WINDOW_UPDATE frame", ErrorCode.FRAME_SIZE_ERROR
+                    )
+            case _:
+                # PRIORITY is deprecated and unknown frame types must be ignored
+                pass
+
+    def _receive_data_frame(
+        self, flags: int, stream_id: int, payload: bytes, events: list[H2Event]
+    ) -> None:
+        flow_controlled_length = len(payload)
+        self._receive_window -= flow_controlled_length
+        if self._receive_window < 0:
+            raise H2Error("Connection window exceeded", ErrorCode.FLOW_CONTROL_ERROR)
+        self._unacknowledged += flow_controlled_length
+        if self._unacknowledged >= self._receive_window_size // 2:
+            self._outbound += _window_update(0, self._unacknowledged)
+            self._receive_window += self._unacknowledged
+            self._unacknowledged = 0
+
+        if (stream := self._streams.get(stream_id)) is None:
+            # Data sent before the server saw our RST_STREAM
+            return
+        stream.receive_window -= flow_controlled_length
+        if stream.receive_window < 0:
+            raise H2Error("Stream window exceeded", ErrorCode.FLOW_CONTROL_ERROR)
+        if not stream.headers_received:
+            raise H2Error("DATA before HEADERS")
+
+        end_stream = bool(flags & Flag.END_STREAM)
+        if end_stream:
+            del self._streams[stream_id]
+        events.append(
+            DataReceived(
+                stream_id,
+                _strip_padding(flags, payload),
+                end_stream,
+                flow_controlled_length,
+            )
+        )
+
+    def _receive_header_fragment(
+        self, flags: int, payload: bytes, events: list[H2Event]
+    ) -> None:
+        block = self._header_block
+        assert block is not None
+        block.fragments.append(payload)
+        if not flags & Flag.END_HEADERS:
+            return
+        self._header_block = None
+
+        # The block is decoded even for a closed stream, to keep HPACK in sync
+        try:
+            headers = self._decoder.decode(b"".join(block.fragments))
+        except HpackError as error:
+            raise H2Error(str(error), ErrorCode.COMPRESSION_ERROR) from error
+
+        if (stream := self._streams.get(block.stream_id)) is None:
+            return
+        stream.headers_received = True
+        if block.end_stream:
+            del self._streams[block.stream_id]
+        events.append(HeadersReceived(block.stream_id, headers, block.end_stream))
+
+    def _receive_settings(self, flags: int, payload: bytes) -> None:
+        if flags & Flag.ACK:
+            return
+        if len(payload) % 6:
+            raise H2Error("Invalid SETTINGS frame", ErrorCode.FRAME_SIZE_ERROR)
+        self.remote_settings_received = True
+        for key, value in struct.iter_unpack(">HI", payload):
+            self.remote_settings[key] = value
+            if key == Setting.HEADER_TABLE_SIZE:
+                self._encoder.resize(value)
+        self._outbound += encode_frame(FrameType.SETTINGS, Flag.ACK, 0)
+
+
+def _window_update(stream_id: int, increment: int) -> bytes:
+    return encode_frame(
+        FrameType.WINDOW_UPDATE, 0, stream_id, struct.pack(">I", increment)
+    )
+
+
+def _strip_padding(flags: int, payload: bytes) -> bytes:
+    if not flags & Flag.PADDED:
+        return payload
+    if not payload or payload[0] >= len(payload):
+        raise H2Error("Invalid padding")
+    return payload[1 : len(payload) - payload[0]]
@@ -1,26 +1,68 @@
 import dataclasses
+import functools
 import os.path
 import re
 import time
+from collections.abc import Hashable
 from dataclasses import dataclass
-from typing import cast, override
+from typing import override
 
-from browser.cache import HttpCache
-from browser.connection import request_http
+from browser.cache import (
+    BackgroundRefresher,
+    CacheEntry,
+    CacheLookup,
+    CacheStatus,
+    HttpCache,
+    InFlightFetches,
+    NavigationCache,
+    conditional_request,
+    count_hit,
+    count_revalidation,
+    current_navigation,
+    freshen_response,
+    gateway_timeout,
+    may_serve_on_error,
+    select_cached_response,
+    vary_field_names,
+)
+from browser.connection import (
+    get_default_port,
+    request_http,
+    request_http_async,
+    request_http_stream,
+)
 from browser.content import (
     Content,
     UnknownContent,
     recognize_content,
 )
 from browser.handler import RedirectInfo, UrlHandler
+from browser.protocols.http.content_coding import accept_encoding
+from browser.protocols.http.freshness import calculate_freshness
+from browser.protocols.http.headers.cache_control import (
+    request as request_cache_control_token,
+)
 from browser.protocols.http.headers.cache_control import response as cache_control_token
+from browser.protocols.http.headers.cache_control.request import (
+    parse_request_cache_control,
+)
 from browser.protocols.http.headers.cache_control.response import (
     parse_response_cache_control,
 )
+from browser.protocols.http.hsts import HstsStore
 from browser.protocols.http.media_type import InvalidMediaType
 from browser.protocols.http.request import HttpRequest
-from browser.protocols.http.response import HttpResponse
-from browser.singleton import GlobalMemoryCache
+from browser.protocols.http.response import HttpResponse, StreamingHttpResponse
+from browser.protocols.http.timing import ResourceTimings
+from browser.redirect_cache import RedirectCache
+from browser.singleton import (
+    GlobalHstsStore,
+    GlobalInFlightFetches,
+    GlobalMemoryCache,
+    GlobalRedirectCache,
+    GlobalRefresher,
+    GlobalResourceTimings,
+)
 from browser.url import HttpFamilyUrl, Url
 
 __all__ = (
@@ -29,76 +71,381 @@ __all__ = (
 )
 
 
-def get_current_epoch():
-    return int(time.time())
-
-
 HTTP_KEEP_ALIVE_FLAG: bool = True
 
 
 @dataclass(frozen=True)
 class HttpHandler(UrlHandler):
     cache: HttpCache = GlobalMemoryCache
+    # Refreshes the entries served with stale-while-revalidate
+    refresher: BackgroundRefresher = GlobalRefresher
+    # Identical requests made at the same time share one transaction
+    in_flight: InFlightFetches = GlobalInFlightFetches
+    # Followed without a request: redirects remembered, and upgrades to https
+    # for hosts that asked for it with Strict-Transport-Security
+    redirects: RedirectCache = GlobalRedirectCache
+    hsts: HstsStore = GlobalHstsStore
+    # Timings of the responses received from the network
+    timings: ResourceTimings = GlobalResourceTimings
 
     @override
     def fetch(self, url: Url):
         match http_family_url := HttpFamilyUrl.from_url(url):
             case HttpFamilyUrl():
+                if (known := self._known_redirect(http_family_url)) is not None:
+                    return known
                 return self._fetch(http_family_url)
             case _:
                 return RedirectInfo(url="about:blank")
 
+    @override
+    async def fetch_async(self, url: Url):
+        match http_family_url := HttpFamilyUrl.from_url(url):
+            case HttpFamilyUrl():
+                if (known := self._known_redirect(http_family_url)) is not None:
+                    return known
+                fetch_start = time.monotonic()
+                request = self._build_request(http_family_url)
+                stored = self._lookup(http_family_url, request)
+                if isinstance(stored, HttpResponse):
+                    return self._to_content(http_family_url, stored)
+                request = _revalidating(request, stored)
+                result, shared = await self.in_flight.run_async(
+                    _flight_key(http_family_url, request),
+                    functools.partial(
+                        self._send_async, http_family_url, request, stored, fetch_start
+                    ),
+                )
+                if shared:
+                    _record_lookup(http_family_url, CacheStatus.COALESCED)
+                return result
+            case _:
+                return RedirectInfo(url="about:blank")
+
     def _fetch(self, http_family_url: HttpFamilyUrl):
-        request = HttpRequest(
+        # Includes looking up the cache
+        fetch_start = time.monotonic()
+        request = self._build_request(http_family_url)
+        stored = self._lookup(http_family_url, request)
+        if isinstance(stored, HttpResponse):
+            return self._to_content(http_family_url, stored)
+        request = _revalidating(request, stored)
+        result, shared = self.in_flight.run(
+            _flight_key(http_family_url, request),
+            functools.partial(
+                self._send, http_family_url, request, stored, fetch_start
+            ),
+        )
+        if shared:
+            _record_lookup(http_family_url, CacheStatus.COALESCED)
+        return result
+
+    def _send(
+        self,
+        http_family_url: HttpFamilyUrl,
+        request: HttpRequest,
+        stored: CacheEntry | None,
+        fetch_start: float,
+    ) -> Content | RedirectInfo:
+        request_time = time.time()
+        try:
+            response = request_http(http_family_url, request)
+        except OSError:
+            if (stale := self._serve_on_error(http_family_url, stored)) is None:
+                raise
+            return stale
+        response = self._record_timing(http_family_url, response, fetch_start)
+        return self._handle_response(
+            http_family_url, response, stored, request_time, time.time()
+        )
+
+    async def _send_async(
+        self,
+        http_family_url: HttpFamilyUrl,
+        request: HttpRequest,
+        stored: CacheEntry | None,
+        fetch_start: float,
+    ) -> Content | RedirectInfo:
+        request_time = time.time()
+        try:
+            response = await request_http_async(http_family_url, request)
+        except OSError:
+            if (stale := self._serve_on_error(http_family_url, stored)) is None:
+                raise
+            return stale
+        response = self._record_timing(http_family_url, response, fetch_start)
+        return self._handle_response(
+            http_family_url, response, stored, request_time, time.time()
+        )
+
+    def _record_timing(
+        self, http_family_url: HttpFamilyUrl, response: HttpResponse, fetch_start: float
+    ) -> HttpResponse:
+        if response.timing is None:
+            return response
+        timing = response.timing.started_at(fetch_start)
+        self.timings.record(http_family_url, timing)
+        return dataclasses.replace(response, timing=timing)
+
+    def _known_redirect(self, http_family_url: HttpFamilyUrl) -> RedirectInfo | None:
+        if (secure := self.hsts.upgrade(http_family_url)) is not None:
+            return RedirectInfo(url=secure.to_url())
+        if _is_reload(current_navigation()):
+            return None
+        if (target := self.redirects.get(http_family_url)) is not None:
+            _record_lookup(http_family_url, CacheStatus.REMEMBERED_REDIRECT)
+            return RedirectInfo(url=target)
+        return None
+
+    def _lookup(
+        self, http_family_url: HttpFamilyUrl, request: HttpRequest
+    ) -> HttpResponse | CacheEntry | None:
+        """
+        Answer `request` from the cache if its Cache-Control directives allow
+        it, recording the hit in the current navigation. Otherwise the request
+        has to be sent, and the stored entry, if any, is returned to revalidate
+        it or to fall back on when the origin fails.
+        """
+        cache_control = request.headers.get("Cache-Control")
+        directives = parse_request_cache_control(cache_control) if cache_control else []
+        entry = self.cache.lookup(http_family_url, request)
+        status = select_cached_response(entry, directives, time.time())
+
+        match status:
+            case CacheStatus.HIT | CacheStatus.STALE_HIT:
+                assert entry is not None
+                _record_lookup(http_family_url, status)
+                count_hit(entry.response)
+                return entry.response
+            case CacheStatus.STALE_WHILE_REVALIDATE:
+                assert entry is not None
+                _record_lookup(http_family_url, status)
+                count_hit(entry.response)
+                self.refresher.refresh(
+                    http_family_url,
+                    functools.partial(self._refresh, http_family_url, entry),
+                )
+                return entry.response
+            case CacheStatus.UNAVAILABLE:
+                _record_lookup(http_family_url, status)
+                return gateway_timeout(request)
+            case CacheStatus.MISS:
+                return entry
+
+    def _refresh(self, http_family_url: HttpFamilyUrl, stored: CacheEntry) -> None:
+        # On a refresh worker, outside of any navigation
+        fetch_start = time.monotonic()
+        request = _revalidating(self._build_request(http_family_url), stored)
+        request_time = time.time()
+        response = request_http(http_family_url, request)
+        response = self._record_timing(http_family_url, response, fetch_start)
+        self._update_cache(http_family_url, response, stored, request_time, time.time())
+
+    def _build_request(self, http_family_url: HttpFamilyUrl) -> HttpRequest:
+        headers = {
+            "Host": http_family_url.host,
+            "Connection": "keep-alive" if HTTP_KEEP_ALIVE_FLAG else "close",
+            "Accept-Encoding": accept_encoding(),
+        }
+        if (
+            navigation := current_navigation()
+        ) is not None and navigation.cache_control:
+            headers["Cache-Control"] = navigation.cache_control
+        return HttpRequest(
             method="GET",
             path=http_family_url.path or "/",
-            headers={
-                "Host": http_family_url.host,
-                "Connection": "keep-alive" if HTTP_KEEP_ALIVE_FLAG else "close",
-                "Accept-Encoding": "gzip",
-            },
+            headers=headers,
             version="1.1",
+            # Only a cache storing it needs the body as received
+            keep_encoded_body=self.cache.encoded_at_rest
+            and not _forbids_storing(headers.get("Cache-Control")),
         )
-        response = request_http(http_family_url, request)
-        if (cache_control := response.headers.get("cache-control")) is not None:
-            response_cache_control_tokens = parse_response_cache_control(cache_control)
-            max_age_token = cast(
-                cache_control_token.MaxAge | None,
-                next(
-                    filter(
-                        lambda x: isinstance(x, cache_control_token.MaxAge),
-                        response_cache_control_tokens,
-                    ),
-                    None,
-                ),
-            )
-            max_age = get_current_epoch() + (
-                max_age_token.delta_seconds if max_age_token is not None else 5
-            )
-            if not any(
-                map(
-                    lambda x: isinstance(x, cache_control_token.NoStore),
-                    response_cache_control_tokens,
-                )
-            ):
-                self.cache.set(http_family_url, response, max_age)
 
+    def _handle_response(
+        self,
+        http_family_url: HttpFamilyUrl,
+        response: HttpResponse,
+        stored: CacheEntry | None,
+        request_time: float,
+        response_time: float,
+    ) -> Content | RedirectInfo:
+        if http_family_url.scheme == "https" and (
+            policy := response.headers.get("strict-transport-security")
+        ):
+            # Only heeded over https
+            self.hsts.update(http_family_url.host, policy)
+        # A server error may be answered with the stale stored response
         if (
-            300 <= response.status_code < 400
-            and (location_header_value := response.headers.get("location")) is not None
+            response.status_code >= 500
+            and (stale := self._serve_on_error(http_family_url, stored)) is not None
         ):
-            if re.match(r"^[^:/]+://", location_header_value):
-                return RedirectInfo(url=location_header_value)
-            else:
-                # FIXME: resolve relative path via URL.resolve
-                next_path = os.path.join(
-                    http_family_url.path or "/", location_header_value
-                )
-                redirect_url = dataclasses.replace(http_family_url, path=next_path)
-                return RedirectInfo(url=redirect_url.to_url())
+            return stale
+        response, status = self._update_cache(
+            http_family_url, response, stored, request_time, response_time
+        )
+        _record_lookup(http_family_url, status)
+        self._remember_redirect(http_family_url, response, request_time, response_time)
+        return self._to_content(http_family_url, response)
+
+    def _remember_redirect(
+        self,
+        http_family_url: HttpFamilyUrl,
+        response: HttpResponse,
+        request_time: float,
+        response_time: float,
+    ) -> None:
+        if (
+            (redirect := get_redirect(http_family_url, response)) is None
+            or not _may_store(response)
+            # Would depend on the request
+            or vary_field_names(response) != ()
+        ):
+            return
+        freshness = calculate_freshness(
+            response.status_code, response.headers, request_time, response_time
+        )
+        self.redirects.remember(http_family_url, response, redirect.url, freshness)
+
+    def _update_cache(
+        self,
+        http_family_url: HttpFamilyUrl,
+        response: HttpResponse,
+        stored: CacheEntry | None,
+        request_time: float,
+        response_time: float,
+    ) -> tuple[HttpResponse, CacheStatus]:
+        """
+        Store `response`, or freshen the stored entry if it is a 304. Returns
+        the response to use.
+        """
+        status = CacheStatus.MISS
+        if stored is not None and stored.response.has_validators:
+            not_modified = response.status_code == 304
+            count_revalidation(stored.response, not_modified)
+            if not_modified:
+                # The stored body is still current; take the new header fields
+                response = freshen_response(stored.response, response)
+                status = CacheStatus.REVALIDATED
+
+        freshness = calculate_freshness(
+            response.status_code, response.headers, request_time, response_time
+        )
+        # Responses that are stale at once are kept if they can be revalidated
+        if (
+            freshness.lifetime > 0
+            or (response.status_code == 200 and response.has_validators)
+        ) and _may_store(response):
+            self.cache.set(http_family_url, response, freshness)
+        return response, status
+
+    def _serve_on_error(
+        self, http_family_url: HttpFamilyUrl, stored: CacheEntry | None
+    ) -> Content | RedirectInfo | None:
+        if not may_serve_on_error(stored, time.time()):
+            return None
+        assert stored is not None
+        _record_lookup(http_family_url, CacheStatus.STALE_IF_ERROR)
+        count_hit(stored.response)
+        return self._to_content(http_family_url, stored.response)
+
+    def _to_content(
+        self, http_family_url: HttpFamilyUrl, response: HttpResponse
+    ) -> Content | RedirectInfo:
+        if (redirect := get_redirect(http_family_url, response)) is not None:
+            return redirect
 
         return recognize_response(response)
 
+    def fetch_stream(self, url: Url) -> StreamingHttpResponse | RedirectInfo:
+        """
+        Fetch without buffering the body, which is received while it is read.
+        Streamed responses bypass the cache.
+        """
+        match http_family_url := HttpFamilyUrl.from_url(url):
+            case HttpFamilyUrl():
+                response = request_http_stream(
+                    http_family_url, self._build_request(http_family_url)
+                )
+                if (redirect := get_redirect(http_family_url, response)) is not None:
+                    response.body.close()
+                    return redirect
+                return response
+            case _:
+                return RedirectInfo(url="about:blank")
+
+
+def _revalidating(request: HttpRequest, stored: CacheEntry | None) -> HttpRequest:
+    if stored is None:
+        return request
+    return conditional_request(request, stored.response)
+
+
+def _flight_key(http_family_url: HttpFamilyUrl, request: HttpRequest) -> Hashable:
+    """
+    Requests with the same key are interchangeable: same origin, target and
+    header fields, which include the ones a response may vary on.
+    """
+    return (
+        http_family_url.scheme,
+        http_family_url.host.lower(),
+        http_family_url.port or get_default_port(http_family_url.scheme),
+        request.method,
+        request.path,
+        tuple(sorted((name.lower(), value) for name, value in request.headers.items())),
+    )
+
+
+def _is_reload(navigation: NavigationCache | None) -> bool:
+    # no-cache and max-age=0 ask for every response afresh, so remembered
+    # redirects are not followed either. HSTS upgrades still are, being a
+    # policy rather than a cached response.
+    if navigation is None or not navigation.cache_control:
+        return False
+    return any(
+        isinstance(directive, request_cache_control_token.NoCache)
+        or directive == request_cache_control_token.MaxAge(delta_seconds=0)
+        for directive in parse_request_cache_control(navigation.cache_control)
+    )
+
+
+def _record_lookup(http_family_url: HttpFamilyUrl, status: CacheStatus) -> None:
+    if (navigation := current_navigation()) is not None:
+        navigation.lookups.append(CacheLookup(http_family_url, status))
+
+
+def _may_store(response: HttpResponse) -> bool:
+    # no-store on either the response or its request keeps it out of the cache
+    if (cache_control := response.headers.get("cache-control")) is not None and any(
+        isinstance(directive, cache_control_token.NoStore)
+        for directive in parse_response_cache_control(cache_control)
+    ):
+        return False
+    return not _forbids_storing(response.request.headers.get("Cache-Control"))
+
+
+def _forbids_storing(request_cache_control: str | None) -> bool:
+    return request_cache_control is not None and any(
+        isinstance(directive, request_cache_control_token.NoStore)
+        for directive in parse_request_cache_control(request_cache_control)
+    )
+
+
+def get_redirect(
+    http_family_url: HttpFamilyUrl, response: HttpResponse | StreamingHttpResponse
+) -> RedirectInfo | None:
+    if (
+        300 <= response.status_code < 400
+        and (location_header_value := response.headers.get("location")) is not None
+    ):
+        if re.match(r"^[^:/]+://", location_header_value):
+            return RedirectInfo(url=location_header_value)
+        else:
+            # FIXME: resolve relative path via URL.resolve
+            next_path = os.path.join(http_family_url.path or "/", location_header_value)
+            redirect_url = dataclasses.replace(http_family_url, path=next_path)
+            return RedirectInfo(url=redirect_url.to_url())
+    return None
+
 
 def recognize_response(response: HttpResponse) -> Content:
     content_type = response.headers.content_type()
@@ -1,4 +1,3 @@
-# TODO
 from dataclasses import dataclass
 
 
@@ -25,7 +24,8 @@ class MaxAge:
 
 @dataclass(frozen=True)
 class MaxStale:
-    delta_seconds: int
+    # None accepts a stale response of any age
+    delta_seconds: int | None
 
 
 @dataclass(frozen=True)
@@ -60,5 +60,34 @@ def parse_request_cache_control(s: str) -> list[RequestCacheControlToken]:
     """
     Expect to receive a valid Cache-Control header value.
     For instance, when there is "Cache-Control: max-age=3600\r\n" header, the "s" parameter should be "max-age=3600"
+    (ref https://httpwg.org/specs/rfc9111.html#cache-request-directive)
     """
-    ...
+    result: list[RequestCacheControlToken] = []
+    for token in map(str.strip, s.split(",")):
+        if not token:
+            continue
+        name, separator, value = token.partition("=")
+        name = name.strip().lower()
+        value = value.strip().strip('"') if separator else None
+
+        match (name, value):
+            case ("no-cache", None):
+                result.append(NoCache())
+            case ("no-store", None):
+                result.append(NoStore())
+            case ("no-transform", None):
+                result.append(NoTransform())
+            case ("only-if-cached", None):
+                result.append(OnlyIfCached())
+            case ("max-age", str()) if value.isdigit():
+                result.append(MaxAge(delta_seconds=int(value)))
+            case ("max-stale", None):
+                result.append(MaxStale(delta_seconds=None))
+            case ("max-stale", str()) if value.isdigit():
+                result.append(MaxStale(delta_seconds=int(value)))
+            case ("min-fresh", str()) if value.isdigit():
+                result.append(MinFresh(delta_seconds=int(value)))
+            case _:
+                result.append(UnknownToken(name=name, value=value))
+
+    return result
@@ -37,6 +37,33 @@ class MinFresh:
 class MustRevalidate: ...
 
 
+@dataclass(frozen=True)
+class SMaxAge:
+    delta_seconds: int
+
+
+@dataclass(frozen=True)
+class Public: ...
+
+
+@dataclass(frozen=True)
+class Private: ...
+
+
+@dataclass(frozen=True)
+class StaleWhileRevalidate:
+    """(ref https://www.rfc-editor.org/rfc/rfc5861#section-3)"""
+
+    delta_seconds: int
+
+
+@dataclass(frozen=True)
+class StaleIfError:
+    """(ref https://www.rfc-editor.org/rfc/rfc5861#section-4)"""
+
+    delta_seconds: int
+
+
 @dataclass(frozen=True)
 class UnknownToken:
     name: str
@@ -52,6 +79,11 @@ ResponseCacheControlToken = (
     | MaxStale
     | MinFresh
     | MustRevalidate
+    | SMaxAge
+    | Public
+    | Private
+    | StaleWhileRevalidate
+    | StaleIfError
     | UnknownToken
 )
 
@@ -64,8 +96,8 @@ def parse_response_cache_control(s: str) -> list[ResponseCacheControlToken]:
     result: list[ResponseCacheControlToken] = []
     for token in map(str.strip, s.split(",")):
         split = token.split("=")
-        name = split[0]
-        value = split[1] if len(split) > 1 else None
+        name = split[0].lower()
+        value = split[1].strip('"') if len(split) > 1 else None
 
         # Rewrite with match-case
         match (name, value):
@@ -81,14 +113,24 @@ def parse_response_cache_control(s: str) -> list[ResponseCacheControlToken]:
                 result.append(NoTransform())
             case ("only-if-cached", _):
                 result.append(OnlyIfCached())
-            case ("max-age", str()):
+            case ("max-age", str()) if value.isdigit():
                 result.append(MaxAge(delta_seconds=int(value)))
-            case ("max-stale", str()):
+            case ("max-stale", str()) if value.isdigit():
                 result.append(MaxStale(delta_seconds=int(value)))
-            case ("min-fresh", str()):
+            case ("min-fresh", str()) if value.isdigit():
                 result.append(MinFresh(delta_seconds=int(value)))
             case ("must-revalidate", None):
                 result.append(MustRevalidate())
+            case ("s-maxage", str()) if value.isdigit():
+                result.append(SMaxAge(delta_seconds=int(value)))
+            case ("public", None):
+                result.append(Public())
+            case ("private", _):
+                result.append(Private())
+            case ("stale-while-revalidate", str()) if value.isdigit():
+                result.append(StaleWhileRevalidate(delta_seconds=int(value)))
+            case ("stale-if-error", str()) if value.isdigit():
+                result.append(StaleIfError(delta_seconds=int(value)))
             case _:
                 result.append(UnknownToken(name=token, value=value))
 
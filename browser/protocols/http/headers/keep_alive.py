@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class KeepAlive:
+    """
+    Limits a server puts on a persistent connection
+    (ref https://www.rfc-editor.org/rfc/rfc2068#section-19.7.1.1,
+    https://datatracker.ietf.org/doc/html/draft-thomson-hybi-http-timeout-03).
+    """
+
+    # Seconds the server keeps the connection open while it is idle
+    timeout: int | None = None
+    # Requests the server still answers on the connection
+    max: int | None = None
+
+
+def parse_keep_alive(s: str) -> KeepAlive:
+    """
+    Parse a Keep-Alive header value, e.g. "timeout=5, max=100". Unknown and
+    malformed parameters are ignored.
+    """
+    timeout = max_ = None
+    for parameter in map(str.strip, s.split(",")):
+        name, _, value = parameter.partition("=")
+        value = value.strip().strip('"')
+        if not value.isdigit():
+            continue
+        match name.strip().lower():
+            case "timeout":
+                timeout = int(value)
+            case "max":
+                max_ = int(value)
+    return KeepAlive(timeout=timeout, max=max_)
@@ -0,0 +1,413 @@
+"""
+HPACK, the header compression of HTTP/2 (ref https://www.rfc-editor.org/rfc/rfc7541).
+"""
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+
+__all__ = (
+    "HpackDecoder",
+    "HpackEncoder",
+    "HpackError",
+    "huffman_decode",
+    "huffman_encode",
+)
+
+
+class HpackError(Exception):
+    pass
+
+
+# Symbols by the bit length of their Huffman code
+# (ref https://www.rfc-editor.org/rfc/rfc7541#appendix-B). The code is
+# canonical: codes are assigned in order of length, then of symbol, so the
+# lengths are enough to rebuild it. Symbol 256 is EOS.
+_HUFFMAN_SYMBOLS_BY_LENGTH: dict[int, bytes | list[int]] = {
+    5: b"012aceiost",
+    6: b" %-./3456789=A_bdfghlmnpru",
+    7: b":BCDEFGHIJKLMNOPQRSTUVWYjkqvwxyz",
+    8: b"&*,;XZ",
+    10: b"!\"()?",
+    11: b"'+|",
+    12: b"#>",
+    13: b"\x00$@[]~",
+    14: b"^}",
+    15: b"<`{",
+    19: [92, 195, 208],
+    20: [128, 130, 131, 162, 184, 194, 224, 226],
+    21: [153, 161, 167, 172, 176, 177, 179, 209, 216, 217, 227, 229, 230],
+    22: [
+        129, 132, 133, 134, 136, 146, 154, 156, 160, 163, 164, 169, 170,
+        173, 178, 181, 185, 186, 187, 189, 190, 196, 198, 228, 232, 233,
+    ],
+    23: [
+        1, 135, 137, 138, 139, 140, 141, 143, 147, 149, 150, 151, 152, 155,
+        157, 158, 165, 166, 168, 174, 175, 180, 182, 183, 188, 191, 197, 231,
+        239,
+    ],
+    24: [9, 142, 144, 145, 148, 159, 171, 206, 215, 225, 236, 237],
+    25: [199, 207, 234, 235],
+    26: [192, 193, 200, 201, 202, 205, 210, 213, 218, 219, 238, 240, 242, 243, 255],
+    27: [
+        203, 204, 211, 212, 214, 221, 222, 223, 241, 244, 245, 246, 247, 248,
+        250, 251, 252, 253, 254,
+    ],
+    28: [
+        2, 3, 4, 5, 6, 7, 8, 11, 12, 14, 15, 16, 17, 18, 19, 20, 21, 23, 24,
+        25, 26, 27, 28, 29, 30, 31, 127, 220, 249,
+    ],
+    30: [10, 13, 22, 256],
+}  # fmt: skip
+
+_EOS = 256
+
+
+def _build_huffman_code() -> tuple[
+    list[tuple[int, int]], dict[int, tuple[int, int, list[int]]]
+]:
+    # (code, length) of each symbol
+    codes = [(0, 0)] * 257
+    # first code, count and symbols of each length, for decoding
+    by_length = {}
+    code = 0
+    previous_length = 0
+    for length, symbols in sorted(_HUFFMAN_SYMBOLS_BY_LENGTH.items()):
+        code <<= length - previous_length
+        by_length[length] = (code, len(symbols), list(symbols))
+        for symbol in symbols:
+            codes[symbol] = (code, length)
+            code += 1
+        previous_length = length
+    return codes, by_length
+
+
+_HUFFMAN_CODES, _HUFFMAN_DECODING = _build_huffman_code()
+_HUFFMAN_LENGTHS = sorted(_HUFFMAN_DECODING)
+
+
+def huffman_encode(data: bytes) -> bytes:
+    value = 0
+    bits = 0
+    for byte in data:
+        code, length = _HUFFMAN_CODES[byte]
+        value = value << length | code
+        bits += length
+    # Pad with the most significant bits of EOS, which are all ones
+    padding = -bits % 8
+    value = value << padding | (1 << padding) - 1
+    return value.to_bytes((bits + padding) // 8, "big")
+
+
+def huffman_decode(data: bytes) -> bytes:
+    value = int.from_bytes(data, "big")
+    remaining = len(data) * 8
+    output = bytearray()
+    while remaining:
+        if (decoded := _decode_huffman_symbol(value, remaining)) is None:
+            # What is left must be padding: fewer than 8 one bits
+            padding = (1 << remaining) - 1
+            if remaining >= 8 or value & padding != padding:
+                raise HpackError("Invalid Huffman padding")
+            break
+        symbol, length = decoded
+        if symbol == _EOS:
+            raise HpackError("EOS in a Huffman-encoded string")
+        output.append(symbol)
+        remaining -= length
+    return bytes(output)
+
+
+def _decode_huffman_symbol(value: int, remaining: int) -> tuple[int, int] | None:
+    """Decode the symbol in the `remaining` least significant bits of `value`."""
+    for length in _HUFFMAN_LENGTHS:
+        if length > remaining:
+            return None
+        code = value >> remaining - length & (1 << length) - 1
+        first_code, count, symbols = _HUFFMAN_DECODING[length]
+        if 0 <= code - first_code < count:
+            return symbols[code - first_code], length
+    return None
+
+
+# (ref https://www.rfc-editor.org/rfc/rfc7541#appendix-A)
+STATIC_TABLE: tuple[tuple[str, str], ...] = (
+    (":authority", ""),
+    (":method", "GET"),
+    (":method", "POST"),
+    (":path", "/"),
+    (":path", "/index.html"),
+    (":scheme", "http"),
+    (":scheme", "https"),
+    (":status", "200"),
+    (":status", "204"),
+    (":status", "206"),
+    (":status", "304"),
+    (":status", "400"),
+    (":status", "404"),
+    (":status", "500"),
+    ("accept-charset", ""),
+    ("accept-encoding", "gzip, deflate"),
+    ("accept-language", ""),
+    ("accept-ranges", ""),
+    ("accept", ""),
+    ("access-control-allow-origin", ""),
+    ("age", ""),
+    ("allow", ""),
+    ("authorization", ""),
+    ("cache-control", ""),
+    ("content-disposition", ""),
+    ("content-encoding", ""),
+    ("content-language", ""),
+    ("content-length", ""),
+    ("content-location", ""),
+    ("content-range", ""),
+    ("content-type", ""),
+    ("cookie", ""),
+    ("date", ""),
+    ("etag", ""),
+    ("expect", ""),
+    ("expires", ""),
+    ("from", ""),
+    ("host", ""),
+    ("if-match", ""),
+    ("if-modified-since", ""),
+    ("if-none-match", ""),
+    ("if-range", ""),
+    ("if-unmodified-since", ""),
+    ("last-modified", ""),
+    ("link", ""),
+    ("location", ""),
+    ("max-forwards", ""),
+    ("proxy-authenticate", ""),
+    ("proxy-authorization", ""),
+    ("range", ""),
+    ("referer", ""),
+    ("refresh", ""),
+    ("retry-after", ""),
+    ("server", ""),
+    ("set-cookie", ""),
+    ("strict-transport-security", ""),
+    ("transfer-encoding", ""),
+    ("user-agent", ""),
+    ("vary", ""),
+    ("via", ""),
+    ("www-authenticate", ""),
+)
+
+_STATIC_FIELD_INDEX = {field: index for index, field in enumerate(STATIC_TABLE, 1)}
+# Lowest index of each name
+_STATIC_NAME_INDEX = {
+    name: index for index, (name, _) in reversed(list(enumerate(STATIC_TABLE, 1)))
+}
+
+# Default SETTINGS_HEADER_TABLE_SIZE. Unit is bytes.
+DEFAULT_TABLE_SIZE = 4096
+
+
+class _DynamicTable:
+    """(ref https://www.rfc-editor.org/rfc/rfc7541#section-4)"""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        # Newest entry first, as it is indexed
+        self._entries = deque[tuple[str, str]]()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, index: int) -> tuple[str, str]:
+        return self._entries[index]
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        return iter(self._entries)
+
+    def add(self, name: str, value: str) -> None:
+        size = _entry_size(name, value)
+        self.size += size
+        self._entries.appendleft((name, value))
+        self._evict()
+
+    def resize(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.max_size:
+            self.size -= _entry_size(*self._entries.pop())
+
+
+def _entry_size(name: str, value: str) -> int:
+    return 32 + len(name.encode("iso-8859-1")) + len(value.encode("iso-8859-1"))
+
+
+def _encode_integer(value: int, prefix_bits: int, flags: int) -> bytes:
+    """(ref https://www.rfc-editor.org/rfc/rfc7541#section-5.1)"""
+    limit = (1 << prefix_bits) - 1
+    if value < limit:
+        return bytes((flags | value,))
+    output = bytearray((flags | limit,))
+    value -= limit
+    while value >= 128:
+        output.append(value & 0x7F | 0x80)
+        value >>= 7
+    output.append(value)
+    return bytes(output)
+
+
+def _decode_integer(data: bytes, position: int, prefix_bits: int) -> tuple[int, int]:
+    """Return the integer at `position` and the position after it."""
+    limit = (1 << prefix_bits) - 1
+    value = data[position] & limit
+    position += 1
+    if value < limit:
+        return value, position
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise HpackError("Truncated integer")
+        if shift > 28:
+            raise HpackError("Integer is too large")
+        byte = data[position]
+        position += 1
+        value += (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _encode_string(value: str) -> bytes:
+    """(ref https://www.rfc-editor.org/rfc/rfc7541#section-5.2)"""
+    raw = value.encode("iso-8859-1")
+    encoded = huffman_encode(raw)
+    if len(encoded) < len(raw):
+        return _encode_integer(len(encoded), 7, 0x80) + encoded
+    return _encode_integer(len(raw), 7, 0) + raw
+
+
+def _decode_string(data: bytes, position: int) -> tuple[str, int]:
+    if position >= len(data):
+        raise HpackError("Truncated string")
+    huffman = data[position] & 0x80
+    length, position = _decode_integer(data, position, 7)
+    end = position + length
+    if end > len(data):
+        raise HpackError("Truncated string")
+    raw = data[position:end]
+    if huffman:
+        raw = huffman_decode(raw)
+    return raw.decode("iso-8859-1"), end
+
+
+class HpackEncoder:
+    """
+    Encodes header lists into header blocks. Fields are added to the dynamic
+    table so that repeated fields on later requests become a single index,
+    except those listed in `never_indexed`.
+    """
+
+    never_indexed = frozenset(("authorization", "cookie", "proxy-authorization"))
+
+    def __init__(self) -> None:
+        self._table = _DynamicTable(DEFAULT_TABLE_SIZE)
+        self._pending_resize: int | None = None
+
+    def resize(self, max_size: int) -> None:
+        """Apply the decoder's SETTINGS_HEADER_TABLE_SIZE."""
+        max_size = min(max_size, DEFAULT_TABLE_SIZE)
+        if max_size != self._table.max_size:
+            self._table.resize(max_size)
+            self._pending_resize = max_size
+
+    def encode(self, headers: Iterable[tuple[str, str]]) -> bytes:
+        output = bytearray()
+        if self._pending_resize is not None:
+            output += _encode_integer(self._pending_resize, 5, 0x20)
+            self._pending_resize = None
+
+        for name, value in headers:
+            if (index := self._find(name, value)) is not None:
+                output += _encode_integer(index, 7, 0x80)
+                continue
+
+            name_index = self._find_name(name)
+            if name in self.never_indexed:
+                prefix_bits, flags = 4, 0x10
+            else:
+                prefix_bits, flags = 6, 0x40
+            output += _encode_integer(name_index or 0, prefix_bits, flags)
+            if not name_index:
+                output += _encode_string(name)
+            output += _encode_string(value)
+            if flags == 0x40:
+                self._table.add(name, value)
+        return bytes(output)
+
+    def _find(self, name: str, value: str) -> int | None:
+        if (index := _STATIC_FIELD_INDEX.get((name, value))) is not None:
+            return index
+        for index, field in enumerate(self._table, len(STATIC_TABLE) + 1):
+            if field == (name, value):
+                return index
+        return None
+
+    def _find_name(self, name: str) -> int | None:
+        if (index := _STATIC_NAME_INDEX.get(name)) is not None:
+            return index
+        for index, (field_name, _) in enumerate(self._table, len(STATIC_TABLE) + 1):
+            if field_name == name:
+                return index
+        return None
+
+
+class HpackDecoder:
+    """Decodes header blocks into header lists."""
+
+    def __init__(self, max_table_size: int = DEFAULT_TABLE_SIZE) -> None:
+        # Largest size the encoder may choose, from our SETTINGS_HEADER_TABLE_SIZE
+        self.max_table_size = max_table_size
+        self._table = _DynamicTable(max_table_size)
+
+    def decode(self, data: bytes) -> list[tuple[str, str]]:
+        headers = []
+        position = 0
+        while position < len(data):
+            byte = data[position]
+            if byte & 0x80:
+                # Indexed field
+                index, position = _decode_integer(data, position, 7)
+                headers.append(self._get(index))
+            elif byte & 0x40:
+                # Literal field with incremental indexing
+                name, value, position = self._decode_literal(data, position, 6)
+                self._table.add(name, value)
+                headers.append((name, value))
+            elif byte & 0x20:
+                # Dynamic table size update
+                size, position = _decode_integer(data, position, 5)
+                if size > self.max_table_size:
+                    raise HpackError("Dynamic table size update is too large")
+                self._table.resize(size)
+            else:
+                # Literal field without indexing, or never indexed
+                name, value, position = self._decode_literal(data, position, 4)
+                headers.append((name, value))
+        return headers
+
+    def _decode_literal(
+        self, data: bytes, position: int, prefix_bits: int
+    ) -> tuple[str, str, int]:
+        index, position = _decode_integer(data, position, prefix_bits)
+        if index:
+            name, _ = self._get(index)
+        else:
+            name, position = _decode_string(data, position)
+        value, position = _decode_string(data, position)
+        return name, value, position
+
+    def _get(self, index: int) -> tuple[str, str]:
+        if 0 < index <= len(STATIC_TABLE):
+            return STATIC_TABLE[index - 1]
+        if 0 <= index - len(STATIC_TABLE) - 1 < len(self._table):
+            return self._table[index - len(STATIC_TABLE) - 1]
+        raise HpackError(f"Invalid index {index}")
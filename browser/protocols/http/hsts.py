@@ -0,0 +1,126 @@
+"""
+HTTP Strict Transport Security (ref https://www.rfc-editor.org/rfc/rfc6797):
+hosts that asked to be reached over HTTPS only, so that http: URLs to them
+are upgraded before any connection is made.
+"""
+
+import dataclasses
+import ipaddress
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Final
+
+from browser.url import HttpFamilyUrl
+
+__all__ = (
+    "HstsStore",
+    "StrictTransportSecurity",
+    "parse_strict_transport_security",
+)
+
+
+@dataclass(frozen=True)
+class StrictTransportSecurity:
+    max_age: int
+    include_subdomains: bool = False
+
+
+def parse_strict_transport_security(value: str) -> StrictTransportSecurity | None:
+    """
+    Parse a Strict-Transport-Security header field value
+    (ref https://www.rfc-editor.org/rfc/rfc6797#section-6.1). Returns None
+    when it is invalid: without max-age, or with a directive given twice.
+    """
+    directives = dict[str, str | None]()
+    for directive in value.split(";"):
+        name, _, argument = directive.partition("=")
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name in directives:
+            return None
+        directives[name] = argument.strip().strip('"') if argument else None
+
+    match directives.get("max-age"):
+        case str(max_age) if max_age.isdigit():
+            return StrictTransportSecurity(
+                max_age=int(max_age),
+                include_subdomains="includesubdomains" in directives,
+            )
+        case _:
+            return None
+
+
+@dataclass(frozen=True)
+class _KnownHost:
+    expires: float
+    include_subdomains: bool
+
+
+class HstsStore:
+    """The known HSTS hosts, safe to use from any thread."""
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock: Final = threading.Lock()
+        self._hosts: Final = dict[str, _KnownHost]()
+
+    def update(self, host: str, value: str) -> None:
+        """
+        Note the Strict-Transport-Security field `value` of a response
+        received from `host` over HTTPS. The caller checks the transport:
+        the field is ignored over HTTP.
+        """
+        if (policy := parse_strict_transport_security(value)) is None or _is_ip(host):
+            return
+        host = host.lower()
+        with self._lock:
+            if policy.max_age == 0:
+                # The host asks to be forgotten
+                self._hosts.pop(host, None)
+            else:
+                self._hosts[host] = _KnownHost(
+                    self._clock() + policy.max_age, policy.include_subdomains
+                )
+
+    def is_known(self, host: str) -> bool:
+        """
+        Whether `host`, or a superdomain including its subdomains, is a
+        known HSTS host (ref https://www.rfc-editor.org/rfc/rfc6797#section-8.2).
+        """
+        labels = host.lower().split(".")
+        now = self._clock()
+        with self._lock:
+            for i in range(len(labels)):
+                known = self._hosts.get(".".join(labels[i:]))
+                if known is None or (i > 0 and not known.include_subdomains):
+                    continue
+                if known.expires > now:
+                    return True
+        return False
+
+    def upgrade(self, url: HttpFamilyUrl) -> HttpFamilyUrl | None:
+        """
+        The https: URL to use instead of the http: `url`, if its host is a
+        known HSTS host (ref https://www.rfc-editor.org/rfc/rfc6797#section-8.3).
+        """
+        if url.scheme != "http" or not self.is_known(url.host):
+            return None
+        return dataclasses.replace(
+            url, scheme="https", port=None if url.port == 80 else url.port
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+
+
+def _is_ip(host: str) -> bool:
+    # IP literals are never known HSTS hosts
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return True
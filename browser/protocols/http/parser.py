@@ -0,0 +1,370 @@
+import re
+from dataclasses import dataclass, field
+from typing import Literal
+
+__all__ = (
+    "BodyChunk",
+    "EndOfMessage",
+    "Headers",
+    "HttpParseError",
+    "HttpResponseParser",
+    "ResponseEvent",
+    "StatusLine",
+    "get_body_framing",
+)
+
+
+@dataclass(frozen=True)
+class StatusLine:
+    version: str
+    status_code: int
+    status_message: str
+
+
+@dataclass(frozen=True)
+class Headers:
+    # Names are casefolded. Repeated fields are combined with ", ".
+    headers: dict[str, str]
+
+
+@dataclass(frozen=True)
+class BodyChunk:
+    # May be a view into the bytes passed to `feed`, which must not be
+    # modified until the chunk has been consumed.
+    data: bytes | memoryview
+
+
+@dataclass(frozen=True)
+class EndOfMessage:
+    # Fields sent after a chunked body
+    # (ref https://httpwg.org/specs/rfc9112.html#chunked.trailer.section)
+    trailers: dict[str, str] = field(default_factory=dict)
+
+
+ResponseEvent = StatusLine | Headers | BodyChunk | EndOfMessage
+
+
+class HttpParseError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+# Whole chunks smaller than this that arrive together are passed on as one
+SMALL_CHUNK_MAX_SIZE = 1024
+
+_CRLF = re.compile(b"\r\n")
+_HEAD_END = re.compile(b"\r\n\r\n")
+_CHUNK_SIZE_LINE = re.compile(rb"([0-9A-Fa-f]+)[ \t]*(?:;[^\r\n]*)?\r\n")
+
+type _State = Literal[
+    "head",
+    "length",
+    "chunk_size",
+    "chunk_data",
+    "chunk_crlf",
+    "trailers",
+    "eof",
+    "done",
+]
+
+
+class HttpResponseParser:
+    """
+    Sans-IO HTTP/1.1 response parser
+    (ref https://httpwg.org/specs/rfc9112.html)
+
+    Feed it whatever bytes arrive and it returns the events they complete:
+    StatusLine, Headers, any number of BodyChunk, then EndOfMessage. It does no
+    I/O itself, so blocking sockets, asyncio streams and benchmarks drive it
+    the same way. Bytes received after the end of a message are kept for the
+    next one, see `start`.
+    """
+
+    def __init__(self, request_method: str = "GET", max_head_size: int = 64 * 1024):
+        # Also bounds a chunk-size line and the trailer section, which would
+        # otherwise be buffered for as long as the peer sends no CRLF
+        self.max_head_size = max_head_size
+        self._buffer = bytearray()
+        self._state: _State = "head"
+        self._request_method = request_method
+        self._remaining = 0
+        # How far the head, chunk-size line or trailer line being received has
+        # been searched for its end already, so that each feed only searches
+        # the new bytes
+        self._scanned = 0
+        self._trailer_lines: list[str] = []
+        self._trailer_size = 0
+        self.framing: Literal["chunked"] | int | None = None
+
+    @property
+    def is_complete(self) -> bool:
+        return self._state == "done"
+
+    def start(self, request_method: str = "GET") -> None:
+        """Prepare to parse the response to the next request on the connection."""
+        if self._state != "done":
+            raise HttpParseError("Previous response is not complete")
+        self._state = "head"
+        self._request_method = request_method
+        self.framing = None
+
+    def direct_body_size(self) -> int:
+        """
+        How many body bytes the caller may receive straight into its own buffer
+        instead of passing them to `feed`, reporting them with `consume_body`.
+        Zero when the parser has to see the next bytes itself.
+        """
+        if self._buffer or self._state not in ("length", "chunk_data"):
+            return 0
+        return self._remaining
+
+    def consume_body(self, size: int) -> list[ResponseEvent]:
+        """Account for body bytes received outside the parser."""
+        if not 0 < size <= self.direct_body_size():
+            raise HttpParseError("Body bytes were not expected")
+        events: list[ResponseEvent] = []
+        self._remaining -= size
+        if self._remaining == 0:
+            if self._state == "length":
+                self._finish(events)
+            else:
+                self._state = "chunk_crlf"
+        return events
+
+    def feed(self, data: bytes | bytearray | memoryview = b"") -> list[ResponseEvent]:
+        events: list[ResponseEvent] = []
+        if self._buffer:
+            # A line or chunk straddles two reads. Parse the joined bytes and
+            # copy out body chunks, since the buffer is about to be reused.
+            self._buffer += data
+            with memoryview(self._buffer) as view:
+                consumed = self._parse(view, events, copy=True)
+            del self._buffer[:consumed]
+        else:
+            with memoryview(data) as view:
+                consumed = self._parse(view, events, copy=False)
+                self._buffer += view[consumed:]
+        return events
+
+    def feed_eof(self) -> list[ResponseEvent]:
+        """Tell the parser that the peer closed the connection."""
+        match self._state:
+            case "eof":
+                self._state = "done"
+                return [EndOfMessage()]
+            case "done":
+                return []
+            case "head" if not self._buffer:
+                raise ConnectionError("Connection closed before receiving a response")
+            case _:
+                raise HttpParseError("Connection closed in the middle of a response")
+
+    def _parse(self, view: memoryview, events: list[ResponseEvent], copy: bool) -> int:
+        pos = 0
+        end = len(view)
+        while True:
+            match self._state:
+                case "head":
+                    scan_from = pos + max(self._scanned - 3, 0)
+                    if (match := _HEAD_END.search(view, scan_from)) is None:
+                        if end - pos > self.max_head_size:
+                            raise HttpParseError("Response head is too large")
+                        self._scanned = end - pos
+                        return pos
+                    self._scanned = 0
+                    head = bytes(view[pos : match.start()])
+                    pos = match.end()
+                    self._parse_head(head, events)
+                case "length" | "chunk_data":
+                    if pos == end:
+                        return pos
+                    take = min(self._remaining, end - pos)
+                    chunk = view[pos : pos + take]
+                    events.append(BodyChunk(bytes(chunk) if copy else chunk))
+                    pos += take
+                    self._remaining -= take
+                    if self._remaining == 0:
+                        if self._state == "length":
+                            self._finish(events)
+                        else:
+                            self._state = "chunk_crlf"
+                case "chunk_size":
+                    # Chunk size is hexadecimal, optionally followed by extensions
+                    # (ref https://httpwg.org/specs/rfc9112.html#chunked.encoding)
+                    if (line_end := self._line_end(view, pos)) is None:
+                        if end - pos > self.max_head_size:
+                            raise HttpParseError("Chunk size line is too long")
+                        return pos
+                    if line_end - pos > self.max_head_size:
+                        raise HttpParseError("Chunk size line is too long")
+                    if (
+                        run_end := self._complete_chunks(view, pos, events, copy)
+                    ) > pos:
+                        pos = run_end
+                        continue
+                    if (match := _CHUNK_SIZE_LINE.match(view, pos)) is None:
+                        line = bytes(view[pos:line_end])
+                        raise HttpParseError(f"Invalid chunk size: {line!r}")
+                    size = int(match.group(1), 16)
+                    pos = match.end()
+                    if size == 0:
+                        self._state = "trailers"
+                    else:
+                        self._remaining = size
+                        self._state = "chunk_data"
+                case "chunk_crlf":
+                    if end - pos < 2:
+                        return pos
+                    if view[pos : pos + 2] != b"\r\n":
+                        raise HttpParseError("Missing CRLF after chunk data")
+                    pos += 2
+                    self._state = "chunk_size"
+                case "trailers":
+                    line_end = self._line_end(view, pos)
+                    line_size = (end if line_end is None else line_end + 2) - pos
+                    if self._trailer_size + line_size > self.max_head_size:
+                        raise HttpParseError("Trailer section is too large")
+                    if line_end is None:
+                        return pos
+                    self._trailer_size += line_size
+                    line = bytes(view[pos:line_end])
+                    pos = line_end + 2
+                    if line:
+                        self._trailer_lines.append(line.decode("iso-8859-1"))
+                    else:
+                        trailers = _parse_fields(self._trailer_lines)
+                        self._trailer_lines = []
+                        self._trailer_size = 0
+                        self._finish(events, trailers)
+                case "eof":
+                    if pos < end:
+                        chunk = view[pos:end]
+                        events.append(BodyChunk(bytes(chunk) if copy else chunk))
+                    return end
+                case "done":
+                    return pos
+
+    def _line_end(self, view: memoryview, pos: int) -> int | None:
+        """
+        Where the CRLF ending the line at `pos` starts, or None if it has not
+        arrived. Bytes searched before are not searched again.
+        """
+        if (match := _CRLF.search(view, pos + max(self._scanned - 1, 0))) is None:
+            self._scanned = len(view) - pos
+            return None
+        self._scanned = 0
+        return match.start()
+
+    def _complete_chunks(
+        self, view: memoryview, pos: int, events: list[ResponseEvent], copy: bool
+    ) -> int:
+        """
+        Take the chunks that have arrived whole from `pos` on. Consecutive
+        small chunks become one BodyChunk, so that they cost one event and
+        one copy per read instead of one each. Returns where the first chunk
+        not taken starts.
+        """
+        end = len(view)
+        run = list[memoryview]()
+        while (match := _CHUNK_SIZE_LINE.match(view, pos)) is not None:
+            start = match.end()
+            size = int(match.group(1), 16)
+            if size == 0 or end - start < size + 2:
+                break
+            if view[start + size : start + size + 2] != b"\r\n":
+                raise HttpParseError("Missing CRLF after chunk data")
+            chunk = view[start : start + size]
+            pos = start + size + 2
+            if size < SMALL_CHUNK_MAX_SIZE:
+                run.append(chunk)
+                continue
+            _append_chunks(run, events, copy)
+            run.clear()
+            events.append(BodyChunk(bytes(chunk) if copy else chunk))
+        _append_chunks(run, events, copy)
+        return pos
+
+    def _parse_head(self, head: bytes, events: list[ResponseEvent]) -> None:
+        status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+        version, _, rest = status_line.partition(" ")
+        status_code, _, status_message = rest.partition(" ")
+        try:
+            status = StatusLine(version, int(status_code), status_message)
+        except ValueError:
+            raise HttpParseError(f"Invalid status line: {status_line!r}")
+
+        headers = _parse_fields(header_lines)
+
+        if 100 <= status.status_code < 200:
+            # Interim responses (e.g. 100 Continue) precede the final one
+            return
+
+        events.append(status)
+        events.append(Headers(headers))
+
+        if self._request_method == "HEAD" or status.status_code in (204, 304):
+            self.framing = 0
+        else:
+            self.framing = get_body_framing(headers)
+
+        match self.framing:
+            case "chunked":
+                self._state = "chunk_size"
+            case 0:
+                self._finish(events)
+            case int() as content_length:
+                self._remaining = content_length
+                self._state = "length"
+            case None:
+                self._state = "eof"
+
+    def _finish(
+        self, events: list[ResponseEvent], trailers: dict[str, str] | None = None
+    ) -> None:
+        events.append(EndOfMessage(trailers or {}))
+        self._state = "done"
+
+
+def _parse_fields(lines: list[str]) -> dict[str, str]:
+    fields = dict[str, str]()
+    for line in lines:
+        name, separator, value = line.partition(":")
+        if not separator:
+            raise HttpParseError(f"Invalid header line: {line!r}")
+        name = name.strip().casefold()
+        value = value.strip()
+        fields[name] = f"{fields[name]}, {value}" if name in fields else value
+    return fields
+
+
+def get_body_framing(headers: dict[str, str]) -> Literal["chunked"] | int | None:
+    """
+    Tell how the message body is delimited: chunked, by Content-Length, or by
+    the peer closing the connection (None).
+    (ref https://httpwg.org/specs/rfc9112.html#message.body.length)
+    """
+    transfer_coding = headers.get("transfer-encoding", "").rsplit(",", 1)[-1]
+    if transfer_coding.strip().lower() == "chunked":
+        return "chunked"
+    if (content_length := headers.get("content-length")) is None:
+        return None
+    # Repeated identical values may be collapsed into one
+    # (ref https://httpwg.org/specs/rfc9110.html#field.content-length)
+    values = {value.strip() for value in content_length.split(",")}
+    if len(values) != 1 or not _is_digits(value := values.pop()):
+        raise HttpParseError(f"Invalid Content-Length: {content_length!r}")
+    return int(value)
+
+
+def _is_digits(s: str) -> bool:
+    # str.isdigit also accepts non-ASCII digits such as "²"
+    return s.isascii() and s.isdigit()
+
+
+def _append_chunks(
+    chunks: list[memoryview], events: list[ResponseEvent], copy: bool
+) -> None:
+    if len(chunks) == 1 and not copy:
+        events.append(BodyChunk(chunks[0]))
+    elif chunks:
+        events.append(BodyChunk(b"".join(chunks)))
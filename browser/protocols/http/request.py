@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Final, Literal
 
 __all__ = (
@@ -16,6 +16,9 @@ class HttpRequest:
     path: str
     headers: dict[str, str]
     version: Literal["1.0", "1.1"] = "1.0"
+    # Whether a content-coded response also keeps its payload as received
+    # (HttpResponse.encoded_body), for a cache that stores it so
+    keep_encoded_body: bool = field(default=False, compare=False)
 
 
 class HttpRequestEncoder:
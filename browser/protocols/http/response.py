@@ -1,9 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from browser.protocols.http.body import BodyStream
 from browser.protocols.http.request import HttpRequest
 from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.timing import ResourceTiming
 
 
-__all__ = ("HttpResponse",)
+__all__ = ("HttpResponse", "StreamingHttpResponse")
 
 
 @dataclass(frozen=True)
@@ -15,3 +17,50 @@ class HttpResponse:
     body: bytes
 
     request: HttpRequest
+    trailers: HeaderMap = field(default_factory=HeaderMap)
+    # The payload as received when it was content-coded (`body` is decoded)
+    encoded_body: bytes | None = field(default=None, repr=False)
+    # When each phase of the fetch happened, for a response received whole
+    # from a connection
+    timing: ResourceTiming | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def etag(self) -> str | None:
+        """Validator for If-None-Match (ref https://httpwg.org/specs/rfc9110.html#field.etag)"""
+        return self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> str | None:
+        """Validator for If-Modified-Since (ref https://httpwg.org/specs/rfc9110.html#field.last-modified)"""
+        return self.headers.get("last-modified")
+
+    @property
+    def has_validators(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+
+@dataclass(frozen=True)
+class StreamingHttpResponse:
+    """HttpResponse whose body is still being received"""
+
+    version: str
+    status_code: int
+    status_message: str
+    headers: HeaderMap
+    body: BodyStream
+
+    request: HttpRequest
+
+    def read(self) -> HttpResponse:
+        """Receive the rest of the body and return it as an HttpResponse."""
+        with self.body:
+            body = self.body.read()
+        return HttpResponse(
+            version=self.version,
+            status_code=self.status_code,
+            status_message=self.status_message,
+            headers=self.headers,
+            body=body,
+            request=self.request,
+            trailers=self.body.trailers,
+        )
@@ -0,0 +1,174 @@
+"""
+Timings of HTTP fetches, to tell which phase made a slow fetch slow:
+resolving the name, connecting, the TLS handshake, waiting for the first
+byte of the response, or receiving the rest of it. Modelled on the Resource
+Timing API (ref https://www.w3.org/TR/resource-timing/#sec-performanceresourcetiming).
+
+Timestamps are time.monotonic() values, durations are in seconds.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import math
+import threading
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Final
+
+from browser.url import HttpFamilyUrl
+
+__all__ = (
+    "ConnectTiming",
+    "Phase",
+    "ResourceTiming",
+    "ResourceTimingStats",
+    "ResourceTimings",
+)
+
+# Timings kept by ResourceTimings, the oldest dropped first
+RESOURCE_TIMINGS_MAX_ENTRIES = 10_000
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+class Phase(StrEnum):
+    DNS = "dns"
+    CONNECT = "connect"
+    TLS = "tls"
+    # From sending the request to the first byte of the response
+    TTFB = "ttfb"
+    # From the first byte of the response to its last
+    DOWNLOAD = "download"
+    # From the start of the fetch to the last byte of the response
+    TOTAL = "total"
+
+
+@dataclass(frozen=True)
+class ConnectTiming:
+    """When a connection was opened. Phases it skipped are None."""
+
+    dns_start: float | None
+    dns_end: float | None
+    connect_start: float
+    connect_end: float
+    tls_start: float | None = None
+    tls_end: float | None = None
+
+
+@dataclass(frozen=True)
+class ResourceTiming:
+    """When each phase of fetching one response happened."""
+
+    fetch_start: float
+    # The connection opened for the fetch; None when one was reused
+    connect: ConnectTiming | None
+    request_start: float
+    response_start: float
+    response_end: float
+    reused_connection: bool
+    # Bytes written and read on the connection, head and framing included.
+    # Over HTTP/2, whose connection is shared, only the body is counted.
+    bytes_sent: int
+    bytes_received: int
+
+    def duration(self, phase: Phase) -> float | None:
+        """How long `phase` took, or None if it did not happen."""
+        connect = self.connect
+        match phase:
+            case Phase.DNS if connect is not None:
+                return _span(connect.dns_start, connect.dns_end)
+            case Phase.CONNECT if connect is not None:
+                return connect.connect_end - connect.connect_start
+            case Phase.TLS if connect is not None:
+                return _span(connect.tls_start, connect.tls_end)
+            case Phase.TTFB:
+                return self.response_start - self.request_start
+            case Phase.DOWNLOAD:
+                return self.response_end - self.response_start
+            case Phase.TOTAL:
+                return self.response_end - self.fetch_start
+            case _:
+                # A phase of opening a connection, over a reused one
+                return None
+
+    def started_at(self, fetch_start: float) -> ResourceTiming:
+        """
+        The timing of a fetch that started at `fetch_start`, for a caller
+        that did work before the connection was used, e.g. waiting for one.
+        """
+        if fetch_start >= self.fetch_start:
+            return self
+        return dataclasses.replace(self, fetch_start=fetch_start)
+
+
+def _span(start: float | None, end: float | None) -> float | None:
+    if start is None or end is None:
+        return None
+    return end - start
+
+
+@dataclass(frozen=True)
+class ResourceTimingStats:
+    entries: int
+    reused_connections: int
+    bytes_sent: int
+    bytes_received: int
+
+
+class ResourceTimings:
+    """
+    The timings of the fetches of a run, to aggregate them. Keeps the last
+    `max_entries`. Safe to use from any thread.
+    """
+
+    def __init__(self, max_entries: int = RESOURCE_TIMINGS_MAX_ENTRIES) -> None:
+        self._lock: Final = threading.Lock()
+        self._entries: Final = deque[tuple[HttpFamilyUrl, ResourceTiming]](
+            maxlen=max_entries
+        )
+
+    def record(self, url: HttpFamilyUrl, timing: ResourceTiming) -> None:
+        with self._lock:
+            self._entries.append((url, timing))
+
+    def entries(self) -> list[tuple[HttpFamilyUrl, ResourceTiming]]:
+        with self._lock:
+            return list(self._entries)
+
+    def percentiles(
+        self, phase: Phase, percentiles: Iterable[float] = DEFAULT_PERCENTILES
+    ) -> dict[float, float]:
+        """
+        The durations of `phase` at `percentiles` (0 to 100), by the
+        nearest-rank method, over the fetches in which it happened. Empty
+        when it happened in none.
+        """
+        with self._lock:
+            durations = sorted(
+                duration
+                for _, timing in self._entries
+                if (duration := timing.duration(phase)) is not None
+            )
+        if not durations:
+            return {}
+        return {
+            p: durations[max(math.ceil(p / 100 * len(durations)), 1) - 1]
+            for p in percentiles
+        }
+
+    def stats(self) -> ResourceTimingStats:
+        with self._lock:
+            timings = [timing for _, timing in self._entries]
+        return ResourceTimingStats(
+            entries=len(timings),
+            reused_connections=sum(timing.reused_connection for timing in timings),
+            bytes_sent=sum(timing.bytes_sent for timing in timings),
+            bytes_received=sum(timing.bytes_received for timing in timings),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,120 @@
+"""
+Redirects remembered by the URL they redirect from, so that visiting the URL
+again goes to the target without a round trip.
+"""
+
+import dataclasses
+import math
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Final
+
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.headers.cache_control import response as directive
+from browser.protocols.http.headers.cache_control.response import (
+    parse_response_cache_control,
+)
+from browser.protocols.http.response import HttpResponse
+from browser.sharded import ShardedMap
+from browser.url import HttpFamilyUrl, Url
+
+__all__ = (
+    "RedirectCache",
+    "RedirectCacheStats",
+)
+
+# Redirects kept, the least recently used dropped first
+REDIRECT_CACHE_MAX_ENTRIES = 1024
+
+# Permanent redirects are remembered until their response says otherwise;
+# temporary ones only while they are fresh
+# (ref https://httpwg.org/specs/rfc9110.html#status.3xx)
+PERMANENT_REDIRECT_STATUS = frozenset((301, 308))
+TEMPORARY_REDIRECT_STATUS = frozenset((302, 307))
+
+
+@dataclass(frozen=True)
+class RedirectCacheStats:
+    entries: int
+    # Fetches redirected without a request
+    hits: int
+
+
+@dataclass(frozen=True)
+class _Redirect:
+    target: str | Url
+    expires: float
+
+
+class RedirectCache:
+    """Remembered redirects, safe to use from any thread."""
+
+    def __init__(
+        self,
+        max_entries: int = REDIRECT_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._clock = clock
+        self._redirects: Final = ShardedMap[HttpFamilyUrl, _Redirect](max_entries)
+        self._lock: Final = threading.Lock()
+        self._hits = 0
+
+    def get(self, url: HttpFamilyUrl) -> str | Url | None:
+        """Where `url` redirects to, if known."""
+        key = _key(url)
+        if (redirect := self._redirects.get(key)) is None:
+            return None
+        if redirect.expires <= self._clock():
+            self._redirects.discard(key)
+            return None
+        with self._lock:
+            self._hits += 1
+        return redirect.target
+
+    def remember(
+        self,
+        url: HttpFamilyUrl,
+        response: HttpResponse,
+        target: str | Url,
+        freshness: Freshness,
+    ) -> None:
+        """
+        Note that `url` redirected to `target` with `response`, which the
+        caller may store. Its `freshness` bounds how long the redirect is
+        remembered when given explicitly, and temporary redirects are only
+        remembered then. A redirect that must be revalidated (no-cache) is
+        not remembered.
+        """
+        directives = parse_response_cache_control(
+            response.headers.get("cache-control", "")
+        )
+        explicit = "expires" in response.headers or any(
+            isinstance(d, directive.MaxAge) for d in directives
+        )
+        if any(isinstance(d, directive.NoCache) for d in directives):
+            expires = -math.inf
+        elif response.status_code in PERMANENT_REDIRECT_STATUS:
+            expires = freshness.expires if explicit else math.inf
+        elif response.status_code in TEMPORARY_REDIRECT_STATUS and explicit:
+            expires = freshness.expires
+        else:
+            expires = -math.inf
+        if expires > self._clock():
+            self._redirects.set(_key(url), _Redirect(target, expires))
+        else:
+            # Outdates a redirect remembered before
+            self._redirects.discard(_key(url))
+
+    def stats(self) -> RedirectCacheStats:
+        with self._lock:
+            return RedirectCacheStats(entries=len(self._redirects), hits=self._hits)
+
+    def clear(self) -> None:
+        self._redirects.clear()
+
+
+def _key(url: HttpFamilyUrl) -> HttpFamilyUrl:
+    # The fragment is not sent
+    return dataclasses.replace(url, fragment=None)
@@ -1,8 +1,11 @@
 import abc
+import re
 import tkinter
+from collections.abc import Iterable, Iterator
 from typing import override
 
 from .content import Content, HtmlContent, ImageContent, PlainTextContent, ViewSource
+from .sharded import ShardedMap
 
 
 class Renderer[Output = str](abc.ABC):
@@ -46,15 +49,45 @@ def _get_raw(content: Content) -> str:
             return ""
 
 
-render_cache: dict[str, str] = {}
+# Documents rendered most recently
+RENDER_CACHE_MAX_ENTRIES = 256
 
+# Text of rendered documents, shared by the threads rendering
+render_cache = ShardedMap[str, str](max_entries=RENDER_CACHE_MAX_ENTRIES)
 
-def _render_html_to_text(content: HtmlContent) -> str:
-    import re
 
+def _render_html_to_text(content: HtmlContent) -> str:
     data = content.data.decode("utf-8")  # FIXME: get charset
-    if data not in render_cache:
-        render_cache[data] = (
-            re.sub(r"<[^>]*>", "", data).replace("&lt;", "<").replace("&gt;", ">")
-        )
-    return render_cache[data]
+    return render_cache.get_or_compute(
+        data,
+        lambda: re.sub(r"<[^>]*>", "", data).replace("&lt;", "<").replace("&gt;", ">"),
+    )
+
+
+def iter_html_text(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Same as `_render_html_to_text`, but over a document that is still
+    arriving. Tags and entities may span chunks.
+    """
+    in_tag = False
+    # Possible start of an entity, kept until the next chunk shows its end
+    pending = ""
+    for chunk in chunks:
+        parts = []
+        for part in re.split(r"([<>])", chunk):
+            if in_tag:
+                in_tag = part != ">"
+            elif part == "<":
+                in_tag = True
+            else:
+                parts.append(part)
+
+        text = pending + "".join(parts)
+        if (amp := text.rfind("&")) != -1 and len(text) - amp < len("&lt;"):
+            text, pending = text[:amp], text[amp:]
+        else:
+            pending = ""
+        if text:
+            yield text.replace("&lt;", "<").replace("&gt;", ">")
+    if pending:
+        yield pending
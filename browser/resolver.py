@@ -0,0 +1,172 @@
+import errno
+import os
+import selectors
+import socket
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Protocol
+
+__all__ = (
+    "CachingResolver",
+    "ResolvedAddress",
+    "Resolver",
+    "SystemResolver",
+    "interleave_addresses",
+    "race_connect",
+)
+
+
+# Delay before racing the next address while an attempt is still pending,
+# (ref https://www.rfc-editor.org/rfc/rfc8305#section-5). Unit is seconds.
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+# getaddrinfo does not report record TTLs, so results are kept for this long.
+# Unit is seconds.
+DNS_CACHE_TTL = 60
+
+
+@dataclass(frozen=True)
+class ResolvedAddress:
+    family: socket.AddressFamily
+    sockaddr: tuple
+
+
+class Resolver(Protocol):
+    def resolve(self, host: str, port: int) -> list[ResolvedAddress]: ...
+
+
+class SystemResolver:
+    """Resolves names with getaddrinfo, for both IPv6 and IPv4"""
+
+    def resolve(self, host: str, port: int) -> list[ResolvedAddress]:
+        return [
+            ResolvedAddress(family, sockaddr)
+            for family, _, _, _, sockaddr in socket.getaddrinfo(
+                host, port, type=socket.SOCK_STREAM
+            )
+        ]
+
+
+class CachingResolver:
+    """Keeps the addresses of recently resolved names for `ttl` seconds"""
+
+    def __init__(
+        self,
+        resolver: Resolver,
+        ttl: float = DNS_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._resolver = resolver
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache: dict[tuple[str, int], tuple[float, list[ResolvedAddress]]] = {}
+
+    def resolve(self, host: str, port: int) -> list[ResolvedAddress]:
+        with self._lock:
+            match self._cache.get((host, port)):
+                case (expires, addresses) if self._clock() < expires:
+                    return addresses
+
+        # Resolve without the lock so that one slow name does not block others
+        addresses = self._resolver.resolve(host, port)
+        with self._lock:
+            self._cache[(host, port)] = (self._clock() + self._ttl, addresses)
+        return addresses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def interleave_addresses(addresses: list[ResolvedAddress]) -> list[ResolvedAddress]:
+    """
+    Order addresses to alternate between families, starting with the family
+    of the first (preferred) one (ref https://www.rfc-editor.org/rfc/rfc8305#section-4).
+    """
+    by_family: dict[socket.AddressFamily, list[ResolvedAddress]] = {}
+    for address in dict.fromkeys(addresses):
+        by_family.setdefault(address.family, []).append(address)
+
+    interleaved = []
+    queues = list(by_family.values())
+    while queues:
+        interleaved.extend(queue.pop(0) for queue in queues)
+        queues = [queue for queue in queues if queue]
+    return interleaved
+
+
+def race_connect(
+    addresses: list[ResolvedAddress],
+    timeout: float | None = None,
+    attempt_delay: float = CONNECTION_ATTEMPT_DELAY,
+) -> socket.socket:
+    """
+    Connect to the first of `addresses` that answers. A new attempt starts
+    every `attempt_delay` seconds, or as soon as one fails, while earlier
+    attempts keep running (ref https://www.rfc-editor.org/rfc/rfc8305#section-5).
+    The returned socket is in blocking mode.
+    """
+    if not addresses:
+        raise OSError("No address to connect to")
+
+    pending = interleave_addresses(addresses)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    next_attempt_at = time.monotonic()
+    errors: list[OSError] = []
+    with selectors.DefaultSelector() as selector:
+        try:
+            while pending or selector.get_map():
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise TimeoutError(f"Timed out connecting to {addresses[0]}")
+
+                if pending and (now >= next_attempt_at or not selector.get_map()):
+                    address = pending.pop(0)
+                    try:
+                        sock = socket.socket(address.family, socket.SOCK_STREAM)
+                    except OSError as error:
+                        errors.append(error)
+                        continue
+                    sock.setblocking(False)
+                    match sock.connect_ex(address.sockaddr):
+                        case 0:
+                            return _won(sock)
+                        case errno.EINPROGRESS:
+                            selector.register(sock, selectors.EVENT_WRITE)
+                            next_attempt_at = now + attempt_delay
+                        case error:
+                            errors.append(OSError(error, os.strerror(error)))
+                            sock.close()
+                            next_attempt_at = now
+                    continue
+
+                wait = None if deadline is None else deadline - now
+                if pending:
+                    until_next = next_attempt_at - now
+                    wait = until_next if wait is None else min(wait, until_next)
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj
+                    assert isinstance(sock, socket.socket)
+                    selector.unregister(sock)
+                    if error := sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                        errors.append(OSError(error, os.strerror(error)))
+                        sock.close()
+                        # Start the next attempt now instead of waiting the delay
+                        next_attempt_at = time.monotonic()
+                    else:
+                        return _won(sock)
+        finally:
+            # Close the attempts that lost the race
+            for key in list(selector.get_map().values()):
+                selector.unregister(key.fileobj)
+                key.fileobj.close()  # type: ignore[union-attr]
+
+    raise errors[-1]
+
+
+def _won(sock: socket.socket) -> socket.socket:
+    sock.setblocking(True)
+    return sock
@@ -0,0 +1,246 @@
+"""
+Decides which queued fetch runs next: the most important first, with limits
+on the fetches running at once to each host and in total, so that a page's
+document and stylesheets are not stuck behind its images on a busy link.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Final
+
+from browser.url import Url
+
+__all__ = (
+    "FetchScheduler",
+    "Priority",
+    "ScheduledFetch",
+    "SchedulerStats",
+)
+
+# Default limits of fetches running at once. Six per host like browsers do
+# for HTTP/1.1, which is also the connection pool's default.
+SCHEDULER_MAX_PER_HOST = 6
+SCHEDULER_MAX_TOTAL = 16
+
+
+class Priority(IntEnum):
+    """Priority classes, most important first."""
+
+    DOCUMENT = 0
+    STYLESHEET = 1
+    SCRIPT = 2
+    IMAGE = 3
+    PREFETCH = 4
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    queued: int
+    running: int
+    # Fetches that ran to the end, successfully or not
+    completed: int
+    # Queued fetches cancelled before they started, and reprioritized
+    cancelled: int
+    reprioritized: int
+
+
+# Fetches to one host share its limit. Schemes without a host (data:, file:,
+# about:) are only held back by the total limit.
+_HostKey = tuple[str, str, int | None] | None
+
+
+class ScheduledFetch[T]:
+    """A fetch queued or running in a FetchScheduler."""
+
+    def __init__(
+        self, scheduler: FetchScheduler[T], url: Url, priority: Priority
+    ) -> None:
+        self.url: Final = url
+        self.future: Final = Future[T]()
+        self._scheduler: Final = scheduler
+        self._priority = priority
+        # Breaks ties between fetches of the same priority, first come first
+        self._sequence = 0
+
+    @property
+    def priority(self) -> Priority:
+        return self._priority
+
+    def reprioritize(self, priority: Priority) -> bool:
+        """
+        Change the priority of the fetch if it has not started, e.g. for an
+        image scrolled into view. Returns whether it was changed.
+        """
+        return self._scheduler._reprioritize(self, priority)
+
+    def cancel(self) -> bool:
+        """Cancel the fetch if it has not started. Returns whether it was."""
+        return self._scheduler._cancel(self)
+
+    def result(self, timeout: float | None = None) -> T:
+        """Wait for the fetch and return its result, or raise its exception."""
+        return self.future.result(timeout)
+
+
+class FetchScheduler[T]:
+    """
+    Runs `fetch` for the submitted URLs on worker threads, at most
+    `max_per_host` at once per host and `max_total` at once overall. When a
+    slot frees up, the queued fetch of the highest priority that its host's
+    limit allows starts next; fetches of the same priority start in the order
+    they were submitted.
+
+    The scheduler is thread-safe. Coroutines can wait for a fetch with
+    `await asyncio.wrap_future(scheduled.future)`.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Url], T],
+        max_per_host: int = SCHEDULER_MAX_PER_HOST,
+        max_total: int = SCHEDULER_MAX_TOTAL,
+    ) -> None:
+        if max_per_host < 1 or max_total < max_per_host:
+            raise ValueError("Expected 1 <= max_per_host <= max_total")
+
+        self.max_per_host: Final = max_per_host
+        self.max_total: Final = max_total
+        self._fetch: Final = fetch
+        # Exactly as many workers as fetches may run, so a dispatched fetch
+        # starts at once
+        self._executor: Final = ThreadPoolExecutor(
+            max_total, thread_name_prefix="fetch"
+        )
+        # Notified when a fetch ends
+        self._condition: Final = threading.Condition()
+        self._shut_down = False
+        # Unordered; small enough to scan for the next fetch
+        self._queue: Final = list[ScheduledFetch[T]]()
+        self._running_per_host: Final = Counter[_HostKey]()
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._reprioritized = 0
+
+    def submit(
+        self, url: Url, priority: Priority = Priority.DOCUMENT
+    ) -> ScheduledFetch[T]:
+        scheduled = ScheduledFetch(self, url, priority)
+        with self._condition:
+            if self._shut_down:
+                raise RuntimeError("Cannot schedule fetches after shutdown")
+            self._submitted += 1
+            scheduled._sequence = self._submitted
+            self._queue.append(scheduled)
+            self._dispatch()
+        return scheduled
+
+    def stats(self) -> SchedulerStats:
+        with self._condition:
+            return SchedulerStats(
+                queued=len(self._queue),
+                running=self._running,
+                completed=self._completed,
+                cancelled=self._cancelled,
+                reprioritized=self._reprioritized,
+            )
+
+    def shutdown(self, wait: bool = True, cancel_queued: bool = False) -> None:
+        """
+        Stop accepting fetches. The queued fetches still run, unless
+        `cancel_queued`. With `wait`, return once every fetch has ended.
+        """
+        with self._condition:
+            self._shut_down = True
+            if cancel_queued:
+                for scheduled in self._queue:
+                    scheduled.future.cancel()
+                self._cancelled += len(self._queue)
+                self._queue.clear()
+            if wait:
+                self._condition.wait_for(lambda: not self._queue and not self._running)
+            self._stop_if_done()
+        if wait:
+            # Joins the worker threads
+            self._executor.shutdown()
+
+    def _reprioritize(self, scheduled: ScheduledFetch[T], priority: Priority) -> bool:
+        with self._condition:
+            if scheduled not in self._queue:
+                return False
+            if scheduled._priority != priority:
+                scheduled._priority = priority
+                self._reprioritized += 1
+            return True
+
+    def _cancel(self, scheduled: ScheduledFetch[T]) -> bool:
+        with self._condition:
+            if scheduled not in self._queue:
+                return False
+            self._queue.remove(scheduled)
+            self._cancelled += 1
+            self._stop_if_done()
+        return scheduled.future.cancel()
+
+    def _dispatch(self) -> None:
+        # With the lock held
+        while self._running < self.max_total and (scheduled := self._next()):
+            self._queue.remove(scheduled)
+            if not scheduled.future.set_running_or_notify_cancel():
+                # Cancelled through its future
+                self._cancelled += 1
+                continue
+            self._running += 1
+            self._running_per_host[_host_key(scheduled.url)] += 1
+            self._executor.submit(self._run, scheduled)
+
+    def _stop_if_done(self) -> None:
+        # With the lock held. The executor runs the queued fetches until then.
+        if self._shut_down and not self._queue and not self._running:
+            self._executor.shutdown(wait=False)
+
+    def _next(self) -> ScheduledFetch[T] | None:
+        return min(
+            (
+                scheduled
+                for scheduled in self._queue
+                if (host := _host_key(scheduled.url)) is None
+                or self._running_per_host[host] < self.max_per_host
+            ),
+            key=lambda scheduled: (scheduled._priority, scheduled._sequence),
+            default=None,
+        )
+
+    def _run(self, scheduled: ScheduledFetch[T]) -> None:
+        try:
+            result = self._fetch(scheduled.url)
+        except BaseException as error:
+            scheduled.future.set_exception(error)
+            # Lands in the executor's future, which nobody reads
+            raise
+        else:
+            scheduled.future.set_result(result)
+        finally:
+            with self._condition:
+                self._running -= 1
+                host = _host_key(scheduled.url)
+                self._running_per_host[host] -= 1
+                if not self._running_per_host[host]:
+                    del self._running_per_host[host]
+                self._completed += 1
+                self._dispatch()
+                self._stop_if_done()
+                self._condition.notify_all()
+
+
+def _host_key(url: Url) -> _HostKey:
+    if url.host is None:
+        return None
+    return (url.scheme, url.host.lower(), url.port)
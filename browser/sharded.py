@@ -0,0 +1,110 @@
+"""
+Maps shared by threads, split into shards that each have their own lock, so
+threads working on different keys rarely wait for each other.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Final
+
+__all__ = (
+    "SHARDS",
+    "ShardedMap",
+    "shard_index",
+)
+
+# Default number of shards. A power of two above the usual worker count.
+SHARDS = 16
+
+
+def shard_index(key: Hashable, shards: int) -> int:
+    return hash(key) % shards
+
+
+class _Shard[K, V]:
+    __slots__ = ("items", "lock")
+
+    def __init__(self) -> None:
+        self.lock: Final = threading.Lock()
+        # Least recently used first
+        self.items: Final = OrderedDict[K, V]()
+
+
+class ShardedMap[K: Hashable, V]:
+    """
+    A map safe to use from any thread, keeping at most `max_entries` items by
+    evicting the least recently used item of a shard. Without `max_entries`
+    it is unbounded.
+
+    Every operation on a key is atomic. `get_or_compute` calls `compute`
+    without holding a lock, so threads missing the same key at once may each
+    compute it; the first value stored wins and is returned to all of them.
+    Operations over all keys (`len`, `clear`) lock the shards one at a time,
+    so they are not atomic against concurrent updates.
+    """
+
+    def __init__(self, max_entries: int | None = None, shards: int = SHARDS) -> None:
+        if shards < 1:
+            raise ValueError("Expected at least one shard")
+        self._shards: Final = tuple(_Shard[K, V]() for _ in range(shards))
+        # Rounded up, so the bound is never below `max_entries`
+        self._max_per_shard: Final = (
+            None if max_entries is None else -(-max_entries // shards)
+        )
+
+    def get(self, key: K) -> V | None:
+        shard = self._shard(key)
+        with shard.lock:
+            value = shard.items.get(key)
+            if value is not None:
+                shard.items.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.items[key] = value
+            self._store(shard, key)
+
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        if (value := self.get(key)) is not None:
+            return value
+        # Computed without the lock, so a slow key does not block its shard
+        value = compute()
+        shard = self._shard(key)
+        with shard.lock:
+            value = shard.items.setdefault(key, value)
+            self._store(shard, key)
+            return value
+
+    def discard(self, key: K) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.items.pop(key, None)
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            with shard.lock:
+                shard.items.clear()
+
+    def __len__(self) -> int:
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += len(shard.items)
+        return total
+
+    def __contains__(self, key: K) -> bool:
+        shard = self._shard(key)
+        with shard.lock:
+            return key in shard.items
+
+    def _shard(self, key: K) -> _Shard[K, V]:
+        return self._shards[shard_index(key, len(self._shards))]
+
+    def _store(self, shard: _Shard[K, V], key: K) -> None:
+        shard.items.move_to_end(key)
+        if self._max_per_shard is not None:
+            while len(shard.items) > self._max_per_shard:
+                shard.items.popitem(last=False)
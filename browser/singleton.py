@@ -1,4 +1,13 @@
-from browser.cache import MemoryCache
+from browser.cache import BackgroundRefresher, InFlightFetches, ShardedMemoryCache
+from browser.protocols.http.hsts import HstsStore
+from browser.protocols.http.timing import ResourceTimings
+from browser.redirect_cache import RedirectCache
 
 
-GlobalMemoryCache = MemoryCache()
+# Shared by every thread fetching with the default HttpHandler
+GlobalMemoryCache = ShardedMemoryCache()
+GlobalRefresher = BackgroundRefresher()
+GlobalInFlightFetches = InFlightFetches()
+GlobalRedirectCache = RedirectCache()
+GlobalHstsStore = HstsStore()
+GlobalResourceTimings = ResourceTimings()
@@ -0,0 +1,173 @@
+import socket
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+__all__ = (
+    "TlsSessionCache",
+    "TlsStats",
+    "configure_tls",
+    "count_handshake",
+    "get_ssl_context",
+    "remember_session",
+    "tls_stats",
+    "wrap_socket",
+)
+
+
+@dataclass(frozen=True)
+class TlsStats:
+    full_handshakes: int
+    resumed_handshakes: int
+    cached_sessions: int
+
+
+class TlsSessionCache:
+    """
+    TLS sessions of recent connections, per origin, so that the next
+    connection to the same origin can resume one with an abbreviated
+    handshake instead of a full one.
+
+    Sessions only resume with the SSLContext that created them.
+    """
+
+    def __init__(
+        self, max_size: int = 256, clock: Callable[[], float] = time.time
+    ) -> None:
+        self._max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict[tuple[str, int], ssl.SSLSession]()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, host: str, port: int) -> ssl.SSLSession | None:
+        with self._lock:
+            session = self._sessions.get((host, port))
+            if session is None:
+                return None
+            if session.time + session.timeout <= self._clock():
+                del self._sessions[(host, port)]
+                return None
+            self._sessions.move_to_end((host, port))
+            return session
+
+    def set(self, host: str, port: int, session: ssl.SSLSession) -> None:
+        with self._lock:
+            self._sessions[(host, port)] = session
+            self._sessions.move_to_end((host, port))
+            while len(self._sessions) > self._max_size:
+                self._sessions.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+
+class _TlsState:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.context_factory: Callable[[], ssl.SSLContext] = ssl.create_default_context
+        # Shared contexts, and the sessions they created, by ALPN protocols
+        self.contexts: dict[tuple[str, ...], ssl.SSLContext] = {}
+        self.sessions: dict[tuple[str, ...], TlsSessionCache] = {}
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+
+
+_state = _TlsState()
+
+
+def get_ssl_context(alpn_protocols: tuple[str, ...] = ()) -> ssl.SSLContext:
+    """
+    Return the SSLContext shared by every connection of the process that
+    offers `alpn_protocols`. It is created on first use, so the CA store is
+    loaded only once.
+    """
+    with _state.lock:
+        if (context := _state.contexts.get(alpn_protocols)) is None:
+            context = _state.context_factory()
+            if alpn_protocols:
+                context.set_alpn_protocols(alpn_protocols)
+            _state.contexts[alpn_protocols] = context
+            _state.sessions[alpn_protocols] = TlsSessionCache()
+        return context
+
+
+def configure_tls(
+    context_factory: Callable[[], ssl.SSLContext] | None = None,
+) -> None:
+    """
+    Replace the function that creates shared SSLContexts, e.g. to trust
+    another CA. None restores the default. Cached sessions are dropped since
+    they cannot be resumed with another context.
+    """
+    with _state.lock:
+        _state.context_factory = context_factory or ssl.create_default_context
+        _state.contexts.clear()
+        _state.sessions.clear()
+
+
+def wrap_socket(
+    sock: socket.socket, host: str, port: int, alpn_protocols: tuple[str, ...] = ()
+) -> ssl.SSLSocket:
+    """
+    Wrap a connected socket and do the TLS handshake, resuming the cached
+    session of the origin when there is one.
+    """
+    context = get_ssl_context(alpn_protocols)
+    with _state.lock:
+        sessions = _state.sessions.get(alpn_protocols)
+    session = None if sessions is None else sessions.get(host, port)
+    tls_socket = context.wrap_socket(sock, server_hostname=host, session=session)
+    count_handshake(tls_socket)
+    remember_session(tls_socket, host, port)
+    return tls_socket
+
+
+def count_handshake(ssl_object: ssl.SSLSocket | ssl.SSLObject) -> None:
+    with _state.lock:
+        if ssl_object.session_reused:
+            _state.resumed_handshakes += 1
+        else:
+            _state.full_handshakes += 1
+
+
+def remember_session(
+    ssl_object: ssl.SSLSocket | ssl.SSLObject, host: str, port: int
+) -> None:
+    """
+    Cache the session of a connection. TLS 1.3 servers send session tickets
+    after the handshake, so this is also called once a response was read.
+    """
+    session = ssl_object.session
+    if session is None:
+        return
+    # A TLS 1.3 session can only be resumed once its ticket has arrived
+    if ssl_object.version() == "TLSv1.3" and not session.has_ticket:
+        return
+    with _state.lock:
+        # Skip contexts replaced by `configure_tls` since the connection opened
+        sessions = next(
+            (
+                _state.sessions[alpn_protocols]
+                for alpn_protocols, context in _state.contexts.items()
+                if context is ssl_object.context
+            ),
+            None,
+        )
+    if sessions is not None:
+        sessions.set(host, port, session)
+
+
+def tls_stats() -> TlsStats:
+    with _state.lock:
+        return TlsStats(
+            full_handshakes=_state.full_handshakes,
+            resumed_handshakes=_state.resumed_handshakes,
+            cached_sessions=sum(map(len, _state.sessions.values())),
+        )
@@ -1,4 +1,11 @@
+import contextlib
+import shutil
+import socketserver
+import ssl
+import subprocess
 import sys
+import threading
+from collections.abc import Callable, Iterator
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 import pytest
@@ -78,3 +85,65 @@ def mock_http_connection(mock_http_response):
         return patch("browser.protocols.create_connection", return_value=mock_conn)
 
     return _mock_connection
+
+
+def _read_head(rfile) -> bytes:
+    head = b""
+    while (line := rfile.readline()) not in (b"\r\n", b""):
+        head += line
+    return head
+
+
+@pytest.fixture
+def http_server():
+    """
+    Factory fixture for a local HTTP server. `respond` receives the head of
+    every request on every connection and returns the raw response bytes.
+    """
+
+    @contextlib.contextmanager
+    def _serve(
+        respond: Callable[[bytes], bytes], ssl_context: ssl.SSLContext | None = None
+    ) -> Iterator[int]:
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while head := _read_head(self.rfile):
+                    self.wfile.write(respond(head))
+
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        if ssl_context is not None:
+            server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+        thread.start()
+        try:
+            yield server.server_address[1]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    return _serve
+
+
+@pytest.fixture(scope="session")
+def tls_certificate(tmp_path_factory) -> tuple[Path, Path]:
+    """Self-signed certificate and key for 127.0.0.1, made with openssl."""
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        pytest.skip("openssl is unavailable")
+
+    directory = tmp_path_factory.mktemp("tls")
+    certfile, keyfile = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            openssl, "req", "-x509", "-newkey", "ec", "-pkeyopt",
+            "ec_paramgen_curve:prime256v1", "-nodes", "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", keyfile, "-out", certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return certfile, keyfile
@@ -0,0 +1,312 @@
+"""
+Local HTTP/2 server for tests and benchmarks, built on the client's frame
+and HPACK helpers.
+
+Responses of concurrent streams are interleaved one DATA frame at a time and
+never exceed the flow-control windows granted by the client. Clients that do
+not pick h2 with ALPN are answered over HTTP/1.1.
+"""
+
+import select
+import socket
+import ssl
+import struct
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Self
+
+from browser.protocols.http.h2 import (
+    DEFAULT_SETTINGS,
+    PREFACE,
+    Flag,
+    FrameType,
+    Setting,
+    encode_frame,
+)
+from browser.protocols.http.hpack import HpackDecoder, HpackEncoder
+
+# Request header fields (pseudo-headers included) -> status, fields, body
+type Respond = Callable[[dict[str, str]], tuple[int, list[tuple[str, str]], bytes]]
+
+_FRAME_HEADER = struct.Struct(">HBBBI")
+
+
+@dataclass
+class _Response:
+    stream_id: int
+    ready_at: float
+    status: int
+    fields: list[tuple[str, str]]
+    body: bytes
+    headers_sent: bool = False
+    window: int = DEFAULT_SETTINGS[Setting.INITIAL_WINDOW_SIZE]
+
+
+@dataclass
+class _Http2Session:
+    socket: ssl.SSLSocket
+    encoder: HpackEncoder = field(default_factory=HpackEncoder)
+    decoder: HpackDecoder = field(default_factory=HpackDecoder)
+    buffer: bytearray = field(default_factory=bytearray)
+    responses: dict[int, _Response] = field(default_factory=dict)
+    window: int = DEFAULT_SETTINGS[Setting.INITIAL_WINDOW_SIZE]
+    initial_window: int = DEFAULT_SETTINGS[Setting.INITIAL_WINDOW_SIZE]
+    header_block: tuple[int, bytearray] | None = None
+    closed: bool = False
+
+
+class H2Server:
+    """
+    Serve `respond` on 127.0.0.1 in background threads. Each response is held
+    back for `delay` seconds, like a server far away, without blocking the
+    other streams of its connection.
+    """
+
+    def __init__(
+        self,
+        respond: Respond,
+        ssl_context: ssl.SSLContext,
+        *,
+        delay: float = 0.0,
+        max_concurrent_streams: int = 100,
+        alpn_protocols: tuple[str, ...] = ("h2", "http/1.1"),
+    ) -> None:
+        ssl_context.set_alpn_protocols(list(alpn_protocols))
+        self._respond = respond
+        self._context = ssl_context
+        self._delay = delay
+        self._max_concurrent_streams = max_concurrent_streams
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self._lock = threading.Lock()
+        self._sockets: list[socket.socket] = []
+        self.port: int = self._listener.getsockname()[1]
+        self.connections = 0
+        # Most streams of one connection that were open at the same time
+        self.peak_streams = 0
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._listener.close()
+        with self._lock:
+            for sock in self._sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                sock.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections += 1
+                self._sockets.append(sock)
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock: socket.socket) -> None:
+        try:
+            tls_socket = self._context.wrap_socket(sock, server_side=True)
+            if tls_socket.selected_alpn_protocol() == "h2":
+                self._serve_http2(_Http2Session(tls_socket))
+            else:
+                self._serve_http1(tls_socket)
+        except OSError:
+            pass
+        finally:
+            sock.close()
+
+    def _serve_http1(self, sock: ssl.SSLSocket) -> None:
+        rfile = sock.makefile("rb")
+        while True:
+            lines = []
+            while (line := rfile.readline()) not in (b"\r\n", b""):
+                lines.append(line.decode("iso-8859-1").rstrip("\r\n"))
+            if not lines:
+                return
+            method, path, _ = lines[0].split(" ", 2)
+            fields = {":method": method, ":path": path}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                fields[name.strip().lower()] = value.strip()
+            time.sleep(self._delay)
+            status, response_fields, body = self._respond(fields)
+            head = f"HTTP/1.1 {status} OK\r\n" + "".join(
+                f"{name}: {value}\r\n" for name, value in response_fields
+            )
+            head += f"content-length: {len(body)}\r\n\r\n"
+            sock.sendall(head.encode("iso-8859-1") + body)
+
+    def _serve_http2(self, session: _Http2Session) -> None:
+        sock = session.socket
+        preface = b""
+        while len(preface) < len(PREFACE):
+            if not (data := sock.recv(len(PREFACE) - len(preface))):
+                return
+            preface += data
+        if preface != PREFACE:
+            return
+        sock.sendall(
+            encode_frame(
+                FrameType.SETTINGS,
+                0,
+                0,
+                struct.pack(
+                    ">HI", Setting.MAX_CONCURRENT_STREAMS, self._max_concurrent_streams
+                ),
+            )
+        )
+
+        while not session.closed:
+            now = time.monotonic()
+            # Responses waiting for a window update wait for the client
+            waiting = [
+                r.ready_at for r in session.responses.values() if r.ready_at > now
+            ]
+            if self._sendable(session):
+                timeout = 0.0
+            elif waiting:
+                timeout = min(waiting) - now
+            else:
+                timeout = None
+            if sock.pending() or select.select([sock], [], [], timeout)[0]:
+                if not (data := sock.recv(65536)):
+                    return
+                session.buffer += data
+                self._receive_frames(session)
+            self._send_round(session)
+
+    def _sendable(self, session: _Http2Session) -> bool:
+        now = time.monotonic()
+        return any(
+            response.ready_at <= now
+            and (
+                not response.headers_sent
+                or (session.window > 0 and response.window > 0)
+                or not response.body
+            )
+            for response in session.responses.values()
+        )
+
+    def _receive_frames(self, session: _Http2Session) -> None:
+        while len(session.buffer) >= _FRAME_HEADER.size:
+            high, low, frame_type, flags, stream_id = _FRAME_HEADER.unpack_from(
+                session.buffer
+            )
+            end = _FRAME_HEADER.size + (high << 8 | low)
+            if len(session.buffer) < end:
+                return
+            payload = bytes(session.buffer[_FRAME_HEADER.size : end])
+            del session.buffer[:end]
+            stream_id &= 0x7FFFFFFF
+
+            match frame_type:
+                case FrameType.HEADERS:
+                    if flags & Flag.PADDED:
+                        payload = payload[1 : len(payload) - payload[0]]
+                    if flags & Flag.PRIORITY:
+                        payload = payload[5:]
+                    session.header_block = (stream_id, bytearray(payload))
+                case FrameType.CONTINUATION:
+                    assert session.header_block is not None
+                    session.header_block[1].extend(payload)
+                case FrameType.SETTINGS if not flags & Flag.ACK:
+                    for key, value in struct.iter_unpack(">HI", payload):
+                        if key == Setting.INITIAL_WINDOW_SIZE:
+                            for response in session.responses.values():
+                                response.window += value - session.initial_window
+                            session.initial_window = value
+                    session.socket.sendall(
+                        encode_frame(FrameType.SETTINGS, Flag.ACK, 0)
+                    )
+                case FrameType.WINDOW_UPDATE:
+                    (increment,) = struct.unpack(">I", payload)
+                    if stream_id == 0:
+                        session.window += increment
+                    elif (response := session.responses.get(stream_id)) is not None:
+                        response.window += increment
+                case FrameType.RST_STREAM:
+                    session.responses.pop(stream_id, None)
+                case FrameType.PING if not flags & Flag.ACK:
+                    session.socket.sendall(
+                        encode_frame(FrameType.PING, Flag.ACK, 0, payload)
+                    )
+                case FrameType.GOAWAY:
+                    session.closed = True
+
+            if (
+                frame_type in (FrameType.HEADERS, FrameType.CONTINUATION)
+                and flags & Flag.END_HEADERS
+            ):
+                assert session.header_block is not None
+                stream_id, block = session.header_block
+                session.header_block = None
+                fields = dict(session.decoder.decode(bytes(block)))
+                status, response_fields, body = self._respond(fields)
+                session.responses[stream_id] = _Response(
+                    stream_id,
+                    time.monotonic() + self._delay,
+                    status,
+                    response_fields,
+                    body,
+                    window=session.initial_window,
+                )
+                with self._lock:
+                    self.peak_streams = max(self.peak_streams, len(session.responses))
+
+    def _send_round(self, session: _Http2Session) -> None:
+        """Send the next frame of every response that is ready."""
+        now = time.monotonic()
+        frames = []
+        for response in list(session.responses.values()):
+            if response.ready_at > now:
+                continue
+            if not response.headers_sent:
+                response.headers_sent = True
+                fields = [(":status", str(response.status)), *response.fields]
+                fields.append(("content-length", str(len(response.body))))
+                frames.append(
+                    encode_frame(
+                        FrameType.HEADERS,
+                        Flag.END_HEADERS | (0 if response.body else Flag.END_STREAM),
+                        response.stream_id,
+                        session.encoder.encode(fields),
+                    )
+                )
+                if not response.body:
+                    del session.responses[response.stream_id]
+                continue
+
+            size = min(
+                len(response.body),
+                DEFAULT_SETTINGS[Setting.MAX_FRAME_SIZE],
+                session.window,
+                response.window,
+            )
+            if size <= 0:
+                continue
+            chunk, response.body = response.body[:size], response.body[size:]
+            session.window -= size
+            response.window -= size
+            frames.append(
+                encode_frame(
+                    FrameType.DATA,
+                    0 if response.body else Flag.END_STREAM,
+                    response.stream_id,
+                    chunk,
+                )
+            )
+            if not response.body:
+                del session.responses[response.stream_id]
+        if frames:
+            session.socket.sendall(b"".join(frames))
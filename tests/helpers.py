@@ -0,0 +1,31 @@
+"""URL and request helpers shared by the tests."""
+
+from browser.protocols.http.request import HttpRequest
+from browser.url import HttpFamilyUrl, Url
+
+
+def http_family_url(url: str) -> HttpFamilyUrl:
+    """Parse `url`, which must be an http or https URL."""
+    parsed = HttpFamilyUrl.from_url(Url.parse(url))
+    assert isinstance(parsed, HttpFamilyUrl)
+    return parsed
+
+
+def local_url(port: int, path: str = "/", scheme: str = "http") -> HttpFamilyUrl:
+    """URL of `path` on a local test server."""
+    return http_family_url(f"{scheme}://127.0.0.1:{port}{path}")
+
+
+def example_url(path: str) -> HttpFamilyUrl:
+    """URL of `path` on example.com, for tests that make no request."""
+    return http_family_url(f"http://example.com/{path}")
+
+
+def get_request(path: str = "/", host: str = "127.0.0.1") -> HttpRequest:
+    """Keep-alive GET request for `path`."""
+    return HttpRequest(
+        method="GET",
+        path=path,
+        headers={"Host": host, "Connection": "keep-alive"},
+        version="1.1",
+    )
@@ -0,0 +1,248 @@
+import asyncio
+import contextlib
+import functools
+import gzip
+
+from browser.connection import (
+    AsyncConnection,
+    async_connection_pool_stats,
+    request_http_async,
+)
+from browser.content import HtmlContent
+from browser.content_fetcher import fetch_content_async
+from tests.helpers import get_request, local_url
+
+
+async def _read_request(reader: asyncio.StreamReader) -> list[bytes]:
+    lines = []
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        lines.append(line)
+    return lines
+
+
+@contextlib.asynccontextmanager
+async def _serve(handle):
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while await _read_request(reader):
+                writer.write(await handle())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(on_client, "127.0.0.1", 0)
+    try:
+        yield server.sockets[0].getsockname()[1]
+    finally:
+        # Pooled keep-alive connections would otherwise keep the server open
+        server.close()
+        server.close_clients()
+        await server.wait_closed()
+
+
+class TestAsyncConnection:
+    """Test AsyncConnection against a local asyncio server."""
+
+    def test_content_length_response(self):
+        """Test a response delimited by Content-Length."""
+
+        async def handle():
+            return b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+
+        async def main():
+            async with _serve(handle) as port:
+                connection = await AsyncConnection.open("http", "127.0.0.1", port)
+                response = await connection.request(get_request())
+                await connection.close()
+            return response
+
+        response = asyncio.run(main())
+        assert response.status_code == 200
+        assert response.body == b"hello"
+
+    def test_chunked_gzip_response(self):
+        """Test a chunked, gzip-encoded response."""
+        payload = gzip.compress(b" padded body ")
+
+        async def handle():
+            half = len(payload) // 2
+            return (
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n"
+                b"Content-Encoding: gzip\r\n\r\n"
+                + f"{half:x}\r\n".encode()
+                + payload[:half]
+                + b"\r\n"
+                + f"{len(payload) - half:x}\r\n".encode()
+                + payload[half:]
+                + b"\r\n0\r\n\r\n"
+            )
+
+        async def main():
+            async with _serve(handle) as port:
+                return await request_http_async(local_url(port), get_request())
+
+        assert asyncio.run(main()).body == b" padded body "
+
+    def test_many_requests_in_flight(self):
+        """Test concurrent requests are sent before any response is received."""
+        # As many as the pool opens connections to one origin
+        concurrency = 6
+
+        async def main():
+            arrived = 0
+            all_arrived = asyncio.Event()
+
+            async def handle():
+                nonlocal arrived
+                arrived += 1
+                if arrived == concurrency:
+                    all_arrived.set()
+                # Only answers once every request is in flight
+                await asyncio.wait_for(all_arrived.wait(), timeout=5)
+                return b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+            async with _serve(handle) as port:
+                return await asyncio.gather(
+                    *(
+                        request_http_async(local_url(port), get_request())
+                        for _ in range(concurrency)
+                    )
+                )
+
+        responses = asyncio.run(main())
+        assert [response.body for response in responses] == [b"ok"] * concurrency
+
+    def test_fetch_content_async(self):
+        """Test fetch_content_async follows redirects and recognizes content."""
+
+        async def main():
+            responses = iter(
+                [
+                    b"HTTP/1.1 301 Moved\r\nLocation: /next\r\nContent-Length: 0\r\n\r\n",
+                    (
+                        b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                        b"Content-Length: 11\r\n\r\n<p>done</p>"
+                    ),
+                ]
+            )
+
+            async def handle():
+                return next(responses)
+
+            async with _serve(handle) as port:
+                return await fetch_content_async(f"http://127.0.0.1:{port}/start")
+
+        assert asyncio.run(main()) == HtmlContent(data=b"<p>done</p>")
+
+    def test_per_host_limit(self):
+        """Test requests beyond the pool's limit wait for a free connection."""
+        connections = 0
+
+        async def main():
+            async def on_client(
+                reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+            ):
+                nonlocal connections
+                connections += 1
+                while await _read_request(reader):
+                    await asyncio.sleep(0.01)
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                    await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(on_client, "127.0.0.1", 0)
+            async with server:
+                port = server.sockets[0].getsockname()[1]
+                responses = await asyncio.gather(
+                    *(
+                        request_http_async(local_url(port), get_request())
+                        for _ in range(20)
+                    )
+                )
+                stats = async_connection_pool_stats()
+                server.close_clients()
+            return responses, stats
+
+        responses, stats = asyncio.run(main())
+        assert [response.body for response in responses] == [b"ok"] * 20
+        assert connections == 6
+        assert (stats.misses, stats.in_use, stats.idle) == (6, 0, 6)
+
+    @staticmethod
+    async def _close_second(
+        sent: list[bytes], reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Closes the connection instead of answering its second request, as
+        # a server closing it while idle just as the request arrives
+        for answered in range(2):
+            if not (lines := await _read_request(reader)):
+                break
+            path = lines[0].split(b" ")[1]
+            sent.append(path)
+            if answered:
+                break
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(path), path)
+            )
+            await writer.drain()
+        writer.close()
+
+    def test_stale_connection_is_retried(self):
+        """Test a GET on a connection the server closed is sent again."""
+        sent = list[bytes]()
+
+        async def main():
+            on_client = functools.partial(self._close_second, sent)
+            server = await asyncio.start_server(on_client, "127.0.0.1", 0)
+            async with server:
+                url = local_url(server.sockets[0].getsockname()[1])
+                first = await request_http_async(url, get_request("/first"))
+                stale = await request_http_async(url, get_request("/stale"))
+                server.close_clients()
+            return first.body, stale.body
+
+        assert asyncio.run(main()) == (b"/first", b"/stale")
+        assert sent == [b"/first", b"/stale", b"/stale"]
+
+    def test_retried_once_on_a_new_connection(self):
+        """Test the retry skips other idle connections, which may be stale too."""
+        sent = list[bytes]()
+
+        async def main():
+            on_client = functools.partial(self._close_second, sent)
+            server = await asyncio.start_server(on_client, "127.0.0.1", 0)
+            async with server:
+                url = local_url(server.sockets[0].getsockname()[1])
+                # Leaves two idle connections, both closed on their next request
+                await asyncio.gather(
+                    *(request_http_async(url, get_request("/first")) for _ in range(2))
+                )
+                stale = await request_http_async(url, get_request("/stale"))
+                stats = async_connection_pool_stats()
+                server.close_clients()
+            return stale.body, stats
+
+        body, stats = asyncio.run(main())
+        assert body == b"/stale"
+        assert sent == [b"/first", b"/first", b"/stale", b"/stale"]
+        assert (stats.hits, stats.misses) == (1, 3)
+
+    def test_keep_alive_timeout(self):
+        """Test the idle timeout a server sends is kept."""
+
+        async def handle():
+            return (
+                b"HTTP/1.1 200 OK\r\nKeep-Alive: timeout=5\r\n"
+                b"Content-Length: 2\r\n\r\nok"
+            )
+
+        async def main():
+            async with _serve(handle) as port:
+                connection = await AsyncConnection.open("http", "127.0.0.1", port)
+                await connection.request(get_request())
+                await connection.close()
+            return connection
+
+        connection = asyncio.run(main())
+        assert connection.keep_alive_timeout == 5
+        assert connection.idle_timeout == 4
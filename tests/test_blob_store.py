@@ -0,0 +1,30 @@
+from browser.blob_store import BlobStore, body_digest
+
+
+def test_identical_bodies_are_held_once():
+    blobs = BlobStore()
+    first = b"shared body"
+    second = bytes(bytearray(first))
+    assert second is not first
+
+    digest, held = blobs.add(first)
+    assert (digest, held) == (body_digest(first), first)
+    digest, held = blobs.add(second)
+    assert held is first
+    blobs.add(b"other")
+
+    stats = blobs.stats()
+    assert (stats.blobs, stats.references) == (2, 3)
+    assert stats.stored_bytes == len(first) + len(b"other")
+    assert stats.saved_bytes == len(first)
+
+
+def test_release():
+    blobs = BlobStore()
+    digest, _ = blobs.add(b"body")
+    blobs.add(b"body")
+    blobs.release(digest)
+    assert blobs.stored_bytes == 4
+    blobs.release(digest)
+    assert blobs.stored_bytes == 0
+    assert blobs.stats().blobs == 0
@@ -0,0 +1,879 @@
+import asyncio
+import dataclasses
+import gzip
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from browser.cache import (
+    BackgroundRefresher,
+    CacheEntry,
+    CacheStatus,
+    InFlightFetches,
+    MemoryCache,
+    cache_stats,
+    conditional_request,
+    freshen_response,
+    may_serve_on_error,
+    navigation_cache,
+    select_cached_response,
+    variant_key,
+    vary_field_names,
+)
+from browser.connection import request_http
+from browser.content import PlainTextContent, UnknownContent
+from browser.content_fetcher import navigate
+from browser.protocols.http import handler as handler_module
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.handler import HttpHandler
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.headers.cache_control.request import (
+    MaxAge,
+    MaxStale,
+    MinFresh,
+    NoCache,
+    NoStore,
+    OnlyIfCached,
+    UnknownToken,
+    parse_request_cache_control,
+)
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.url import HttpFamilyUrl, Url
+from tests.helpers import example_url
+
+NOW = 1_000_000
+
+
+def _response(cache_control: str | None = None) -> HttpResponse:
+    headers = {} if cache_control is None else {"cache-control": cache_control}
+    return HttpResponse(
+        version="HTTP/1.1",
+        status_code=200,
+        status_message="OK",
+        headers=HeaderMap(headers),
+        body=b"ok",
+        request=HttpRequest(method="GET", path="/", headers={}, version="1.1"),
+    )
+
+
+def _counting(cache_control: str = "max-age=60"):
+    requests = []
+
+    def respond(head: bytes) -> bytes:
+        requests.append(head)
+        return (
+            f"HTTP/1.1 200 OK\r\nCache-Control: {cache_control}\r\n"
+            "Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+        ).encode()
+
+    return respond, requests
+
+
+def _validating(cache_control: str = "no-cache"):
+    """Server answering If-None-Match with 304 Not Modified."""
+    requests = []
+
+    def respond(head: bytes) -> bytes:
+        requests.append(head)
+        if b'If-None-Match: "v1"' in head:
+            return (
+                f'HTTP/1.1 304 Not Modified\r\nETag: "v1"\r\n'
+                f"Cache-Control: {cache_control}\r\nX-Served: {len(requests)}\r\n\r\n"
+            ).encode()
+        return (
+            f'HTTP/1.1 200 OK\r\nETag: "v1"\r\nCache-Control: {cache_control}\r\n'
+            f"X-Served: {len(requests)}\r\n"
+            "Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+        ).encode()
+
+    return respond, requests
+
+
+def _make_stale(cache: MemoryCache, url: Url, seconds: float = 5) -> None:
+    """Age the entry stored for `url` until it is stale by `seconds`."""
+    http_family_url = HttpFamilyUrl.from_url(url)
+    entry = cache.lookup(http_family_url)
+    assert entry is not None
+    freshness = entry.freshness
+    cache.set(
+        http_family_url,
+        entry.response,
+        dataclasses.replace(
+            freshness,
+            response_time=time.time()
+            - seconds
+            - freshness.lifetime
+            + freshness.initial_age,
+        ),
+    )
+
+
+def _sized(
+    size: int, cache_control: str = "max-age=60", fill: bytes = b"x"
+) -> HttpResponse:
+    """A response holding `size` bytes in the cache, with a body of `fill`."""
+    headers = {"cache-control": cache_control}
+    header_bytes = sum(len(name) + len(value) for name, value in headers.items())
+    return dataclasses.replace(
+        _response(), headers=HeaderMap(headers), body=fill * (size - header_bytes)
+    )
+
+
+class TestParseRequestCacheControl:
+    """Test parsing request Cache-Control directives."""
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("no-cache", [NoCache()]),
+            ("No-Store, max-age=0", [NoStore(), MaxAge(0)]),
+            ("max-stale", [MaxStale(None)]),
+            ('max-stale="30", min-fresh=5', [MaxStale(30), MinFresh(5)]),
+            ("only-if-cached", [OnlyIfCached()]),
+            ("max-age=soon", [UnknownToken("max-age", "soon")]),
+            ("", []),
+        ],
+    )
+    def test_directives(self, value, expected):
+        assert parse_request_cache_control(value) == expected
+
+
+class TestMemoryCache:
+    """Test the bounds of MemoryCache."""
+
+    FRESH = Freshness(lifetime=60, initial_age=0, response_time=NOW)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = MemoryCache(max_bytes=300)
+        cache.set(example_url("a"), _sized(100, fill=b"a"), self.FRESH)
+        cache.set(example_url("b"), _sized(100, fill=b"b"), self.FRESH)
+        cache.set(example_url("c"), _sized(100, fill=b"c"), self.FRESH)
+        cache.lookup(example_url("a"))
+        cache.set(example_url("d"), _sized(100, fill=b"d"), self.FRESH)
+
+        assert cache.lookup(example_url("b")) is None
+        assert all(cache.lookup(example_url(path)) for path in "acd")
+        stats = cache.stats()
+        assert stats.entries == 3
+        assert stats.bytes == 300
+        assert stats.evictions == 1
+
+    def test_identical_bodies(self):
+        cache = MemoryCache()
+        for path in ("a", "b?utm=1", "c"):
+            cache.set(example_url(path), _sized(1000), self.FRESH)
+        stats = cache.stats()
+        assert stats.unique_bodies == 1
+        # Headers are held per entry, the body once
+        assert stats.bytes == 1000 + 2 * (1000 - len(_sized(1000).body))
+        assert stats.dedup_saved_bytes == 2 * len(_sized(1000).body)
+        bodies = {id(cache.lookup(example_url(path)).response.body) for path in "ac"}
+        assert len(bodies) == 1
+
+        # The body stays until its last entry goes
+        cache.set(example_url("a"), _sized(1000, fill=b"y"), self.FRESH)
+        cache.set(example_url("c"), _sized(1000, fill=b"y"), self.FRESH)
+        assert cache.stats().unique_bodies == 2
+        cache.set(example_url("b?utm=1"), _sized(1000, fill=b"y"), self.FRESH)
+        assert cache.stats().unique_bodies == 1
+        assert cache.stats().dedup_saved_bytes == 2 * len(_sized(1000).body)
+
+    def test_entry_size_cap(self):
+        cache = MemoryCache(max_bytes=1000, max_entry_bytes=200)
+        cache.set(example_url("a"), _sized(100), self.FRESH)
+        # The replacement is too large, and the outdated entry goes too
+        cache.set(example_url("a"), _sized(201), self.FRESH)
+        assert cache.lookup(example_url("a")) is None
+        assert cache.stats().bytes == 0
+
+    def test_replace(self):
+        cache = MemoryCache(max_bytes=1000)
+        cache.set(example_url("a"), _sized(100), self.FRESH)
+        cache.set(example_url("a"), _sized(150), self.FRESH)
+        assert cache.stats().bytes == 150
+        assert cache.stats().entries == 1
+
+    def test_sweep(self):
+        cache = MemoryCache()
+        expired = Freshness(lifetime=60, initial_age=0, response_time=0)
+        cache.set(example_url("expired"), _sized(100), expired)
+        # Stale, but can still be revalidated or served on error
+        validated = dataclasses.replace(
+            _sized(100), headers=HeaderMap({"etag": '"v1"'})
+        )
+        cache.set(example_url("validated"), validated, expired)
+        cache.set(
+            example_url("fallback"),
+            _sized(100),
+            dataclasses.replace(expired, stale_if_error=10**10),
+        )
+        cache.set(
+            example_url("fresh"),
+            _sized(100),
+            dataclasses.replace(self.FRESH, lifetime=10**10),
+        )
+        cache.sweep()
+
+        assert cache.lookup(example_url("expired")) is None
+        assert all(
+            cache.lookup(example_url(path))
+            for path in ("validated", "fallback", "fresh")
+        )
+        assert cache.stats().expirations == 1
+
+    def test_periodic_sweep(self):
+        cache = MemoryCache(sweep_interval=0)
+        expired = Freshness(lifetime=60, initial_age=0, response_time=0)
+        cache.set(example_url("expired"), _sized(100), expired)
+        cache.lookup(example_url("other"))
+        assert cache.stats().entries == 0
+
+    def test_hit_ratio(self):
+        cache = MemoryCache()
+        assert cache.stats().hit_ratio == 0
+        cache.set(example_url("a"), _sized(100), self.FRESH)
+        for path in "aaab":
+            cache.lookup(example_url(path))
+        assert cache.stats().hit_ratio == 0.75
+
+    def test_encoded_at_rest(self):
+        body = b"<p>text compresses well</p>" * 1000
+        response = dataclasses.replace(
+            _sized(0),
+            headers=HeaderMap({"content-encoding": "gzip"}),
+            body=body,
+            encoded_body=gzip.compress(body),
+        )
+        decoded = MemoryCache()
+        decoded.set(example_url("a"), response, self.FRESH)
+        encoded = MemoryCache(encoded_at_rest=True)
+        encoded.set(example_url("a"), response, self.FRESH)
+        assert encoded.stats().bytes * 10 < decoded.stats().bytes
+
+        for cache in (decoded, encoded):
+            entry = cache.lookup(example_url("a"))
+            assert entry is not None
+            assert entry.response.body == body
+            assert entry.response.headers == response.headers
+        assert encoded.lookup(example_url("a")).response.encoded_body == gzip.compress(
+            body
+        )
+        stats = encoded.stats()
+        assert (stats.decodes, stats.decoded_hits) == (1, 1)
+        assert stats.decoded_bytes == len(body)
+
+    def test_decoded_bodies_bounded(self):
+        cache = MemoryCache(encoded_at_rest=True, decoded_bytes=2500)
+        for path in "abc":
+            body = path.encode() * 1000
+            response = dataclasses.replace(
+                _sized(0),
+                headers=HeaderMap({"content-encoding": "deflate"}),
+                body=body,
+                encoded_body=zlib.compress(body),
+            )
+            cache.set(example_url(path), response, self.FRESH)
+        for path in "abca":
+            assert cache.lookup(example_url(path)).response.body == path.encode() * 1000
+        stats = cache.stats()
+        # "a" was dropped for "c"
+        assert (stats.decodes, stats.decoded_hits) == (4, 0)
+        assert stats.decoded_bytes == 2000
+
+    def test_identity_at_rest(self):
+        cache = MemoryCache(encoded_at_rest=True)
+        cache.set(example_url("a"), _sized(100), self.FRESH)
+        assert cache.lookup(example_url("a")).response == _sized(100)
+        assert cache.stats().decodes == 0
+
+
+def _variant(language: str | None, vary: str = "accept-language") -> HttpResponse:
+    """A response in `language`, negotiated with Accept-Language."""
+    headers = {} if language is None else {"Accept-Language": language}
+    return dataclasses.replace(
+        _response(),
+        headers=HeaderMap({"vary": vary}),
+        body=str(language).encode(),
+        request=HttpRequest(method="GET", path="/", headers=headers, version="1.1"),
+    )
+
+
+def _request(**headers: str) -> HttpRequest:
+    return HttpRequest(
+        method="GET",
+        path="/",
+        headers={name.replace("_", "-"): value for name, value in headers.items()},
+        version="1.1",
+    )
+
+
+class TestVary:
+    """Test storing variants (ref https://httpwg.org/specs/rfc9111.html#caching.negotiated.responses)."""
+
+    FRESH = Freshness(lifetime=60, initial_age=0, response_time=NOW)
+
+    @pytest.mark.parametrize(
+        "vary, names",
+        [
+            (None, ()),
+            ("Accept-Language", ("accept-language",)),
+            (
+                "accept-language, Accept-Encoding,",
+                ("accept-encoding", "accept-language"),
+            ),
+            ("Accept-Encoding, *", None),
+        ],
+    )
+    def test_field_names(self, vary, names):
+        headers = {} if vary is None else {"vary": vary}
+        response = dataclasses.replace(_response(), headers=HeaderMap(headers))
+        assert vary_field_names(response) == names
+
+    def test_normalized_values(self):
+        names = ("accept-encoding",)
+        assert variant_key(names, _request(Accept_Encoding="gzip,deflate")) == (
+            ("accept-encoding", "gzip, deflate"),
+        )
+        assert variant_key(names, _request(Accept_Encoding=" gzip ,  deflate")) == (
+            variant_key(names, _request(**{"accept-encoding": "gzip, deflate"}))
+        )
+        assert variant_key(names, None) == (("accept-encoding", None),)
+
+    def test_variants(self):
+        cache = MemoryCache()
+        for language in ("en", "fr", None):
+            cache.set(example_url("page"), _variant(language), self.FRESH)
+
+        def body(request: HttpRequest | None) -> bytes | None:
+            entry = cache.lookup(example_url("page"), request)
+            return None if entry is None else entry.response.body
+
+        assert body(_request(Accept_Language="en")) == b"en"
+        assert body(_request(Accept_Language="fr")) == b"fr"
+        assert body(_request()) == b"None"
+        assert body(None) == b"None"
+        assert body(_request(Accept_Language="de")) is None
+        assert cache.stats().entries == 3
+
+    def test_replace_variant(self):
+        cache = MemoryCache()
+        cache.set(example_url("page"), _variant("en"), self.FRESH)
+        cache.set(
+            example_url("page"),
+            dataclasses.replace(_variant("en"), body=b"new"),
+            self.FRESH,
+        )
+        entry = cache.lookup(example_url("page"), _request(Accept_Language="en"))
+        assert entry is not None
+        assert entry.response.body == b"new"
+        assert cache.stats().entries == 1
+
+    def test_vary_changed(self):
+        """Test a response varying on other fields outdates the variants."""
+        cache = MemoryCache()
+        cache.set(example_url("page"), _variant("en"), self.FRESH)
+        cache.set(example_url("page"), _variant("fr"), self.FRESH)
+        cache.set(
+            example_url("page"), _variant("en", vary="accept-encoding"), self.FRESH
+        )
+        assert cache.stats().entries == 1
+        # Any language now selects the response varying on Accept-Encoding
+        entry = cache.lookup(example_url("page"), _request(Accept_Language="fr"))
+        assert entry is not None
+        assert entry.response.headers["vary"] == "accept-encoding"
+
+    def test_vary_star(self):
+        cache = MemoryCache()
+        cache.set(example_url("page"), _variant("en"), self.FRESH)
+        cache.set(example_url("page"), _variant("en", vary="*"), self.FRESH)
+        assert cache.lookup(example_url("page"), _request(Accept_Language="en")) is None
+        assert cache.stats().bytes == 0
+
+    def test_handler(self, http_server):
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head)
+            return (
+                b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                b"Vary: Accept-Encoding\r\n"
+                b"Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+            )
+
+        with http_server(respond) as port:
+            handler = HttpHandler(cache=MemoryCache())
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            with navigation_cache() as second:
+                handler.fetch(url)
+        assert len(requests) == 1
+        assert [lookup.status for lookup in second.lookups] == [CacheStatus.HIT]
+
+
+class TestSelectCachedResponse:
+    """Test deciding whether a stored response answers a request."""
+
+    @pytest.mark.parametrize(
+        "remaining, directives, expected",
+        [
+            (10, [], CacheStatus.HIT),
+            (-10, [], CacheStatus.MISS),
+            (10, [NoCache()], CacheStatus.MISS),
+            (10, [MinFresh(5)], CacheStatus.HIT),
+            (10, [MinFresh(20)], CacheStatus.MISS),
+            (10, [MaxAge(60)], CacheStatus.HIT),
+            (10, [MaxAge(30)], CacheStatus.MISS),
+            (-10, [MaxStale(20)], CacheStatus.STALE_HIT),
+            (-10, [MaxStale(5)], CacheStatus.MISS),
+            (-10_000, [MaxStale(None)], CacheStatus.STALE_HIT),
+            (-10, [OnlyIfCached()], CacheStatus.UNAVAILABLE),
+            (-10, [OnlyIfCached(), MaxStale(None)], CacheStatus.STALE_HIT),
+        ],
+    )
+    def test_directives(self, remaining, directives, expected):
+        # Received 40 seconds ago, with `remaining` seconds of freshness left
+        freshness = Freshness(
+            lifetime=40 + remaining, initial_age=0, response_time=NOW - 40
+        )
+        entry = CacheEntry(_response(), freshness)
+        assert select_cached_response(entry, directives, NOW) == expected
+
+    def test_nothing_stored(self):
+        assert select_cached_response(None, [], NOW) == CacheStatus.MISS
+        assert (
+            select_cached_response(None, [OnlyIfCached()], NOW)
+            == CacheStatus.UNAVAILABLE
+        )
+
+    @pytest.mark.parametrize(
+        "stale_while_revalidate, directives, expected",
+        [
+            (20, [], CacheStatus.STALE_WHILE_REVALIDATE),
+            (5, [], CacheStatus.MISS),
+            (20, [MaxStale(30)], CacheStatus.STALE_HIT),
+            (20, [NoCache()], CacheStatus.MISS),
+            (20, [OnlyIfCached()], CacheStatus.UNAVAILABLE),
+        ],
+    )
+    def test_stale_while_revalidate(self, stale_while_revalidate, directives, expected):
+        # Stale for 10 seconds
+        freshness = Freshness(
+            lifetime=30,
+            initial_age=0,
+            response_time=NOW - 40,
+            stale_while_revalidate=stale_while_revalidate,
+        )
+        entry = CacheEntry(_response(), freshness)
+        assert select_cached_response(entry, directives, NOW) == expected
+
+    @pytest.mark.parametrize(
+        "stale_if_error, must_revalidate, expected",
+        [(20, False, True), (5, False, False), (20, True, False)],
+    )
+    def test_stale_if_error(self, stale_if_error, must_revalidate, expected):
+        freshness = Freshness(
+            lifetime=30,
+            initial_age=0,
+            response_time=NOW - 40,
+            must_revalidate=must_revalidate,
+            stale_if_error=stale_if_error,
+        )
+        assert may_serve_on_error(CacheEntry(_response(), freshness), NOW) == expected
+        assert not may_serve_on_error(None, NOW)
+
+    def test_must_revalidate(self):
+        """Test max-stale does not serve a response that must be revalidated."""
+        freshness = Freshness(
+            lifetime=60, initial_age=0, response_time=0, must_revalidate=True
+        )
+        entry = CacheEntry(_response("must-revalidate"), freshness)
+        assert select_cached_response(entry, [MaxStale(None)], NOW) == CacheStatus.MISS
+
+
+class TestHttpHandlerCache:
+    """Test HttpHandler answering from its cache."""
+
+    def test_fresh_response_is_served_from_cache(self, http_server):
+        respond, requests = _counting()
+        with http_server(respond) as port:
+            handler = HttpHandler(cache=MemoryCache())
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            with navigation_cache() as first:
+                assert handler.fetch(url) == PlainTextContent("ok")
+            with navigation_cache() as second:
+                assert handler.fetch(url) == PlainTextContent("ok")
+        assert len(requests) == 1
+        assert [lookup.status for lookup in first.lookups] == [CacheStatus.MISS]
+        assert [lookup.status for lookup in second.lookups] == [CacheStatus.HIT]
+
+    def test_no_cache_goes_to_network(self, http_server):
+        respond, requests = _counting()
+        with http_server(respond) as port:
+            handler = HttpHandler(cache=MemoryCache())
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            with navigation_cache("no-cache") as reload:
+                handler.fetch(url)
+        assert len(requests) == 2
+        assert b"Cache-Control: no-cache" in requests[1]
+        assert reload.lookups[0].status == CacheStatus.MISS
+
+    def test_request_no_store(self, http_server):
+        respond, requests = _counting()
+        with http_server(respond) as port:
+            handler = HttpHandler(cache=MemoryCache())
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            with navigation_cache("no-store"):
+                handler.fetch(url)
+            handler.fetch(url)
+        assert len(requests) == 2
+
+    @pytest.mark.parametrize(
+        "encoded_at_rest, cache_control, kept",
+        [(False, None, False), (True, None, True), (True, "no-store", False)],
+    )
+    def test_encoded_body_kept_for_storing(
+        self, http_server, monkeypatch, encoded_at_rest, cache_control, kept
+    ):
+        """Test the body as received is only kept when the cache stores it so."""
+        body = b"<p>text compresses well</p>" * 1000
+        encoded = gzip.compress(body)
+        responses = []
+
+        def record(url, request):
+            responses.append(request_http(url, request))
+            return responses[-1]
+
+        def respond(_: bytes) -> bytes:
+            return (
+                b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                b"Content-Encoding: gzip\r\nContent-Type: text/plain\r\n"
+                b"Content-Length: %d\r\n\r\n" % len(encoded) + encoded
+            )
+
+        monkeypatch.setattr(handler_module, "request_http", record)
+        cache = MemoryCache(encoded_at_rest=encoded_at_rest)
+        with http_server(respond) as port:
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            with navigation_cache(cache_control):
+                HttpHandler(cache=cache).fetch(url)
+        assert responses[0].body == body
+        assert responses[0].encoded_body == (encoded if kept else None)
+        if kept:
+            # Stored gzipped
+            assert cache.stats().bytes < len(body)
+
+    def test_offline(self, http_server):
+        """Test only-if-cached serves stored pages and never hits the network."""
+        respond, requests = _counting()
+        with http_server(respond) as port:
+            stored = Url.parse(f"http://127.0.0.1:{port}/stored")
+            navigate(stored)
+            online_requests = len(requests)
+
+            cached = navigate(stored, "only-if-cached")
+            missing = navigate(
+                Url.parse(f"http://127.0.0.1:{port}/missing"), "only-if-cached"
+            )
+        assert len(requests) == online_requests
+        assert cached.content == PlainTextContent("ok")
+        assert [lookup.status for lookup in cached.cache_lookups] == [CacheStatus.HIT]
+        assert missing.content == UnknownContent(bytes=b"", media_type=None)
+        assert [lookup.status for lookup in missing.cache_lookups] == [
+            CacheStatus.UNAVAILABLE
+        ]
+
+
+class TestValidation:
+    """Test revalidating stored responses (ref https://httpwg.org/specs/rfc9111.html#validation.model)."""
+
+    def test_conditional_request(self):
+        stored = dataclasses.replace(
+            _response(),
+            headers=HeaderMap(
+                {"etag": '"v1"', "last-modified": "Sun, 06 Nov 1994 08:49:37 GMT"}
+            ),
+        )
+        request = conditional_request(stored.request, stored)
+        assert request.headers["If-None-Match"] == '"v1"'
+        assert request.headers["If-Modified-Since"] == "Sun, 06 Nov 1994 08:49:37 GMT"
+
+    def test_freshen_response(self):
+        stored = dataclasses.replace(
+            _response("max-age=60"),
+            headers=HeaderMap(
+                {"cache-control": "max-age=60", "etag": '"v1"', "content-length": "2"}
+            ),
+        )
+        not_modified = dataclasses.replace(
+            _response(),
+            status_code=304,
+            headers=HeaderMap({"cache-control": "max-age=600", "content-length": "0"}),
+            body=b"",
+        )
+        freshened = freshen_response(stored, not_modified)
+        assert freshened.status_code == 200
+        assert freshened.body == b"ok"
+        assert freshened.headers["cache-control"] == "max-age=600"
+        assert freshened.headers["etag"] == '"v1"'
+        assert freshened.headers["content-length"] == "2"
+
+    def test_not_modified(self, http_server):
+        respond, requests = _validating()
+        with http_server(respond) as port:
+            handler = HttpHandler(cache=MemoryCache())
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            before = cache_stats()
+            with navigation_cache() as revisit:
+                assert handler.fetch(url) == PlainTextContent("ok")
+            after = cache_stats()
+
+        assert len(requests) == 2
+        assert b'If-None-Match: "v1"' in requests[1]
+        assert [lookup.status for lookup in revisit.lookups] == [
+            CacheStatus.REVALIDATED
+        ]
+        assert after.revalidations - before.revalidations == 1
+        assert after.not_modified - before.not_modified == 1
+        assert after.bytes_saved - before.bytes_saved == 2
+        # The stored response took the header fields of the 304
+        entry = handler.cache.lookup(HttpFamilyUrl.from_url(url))
+        assert entry is not None
+        assert entry.response.headers["x-served"] == "2"
+        assert entry.response.body == b"ok"
+
+    def test_refreshed_lifetime(self, http_server):
+        """Test a 304 makes the stored response fresh again."""
+        respond, requests = _validating("max-age=60")
+        with http_server(respond) as port:
+            cache = MemoryCache()
+            handler = HttpHandler(cache=cache)
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            # Let the stored response go stale
+            http_family_url = HttpFamilyUrl.from_url(url)
+            entry = cache.lookup(http_family_url)
+            assert entry is not None
+            cache.set(
+                http_family_url,
+                entry.response,
+                dataclasses.replace(entry.freshness, response_time=0),
+            )
+
+            handler.fetch(url)
+            with navigation_cache() as revisit:
+                handler.fetch(url)
+        assert len(requests) == 2
+        assert b"If-None-Match" in requests[1]
+        assert [lookup.status for lookup in revisit.lookups] == [CacheStatus.HIT]
+
+    def test_changed(self, http_server):
+        """Test a full response replaces the stored one."""
+        respond, requests = _validating()
+        with http_server(respond) as port:
+            handler = HttpHandler(cache=MemoryCache())
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            entry = handler.cache.lookup(HttpFamilyUrl.from_url(url))
+            assert entry is not None
+            handler.cache.set(
+                HttpFamilyUrl.from_url(url),
+                dataclasses.replace(
+                    entry.response,
+                    headers=HeaderMap({**entry.response.headers, "etag": '"v0"'}),
+                ),
+                entry.freshness,
+            )
+            with navigation_cache() as revisit:
+                assert handler.fetch(url) == PlainTextContent("ok")
+        assert b'If-None-Match: "v0"' in requests[1]
+        assert [lookup.status for lookup in revisit.lookups] == [CacheStatus.MISS]
+        entry = handler.cache.lookup(HttpFamilyUrl.from_url(url))
+        assert entry is not None
+        assert entry.response.etag == '"v1"'
+
+
+class TestStaleResponses:
+    """Test serving stale responses (ref https://www.rfc-editor.org/rfc/rfc5861)."""
+
+    def test_stale_while_revalidate(self, http_server):
+        served = threading.Event()
+        release = threading.Event()
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head)
+            if len(requests) > 1:
+                # Hold the background refresh until the stale copies are served
+                served.wait(5)
+                release.set()
+            body = f"v{len(requests)}"
+            return (
+                "HTTP/1.1 200 OK\r\n"
+                "Cache-Control: max-age=60, stale-while-revalidate=60\r\n"
+                f"Content-Type: text/plain\r\nContent-Length: {len(body)}\r\n\r\n"
+                f"{body}"
+            ).encode()
+
+        refresher = BackgroundRefresher()
+        with http_server(respond) as port:
+            cache = MemoryCache()
+            handler = HttpHandler(cache=cache, refresher=refresher)
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            _make_stale(cache, url)
+            before = cache_stats()
+            with navigation_cache() as stale:
+                contents = [handler.fetch(url) for _ in range(3)]
+            served.set()
+            assert release.wait(5)
+            refresher.shutdown()
+            after = cache_stats()
+            with navigation_cache() as refreshed:
+                assert handler.fetch(url) == PlainTextContent("v2")
+
+        assert contents == [PlainTextContent("v1")] * 3
+        assert {lookup.status for lookup in stale.lookups} == {
+            CacheStatus.STALE_WHILE_REVALIDATE
+        }
+        # One refresh for the three stale responses
+        assert len(requests) == 2
+        assert after.background_refreshes - before.background_refreshes == 1
+        assert after.coalesced_refreshes - before.coalesced_refreshes == 2
+        assert [lookup.status for lookup in refreshed.lookups] == [CacheStatus.HIT]
+
+    def test_stale_if_error_on_server_error(self, http_server):
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head)
+            if len(requests) > 1:
+                return b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n"
+            return (
+                b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60, stale-if-error=600\r\n"
+                b"Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+            )
+
+        with http_server(respond) as port:
+            cache = MemoryCache()
+            handler = HttpHandler(cache=cache)
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+            _make_stale(cache, url)
+            with navigation_cache() as failed:
+                assert handler.fetch(url) == PlainTextContent("ok")
+            # Too stale to stand in for the error
+            _make_stale(cache, url, 700)
+            assert handler.fetch(url) == UnknownContent(bytes=b"", media_type=None)
+        assert [lookup.status for lookup in failed.lookups] == [
+            CacheStatus.STALE_IF_ERROR
+        ]
+
+    def test_stale_if_error_when_unreachable(self, http_server):
+        def respond(head: bytes) -> bytes:
+            return (
+                b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60, stale-if-error=600\r\n"
+                b"Connection: close\r\n"
+                b"Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+            )
+
+        with http_server(respond) as port:
+            cache = MemoryCache()
+            handler = HttpHandler(cache=cache)
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            handler.fetch(url)
+        _make_stale(cache, url)
+        with navigation_cache() as offline:
+            assert handler.fetch(url) == PlainTextContent("ok")
+        assert [lookup.status for lookup in offline.lookups] == [
+            CacheStatus.STALE_IF_ERROR
+        ]
+
+
+class TestCoalescing:
+    """Test identical fetches in flight at once share one request."""
+
+    RESPONSE = (
+        b"HTTP/1.1 200 OK\r\nCache-Control: no-store\r\n"
+        b"Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+    )
+
+    def test_threads(self, http_server):
+        release = threading.Event()
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head)
+            release.wait(5)
+            return self.RESPONSE
+
+        def fetch(url: Url) -> list[CacheStatus]:
+            with navigation_cache() as navigation:
+                assert handler.fetch(url) == PlainTextContent("ok")
+            return [lookup.status for lookup in navigation.lookups]
+
+        handler = HttpHandler(cache=MemoryCache(), in_flight=InFlightFetches())
+        before = cache_stats().coalesced_fetches
+        with http_server(respond) as port:
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            with ThreadPoolExecutor(5) as pool:
+                statuses = pool.map(fetch, [url] * 5)
+                # Release the response once every other fetch has joined
+                _wait_for_coalesced(before, 4)
+                release.set()
+                statuses = sorted(status for [status] in statuses)
+            # Once it has landed, the next fetch sends its own request
+            fetch(url)
+
+        assert len(requests) == 2
+        assert statuses == sorted([CacheStatus.MISS] + [CacheStatus.COALESCED] * 4)
+
+    def test_coroutines(self, http_server):
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head)
+            return self.RESPONSE
+
+        handler = HttpHandler(cache=MemoryCache(), in_flight=InFlightFetches())
+
+        async def fetch_all(url: Url) -> list:
+            return await asyncio.gather(*(handler.fetch_async(url) for _ in range(5)))
+
+        with http_server(respond) as port:
+            page = Url.parse(f"http://127.0.0.1:{port}/page")
+            other = Url.parse(f"http://127.0.0.1:{port}/other")
+            assert asyncio.run(fetch_all(page)) == [PlainTextContent("ok")] * 5
+            assert asyncio.run(fetch_all(other)) == [PlainTextContent("ok")] * 5
+        assert len(requests) == 2
+
+    def test_shared_exception(self):
+        in_flight = InFlightFetches[str, str]()
+        started = threading.Event()
+        before = cache_stats().coalesced_fetches
+
+        def fail() -> str:
+            started.set()
+            _wait_for_coalesced(before, 1)
+            raise OSError("unreachable")
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(in_flight.run, "key", fail)
+            assert started.wait(5)
+            follower = pool.submit(in_flight.run, "key", lambda: "fetched again")
+            for future in (leader, follower):
+                with pytest.raises(OSError, match="unreachable"):
+                    future.result()
+
+
+def _wait_for_coalesced(before: int, count: int) -> None:
+    """Wait until `count` fetches joined one in flight since `before`."""
+    deadline = time.monotonic() + 5
+    while cache_stats().coalesced_fetches - before < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
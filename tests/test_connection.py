@@ -0,0 +1,265 @@
+import dataclasses
+import socket
+import threading
+import zlib
+from functools import partial
+
+import pytest
+
+from browser import connection as connection_module
+from browser.connection import (
+    Connection,
+    ConnectionCacheKey,
+    _OriginMemo,
+    request_http,
+    request_http_pipelined,
+)
+from browser.protocols.http.headers.keep_alive import KeepAlive, parse_keep_alive
+from browser.protocols.http.parser import HttpParseError
+from browser.protocols.http.request import HttpRequest
+from tests.helpers import get_request, local_url
+
+
+def _chunked(chunks: list[bytes], trailers: bytes = b"") -> bytes:
+    body = b"".join(b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks)
+    return (
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        + body
+        + b"0\r\n"
+        + trailers
+        + b"\r\n"
+    )
+
+
+class TestConnection:
+    """Test the blocking Connection against a local server."""
+
+    def test_chunked_body_keeps_whitespace(self, http_server):
+        """Test chunks that start or end with whitespace are not altered."""
+        chunks = [b"  leading", b"trailing \r\n", b"\t"]
+        with http_server(lambda _: _chunked(chunks)) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            response = connection.request(get_request())
+            connection.close()
+
+        assert response.body == b"".join(chunks)
+
+    def test_trailers(self, http_server):
+        """Test trailer fields are attached to the response."""
+        with http_server(
+            lambda _: _chunked([b"data"], b"Server-Timing: db;dur=5\r\n")
+        ) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            response = connection.request(get_request())
+            connection.close()
+
+        assert response.trailers == {"server-timing": "db;dur=5"}
+
+    def test_many_chunks(self, http_server):
+        """Test a body made of many chunks over a reused connection."""
+        chunks = [bytes([i % 256]) * (i % 7 + 1) for i in range(10_000)]
+        with http_server(lambda _: _chunked(chunks)) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            for _ in range(2):
+                assert connection.request(get_request()).body == b"".join(chunks)
+            connection.close()
+
+    def test_deflate_content_length(self, http_server):
+        """Test a content-coded body is decoded, and kept encoded if the request asks."""
+        body = b"deflated " * 50_000
+        encoded = zlib.compress(body)
+
+        def respond(_: bytes) -> bytes:
+            return (
+                b"HTTP/1.1 200 OK\r\nContent-Encoding: deflate\r\n"
+                b"Content-Length: %d\r\n\r\n" % len(encoded) + encoded
+            )
+
+        with http_server(respond) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            response = connection.request(get_request())
+            assert response.body == body
+            assert response.encoded_body is None
+            request = dataclasses.replace(get_request(), keep_encoded_body=True)
+            response = connection.request(request)
+            assert response.body == body
+            assert response.encoded_body == encoded
+            connection.close()
+
+    def test_large_content_length(self, http_server):
+        """Test a large body received straight into its buffer."""
+        body = bytes(range(256)) * 8192
+
+        def respond(_: bytes) -> bytes:
+            return b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+
+        with http_server(respond) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            assert connection.request(get_request()).body == body
+            assert connection.reusable
+            connection.close()
+
+    def test_huge_claimed_content_length(self):
+        """Test a Content-Length far beyond the body is not preallocated."""
+        with socket.create_server(("127.0.0.1", 0)) as server:
+            port = server.getsockname()[1]
+
+            def respond() -> None:
+                peer, _ = server.accept()
+                with peer:
+                    peer.recv(65536)
+                    peer.sendall(
+                        b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\nok" % 2**62
+                    )
+
+            thread = threading.Thread(target=respond)
+            thread.start()
+            connection = Connection.open("http", "127.0.0.1", port)
+            with pytest.raises(HttpParseError):
+                connection.request(get_request())
+            connection.close()
+            thread.join()
+
+
+def _echo_path(head: bytes, extra_headers: bytes = b"") -> bytes:
+    path = head.split(b" ", 2)[1]
+    return b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n%s\r\n%s" % (
+        len(path),
+        extra_headers,
+        path,
+    )
+
+
+class TestPipelining:
+    """Test pipelined requests against a local server."""
+
+    def test_responses_in_request_order(self, http_server):
+        """Test responses are matched to requests first in, first out."""
+        paths = [f"/{i}" for i in range(20)]
+        with http_server(_echo_path) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            responses = connection.request_pipelined([get_request(p) for p in paths])
+            assert [r.body.decode() for r in responses] == paths
+            assert [r.request.path for r in responses] == paths
+            assert connection.reusable
+            connection.close()
+
+    def test_server_stops_pipelining(self, http_server):
+        """Test requests after a `Connection: close` response are left unanswered."""
+
+        def respond(head: bytes) -> bytes:
+            closing = head.startswith(b"GET /1 ")
+            return _echo_path(head, b"Connection: close\r\n" if closing else b"")
+
+        with http_server(respond) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            responses = connection.request_pipelined(
+                [get_request(f"/{i}") for i in range(4)]
+            )
+            assert [r.body for r in responses] == [b"/0", b"/1"]
+            assert not connection.reusable
+            connection.close()
+
+    def test_fallback_to_one_request_at_a_time(self, http_server):
+        """Test the origin is no longer pipelined once it stops part way."""
+        paths = [f"/{i}" for i in range(5)]
+        respond = partial(_echo_path, extra_headers=b"Connection: close\r\n")
+        with http_server(respond) as port:
+            url = local_url(port)
+            responses = request_http_pipelined(url, [get_request(p) for p in paths])
+        assert [r.body.decode() for r in responses] == paths
+
+    def test_unsafe_methods_are_not_pipelined(self):
+        """Test a request that may not be repeated is rejected."""
+        post = HttpRequest(method="POST", path="/", headers={}, version="1.1")
+        with socket.socket() as sock, pytest.raises(ValueError):
+            Connection(sock).request_pipelined([post])
+
+
+class TestOriginMemo:
+    """Test what is learned about an origin is forgotten after a while."""
+
+    KEY = ConnectionCacheKey(scheme="https", host="example.com", port=443)
+
+    def test_remembered(self):
+        """Test an added origin is remembered."""
+        memo = _OriginMemo()
+        assert self.KEY not in memo
+        memo.add(self.KEY)
+        assert self.KEY in memo
+
+    def test_expires(self, monkeypatch):
+        """Test an origin is forgotten after ORIGIN_MEMO_TTL."""
+        monkeypatch.setattr(connection_module, "ORIGIN_MEMO_TTL", 0)
+        memo = _OriginMemo()
+        memo.add(self.KEY)
+        assert self.KEY not in memo
+
+
+class TestKeepAlive:
+    """Test the limits servers put on persistent connections."""
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("timeout=5, max=100", KeepAlive(timeout=5, max=100)),
+            ('Timeout="30"', KeepAlive(timeout=30)),
+            ("max=0, timeout=soon, extension", KeepAlive(max=0)),
+            ("", KeepAlive()),
+        ],
+    )
+    def test_parse(self, value, expected):
+        assert parse_keep_alive(value) == expected
+
+    def test_limits(self, http_server):
+        """Test the idle timeout is noted and max=0 ends reuse."""
+
+        def respond(head: bytes) -> bytes:
+            left = b"0" if head.startswith(b"GET /last ") else b"9"
+            return _echo_path(head, b"Keep-Alive: timeout=5, max=%s\r\n" % left)
+
+        with http_server(respond) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            connection.request(get_request())
+            assert connection.reusable
+            assert (connection.keep_alive_timeout, connection.idle_timeout) == (5, 4)
+            connection.request(get_request("/last"))
+            assert not connection.reusable
+            connection.close()
+
+
+class TestStaleConnection:
+    """Test requests on a reused connection the server closed."""
+
+    @staticmethod
+    def _close_second(sent: list[bytes], head: bytes) -> bytes:
+        # Closes the connection instead of answering the second request, as
+        # a server closing it while idle just as the request arrives
+        sent.append(head.split(b" ", 2)[1])
+        if len(sent) == 2:
+            raise ConnectionAbortedError
+        return _echo_path(head)
+
+    def test_idempotent_request_is_retried(self, http_server):
+        """Test a GET is sent again once on another connection."""
+        sent = list[bytes]()
+        respond = partial(self._close_second, sent)
+        with http_server(respond) as port:
+            url = local_url(port)
+            assert request_http(url, get_request("/first")).body == b"/first"
+            assert request_http(url, get_request("/stale")).body == b"/stale"
+        assert sent == [b"/first", b"/stale", b"/stale"]
+
+    def test_other_request_is_not_retried(self, http_server):
+        """Test a POST that may have been processed is not sent again."""
+        sent = list[bytes]()
+        respond = partial(self._close_second, sent)
+        post = HttpRequest(
+            method="POST", path="/stale", headers={"Host": "127.0.0.1"}, version="1.1"
+        )
+        with http_server(respond) as port:
+            url = local_url(port)
+            request_http(url, get_request("/first"))
+            with pytest.raises(ConnectionError):
+                request_http(url, post)
+        assert sent == [b"/first", b"/stale"]
@@ -0,0 +1,277 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from browser.connection_pool import AsyncConnectionPool, ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.alive = True
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+    def is_alive(self) -> bool:
+        return self.alive and not self.closed
+
+
+class FakeAsyncConnection(FakeConnection):
+    async def close(self) -> None:  # type: ignore[override]
+        self.closed = True
+
+
+async def _open_fake() -> FakeAsyncConnection:
+    return FakeAsyncConnection()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestConnectionPool:
+    """Test checkout/checkin behaviour of ConnectionPool."""
+
+    def test_reuses_idle_connection(self):
+        """Test a returned connection is handed out again."""
+        pool = ConnectionPool[str, FakeConnection]()
+        first = pool.checkout("a", FakeConnection)
+        pool.checkin("a", first)
+
+        assert pool.checkout("a", FakeConnection) is first
+        stats = pool.stats()
+        assert (stats.hits, stats.misses) == (1, 1)
+
+    def test_keeps_several_idle_connections_per_origin(self):
+        """Test concurrent checkouts open separate connections that are all kept."""
+        pool = ConnectionPool[str, FakeConnection]()
+        first = pool.checkout("a", FakeConnection)
+        second = pool.checkout("a", FakeConnection)
+        pool.checkin("a", first)
+        pool.checkin("a", second)
+
+        assert pool.stats().idle == 2
+        assert {pool.checkout("a", FakeConnection) for _ in range(2)} == {
+            first,
+            second,
+        }
+
+    def test_dead_connection_is_discarded(self):
+        """Test a connection closed by the peer is not reused."""
+        pool = ConnectionPool[str, FakeConnection]()
+        dead = pool.checkout("a", FakeConnection)
+        pool.checkin("a", dead)
+        dead.alive = False
+
+        fresh = pool.checkout("a", FakeConnection)
+        assert fresh is not dead
+        assert dead.closed
+        assert pool.stats().discarded == 1
+
+    def test_fresh_checkout_skips_idle_connections(self):
+        """Test a fresh checkout opens a new connection, evicting an idle one at the limit."""
+        pool = ConnectionPool[str, FakeConnection](max_per_host=2)
+        first = pool.checkout("a", FakeConnection)
+        second = pool.checkout("a", FakeConnection)
+        pool.checkin("a", first)
+
+        third = pool.checkout("a", FakeConnection, fresh=True)
+        assert third not in (first, second)
+        assert first.closed
+        stats = pool.stats()
+        assert (stats.hits, stats.misses, stats.evictions) == (0, 3, 1)
+
+    def test_idle_timeout(self):
+        """Test a connection idle for too long is not reused."""
+        clock = FakeClock()
+        pool = ConnectionPool[str, FakeConnection](idle_timeout=10, clock=clock)
+        old = pool.checkout("a", FakeConnection)
+        pool.checkin("a", old)
+        clock.now = 11
+
+        assert pool.checkout("a", FakeConnection) is not old
+        assert old.closed
+
+    def test_not_reusable_checkin_closes(self):
+        """Test checkin with reusable=False closes and frees the slot."""
+        pool = ConnectionPool[str, FakeConnection](max_per_host=1, max_total=1)
+        connection = pool.checkout("a", FakeConnection)
+        pool.checkin("a", connection, reusable=False)
+
+        assert connection.closed
+        assert pool.checkout("a", FakeConnection, timeout=0) is not connection
+
+    def test_global_limit_evicts_least_recently_used(self):
+        """Test the oldest idle connection of another origin is evicted."""
+        pool = ConnectionPool[str, FakeConnection](max_per_host=2, max_total=2)
+        a = pool.checkout("a", FakeConnection)
+        b = pool.checkout("b", FakeConnection)
+        pool.checkin("a", a)
+        pool.checkin("b", b)
+
+        pool.checkout("c", FakeConnection)
+        assert a.closed
+        assert not b.closed
+        assert pool.stats().evictions == 1
+
+    def test_per_host_limit_waits(self):
+        """Test checkout blocks at max_per_host until a connection is returned."""
+        pool = ConnectionPool[str, FakeConnection](max_per_host=1)
+        connection = pool.checkout("a", FakeConnection)
+
+        with pytest.raises(PoolTimeout):
+            pool.checkout("a", FakeConnection, timeout=0.01)
+
+        timer = threading.Timer(0.05, pool.checkin, ("a", connection))
+        timer.start()
+        assert pool.checkout("a", FakeConnection, timeout=5) is connection
+        timer.join()
+
+    def test_failed_open_releases_slot(self):
+        """Test an exception while opening does not leak a slot."""
+        pool = ConnectionPool[str, FakeConnection](max_per_host=1)
+
+        def fail() -> FakeConnection:
+            raise OSError("refused")
+
+        with pytest.raises(OSError):
+            pool.checkout("a", fail)
+        assert pool.checkout("a", FakeConnection, timeout=0) is not None
+
+    def test_thread_safety(self):
+        """Test concurrent checkout/checkin never exceeds the limits."""
+        pool = ConnectionPool[str, FakeConnection](max_per_host=3, max_total=4)
+        lock = threading.Lock()
+        in_use: dict[str, int] = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+
+        def worker(key: str):
+            for _ in range(200):
+                connection = pool.checkout(key, FakeConnection)
+                with lock:
+                    in_use[key] += 1
+                    peak[key] = max(peak[key], in_use[key])
+                with lock:
+                    in_use[key] -= 1
+                pool.checkin(key, connection)
+
+        threads = [
+            threading.Thread(target=worker, args=(key,))
+            for key in ("a", "b")
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(peak.values()) <= 3
+        stats = pool.stats()
+        assert stats.in_use == 0
+        assert stats.idle <= 4
+        assert stats.hits + stats.misses == 1600
+
+    def test_checkin_idle_timeout(self):
+        """Test a connection's own idle timeout shortens the pool's."""
+        clock = FakeClock()
+        pool = ConnectionPool[str, FakeConnection](idle_timeout=10, clock=clock)
+        short = pool.checkout("a", FakeConnection)
+        pool.checkin("a", short, idle_timeout=4)
+        clock.now = 5
+
+        assert pool.checkout("a", FakeConnection) is not short
+        assert short.closed
+
+    def test_reap(self):
+        """Test expired and dead idle connections are closed without a checkout."""
+        clock = FakeClock()
+        pool = ConnectionPool[str, FakeConnection](idle_timeout=10, clock=clock)
+        expired, dead, kept = (pool.checkout(key, FakeConnection) for key in "abc")
+        pool.checkin("a", expired, idle_timeout=4)
+        pool.checkin("b", dead)
+        pool.checkin("c", kept)
+        dead.alive = False
+        clock.now = 5
+
+        assert pool.reap() == 2
+        assert expired.closed and dead.closed and not kept.closed
+        stats = pool.stats()
+        assert (stats.reaped, stats.idle, stats.in_use) == (2, 1, 0)
+        assert pool.checkout("c", FakeConnection) is kept
+
+    def test_background_reaper(self):
+        """Test the reaper thread closes a connection closed by the peer."""
+        pool = ConnectionPool[str, FakeConnection](reap_interval=0.01)
+        connection = pool.checkout("a", FakeConnection)
+        pool.checkin("a", connection)
+        connection.alive = False
+
+        deadline = time.monotonic() + 5
+        while not connection.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert connection.closed
+        assert pool.stats().idle == 0
+
+
+class TestAsyncConnectionPool:
+    """Test AsyncConnectionPool, which shares ConnectionPool's bookkeeping."""
+
+    def test_per_host_limit_waits(self):
+        """Test checkout waits at max_per_host until a connection is returned."""
+
+        async def main():
+            pool = AsyncConnectionPool[str, FakeAsyncConnection](max_per_host=1)
+            connection = await pool.checkout("a", _open_fake)
+            with pytest.raises(PoolTimeout):
+                await pool.checkout("a", _open_fake, timeout=0.01)
+
+            waiting = asyncio.create_task(pool.checkout("a", _open_fake, timeout=5))
+            await asyncio.sleep(0.01)
+            await pool.checkin("a", connection)
+            assert await waiting is connection
+            return pool.stats()
+
+        stats = asyncio.run(main())
+        assert (stats.hits, stats.misses, stats.in_use) == (1, 1, 1)
+
+    def test_reap(self):
+        """Test expired idle connections are closed without a checkout."""
+        clock = FakeClock()
+
+        async def main():
+            pool = AsyncConnectionPool[str, FakeAsyncConnection](
+                idle_timeout=10, clock=clock
+            )
+            expired, kept = [await pool.checkout(key, _open_fake) for key in "ab"]
+            await pool.checkin("a", expired, idle_timeout=4)
+            await pool.checkin("b", kept)
+            clock.now = 5
+            assert await pool.reap() == 1
+            assert expired.closed and not kept.closed
+            assert await pool.checkout("b", _open_fake) is kept
+
+        asyncio.run(main())
+
+    def test_background_reaper(self):
+        """Test the reaper task closes a connection closed by the peer."""
+
+        async def main():
+            pool = AsyncConnectionPool[str, FakeAsyncConnection](reap_interval=0.01)
+            connection = await pool.checkout("a", _open_fake)
+            await pool.checkin("a", connection)
+            connection.alive = False
+            for _ in range(500):
+                if connection.closed:
+                    break
+                await asyncio.sleep(0.01)
+            return connection.closed, pool.stats().idle
+
+        assert asyncio.run(main()) == (True, 0)
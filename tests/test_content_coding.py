@@ -0,0 +1,91 @@
+import gzip
+import zlib
+
+import pytest
+
+from browser.protocols.http import content_coding
+from browser.protocols.http.content_coding import (
+    ContentDecoder,
+    DecodedSizeExceeded,
+    UnsupportedContentEncoding,
+    accept_encoding,
+    decode_chunks,
+    decode_content,
+)
+
+BODY = b"".join(b"line %d\n" % i for i in range(5_000))
+
+
+def _split(data: bytes, size: int) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def _raw_deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class TestContentDecoder:
+    """Test decoding content-coded bodies."""
+
+    @pytest.mark.parametrize(
+        ("content_encoding", "encoded"),
+        [
+            ("gzip", gzip.compress(BODY)),
+            ("x-gzip", gzip.compress(BODY)),
+            ("deflate", zlib.compress(BODY)),
+            ("deflate", _raw_deflate(BODY)),
+            ("identity", BODY),
+            (None, BODY),
+        ],
+        ids=["gzip", "x-gzip", "deflate", "raw-deflate", "identity", "none"],
+    )
+    def test_decode_chunks(self, content_encoding, encoded):
+        """Test each coding decodes the same from any chunk size."""
+        for size in (1, 7, 4096, len(encoded)):
+            chunks = decode_chunks(content_encoding, _split(encoded, size))
+            assert b"".join(chunks) == BODY
+
+    def test_codings_are_undone_in_reverse(self):
+        """Test a body coded twice is decoded in reverse order."""
+        encoded = gzip.compress(zlib.compress(BODY))
+        assert decode_content("deflate, GZIP", encoded) == BODY
+
+    def test_gzip_members(self):
+        """Test a gzip body made of several members."""
+        encoded = gzip.compress(b"first ") + gzip.compress(b"second")
+        assert decode_content("gzip", encoded) == b"first second"
+
+    def test_unsupported_coding(self):
+        """Test an unknown coding is rejected before any data is decoded."""
+        with pytest.raises(UnsupportedContentEncoding):
+            ContentDecoder("br")
+
+    def test_decoded_size_ceiling(self):
+        """Test a compression bomb is stopped at the ceiling."""
+        encoded = gzip.compress(bytes(10 * 1024 * 1024))
+        assert len(encoded) < 20 * 1024
+        decoder = ContentDecoder("gzip", max_size=1024 * 1024)
+        with pytest.raises(DecodedSizeExceeded):
+            decoder.decode(encoded)
+
+    def test_decoded_size_ceiling_across_chunks(self, monkeypatch):
+        """Test the module-wide ceiling counts every chunk of a body."""
+        monkeypatch.setattr(content_coding, "MAX_DECODED_SIZE", len(BODY) - 1)
+        with pytest.raises(DecodedSizeExceeded):
+            list(decode_chunks("gzip", _split(gzip.compress(BODY), 512)))
+        monkeypatch.setattr(content_coding, "MAX_DECODED_SIZE", len(BODY))
+        assert decode_content("gzip", gzip.compress(BODY)) == BODY
+
+    @pytest.mark.skipif(content_coding.zstd is None, reason="zstd is unavailable")
+    def test_zstd(self):
+        """Test zstd bodies, including concatenated frames."""
+        zstd = content_coding.zstd
+        assert zstd is not None
+        encoded = zstd.compress(BODY) + zstd.compress(b"tail")
+        assert "zstd" in accept_encoding()
+        assert b"".join(decode_chunks("zstd", _split(encoded, 100))) == BODY + b"tail"
+
+    def test_accept_encoding(self):
+        """Test every supported coding is advertised."""
+        assert accept_encoding().split(", ")[:2] == ["gzip", "deflate"]
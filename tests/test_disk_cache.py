@@ -0,0 +1,255 @@
+import dataclasses
+import sqlite3
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from browser.cache import CacheStatus, MemoryCache, navigation_cache
+from browser.content import PlainTextContent
+from browser.disk_cache import DiskCache
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.handler import HttpHandler
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.url import Url
+from tests.helpers import example_url
+
+FRESHNESS = Freshness(lifetime=60, initial_age=1, response_time=1_000_000)
+
+
+def _response(body: bytes = b"ok") -> HttpResponse:
+    return HttpResponse(
+        version="HTTP/1.1",
+        status_code=200,
+        status_message="OK",
+        headers=HeaderMap({"cache-control": "max-age=60", "etag": '"v1"'}),
+        body=body,
+        request=HttpRequest(
+            method="GET", path="/", headers={"Host": "example.com"}, version="1.1"
+        ),
+        trailers=HeaderMap({"server-timing": "db;dur=5"}),
+    )
+
+
+def _bodies(directory: Path) -> list[Path]:
+    return list((directory / "bodies").iterdir())
+
+
+class TestDiskCache:
+    def test_survives_restart(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        cache.set(example_url("page"), _response(), FRESHNESS)
+        cache.close()
+
+        entry = DiskCache(tmp_path).lookup(example_url("page"))
+        assert entry is not None
+        assert entry.response == _response()
+        assert entry.freshness == FRESHNESS
+
+    def test_missing(self, tmp_path):
+        assert DiskCache(tmp_path).lookup(example_url("page")) is None
+
+    def test_empty_body(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        cache.set(example_url("empty"), _response(b""), FRESHNESS)
+        entry = cache.lookup(example_url("empty"))
+        assert entry is not None
+        assert entry.response.body == b""
+
+    def test_replace(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        cache.set(example_url("page"), _response(b"first"), FRESHNESS)
+        cache.set(example_url("page"), _response(b"second"), FRESHNESS)
+        entry = cache.lookup(example_url("page"))
+        assert entry is not None
+        assert entry.response.body == b"second"
+        assert len(_bodies(tmp_path)) == 1
+        assert cache.stats().bytes == len(b"second")
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = DiskCache(tmp_path, max_bytes=300)
+        for path in "abc":
+            cache.set(example_url(path), _response(path.encode() * 100), FRESHNESS)
+        cache.lookup(example_url("a"))
+        cache.set(example_url("d"), _response(b"d" * 100), FRESHNESS)
+
+        assert cache.lookup(example_url("b")) is None
+        assert all(cache.lookup(example_url(path)) for path in "acd")
+        stats = cache.stats()
+        assert (stats.entries, stats.bytes, stats.evictions) == (3, 300, 1)
+        assert len(_bodies(tmp_path)) == 3
+
+    def test_too_large(self, tmp_path):
+        cache = DiskCache(tmp_path, max_bytes=10)
+        cache.set(example_url("page"), _response(b"x" * 11), FRESHNESS)
+        assert cache.lookup(example_url("page")) is None
+
+    def test_variants(self, tmp_path):
+        def variant(language: str, vary: str = "accept-language") -> HttpResponse:
+            return dataclasses.replace(
+                _response(language.encode()),
+                headers=HeaderMap({"vary": vary}),
+                request=HttpRequest(
+                    method="GET",
+                    path="/",
+                    headers={"Accept-Language": language},
+                    version="1.1",
+                ),
+            )
+
+        def body(language: str) -> bytes | None:
+            request = HttpRequest(
+                method="GET", path="/", headers={"accept-language": language}
+            )
+            entry = cache.lookup(example_url("page"), request)
+            return None if entry is None else entry.response.body
+
+        cache = DiskCache(tmp_path)
+        cache.set(example_url("page"), variant("en"), FRESHNESS)
+        cache.set(example_url("page"), variant("fr"), FRESHNESS)
+        assert (body("en"), body("fr"), body("de")) == (b"en", b"fr", None)
+
+        # Varying on other fields outdates both
+        cache.set(example_url("page"), variant("en", vary="accept-encoding"), FRESHNESS)
+        assert cache.stats().entries == 1
+        assert body("fr") == b"en"
+        assert len(_bodies(tmp_path)) == 1
+
+    def test_identical_bodies(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        for path in ("a", "b?utm=1", "c"):
+            cache.set(example_url(path), _response(b"shared" * 100), FRESHNESS)
+        cache.set(example_url("d"), _response(b"other"), FRESHNESS)
+        assert len(_bodies(tmp_path)) == 2
+        stats = cache.stats()
+        assert (stats.entries, stats.bytes) == (4, 605)
+        assert stats.dedup_saved_bytes == 1200
+
+        # The body stays until its last entry goes
+        cache.set(example_url("a"), _response(b"changed"), FRESHNESS)
+        cache.set(example_url("b?utm=1"), _response(b"changed"), FRESHNESS)
+        assert len(_bodies(tmp_path)) == 3
+        cache.set(example_url("c"), _response(b"changed"), FRESHNESS)
+        assert len(_bodies(tmp_path)) == 2
+        entry = cache.lookup(example_url("a"))
+        assert entry is not None
+        assert entry.response.body == b"changed"
+
+    def test_eviction_of_shared_body(self, tmp_path):
+        cache = DiskCache(tmp_path, max_bytes=200)
+        cache.set(example_url("a"), _response(b"a" * 100), FRESHNESS)
+        cache.set(example_url("b"), _response(b"a" * 100), FRESHNESS)
+        cache.set(example_url("c"), _response(b"c" * 100), FRESHNESS)
+        cache.set(example_url("d"), _response(b"d" * 100), FRESHNESS)
+        # Both entries of the shared body go before its bytes are freed
+        assert cache.lookup(example_url("a")) is None
+        assert cache.lookup(example_url("b")) is None
+        assert cache.stats().evictions == 2
+        assert len(_bodies(tmp_path)) == 2
+
+
+class TestIntegrity:
+    """Test the check made when the cache is opened."""
+
+    def test_damaged_bodies(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        for path in ("kept", "missing", "truncated"):
+            cache.set(example_url(path), _response(path.encode()), FRESHNESS)
+        cache.close()
+        bodies = {path.read_bytes(): path for path in _bodies(tmp_path)}
+        bodies[b"missing"].unlink()
+        bodies[b"truncated"].write_bytes(b"trunc")
+        (tmp_path / "bodies" / "orphan").write_bytes(b"left by a crash")
+
+        cache = DiskCache(tmp_path)
+        assert cache.stats().repaired == 2
+        assert cache.lookup(example_url("kept")) is not None
+        assert cache.lookup(example_url("missing")) is None
+        assert cache.lookup(example_url("truncated")) is None
+        assert len(_bodies(tmp_path)) == 1
+
+    def test_older_index(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        cache.set(example_url("page"), _response(), FRESHNESS)
+        cache.close()
+        db = sqlite3.connect(tmp_path / "index.sqlite3")
+        db.execute("PRAGMA user_version = 0")
+        db.commit()
+        db.close()
+
+        cache = DiskCache(tmp_path)
+        assert cache.lookup(example_url("page")) is None
+        assert _bodies(tmp_path) == []
+
+    def test_corrupt_index(self, tmp_path):
+        cache = DiskCache(tmp_path)
+        cache.set(example_url("page"), _response(), FRESHNESS)
+        cache.close()
+        for path in tmp_path.glob("index.sqlite3*"):
+            path.write_bytes(b"not a database" * 100)
+
+        cache = DiskCache(tmp_path)
+        assert cache.lookup(example_url("page")) is None
+        assert _bodies(tmp_path) == []
+        cache.set(example_url("page"), _response(), FRESHNESS)
+        assert cache.lookup(example_url("page")) is not None
+
+
+class TestSharing:
+    def test_concurrent_processes(self, tmp_path):
+        """Test processes writing to one cache at once."""
+        script = textwrap.dedent(
+            """
+            import sys
+            from browser.disk_cache import DiskCache
+            from tests.helpers import example_url
+            from tests.test_disk_cache import FRESHNESS, _response
+
+            cache = DiskCache(sys.argv[1], max_bytes=2000)
+            for i in range(40):
+                path = f"{sys.argv[2]}/{i % 10}"
+                cache.set(example_url(path), _response(path.encode() * 10), FRESHNESS)
+                cache.lookup(example_url(f"{sys.argv[2]}/{(i + 5) % 10}"))
+            """
+        )
+        root = Path(__file__).parent.parent
+        writers = [
+            subprocess.Popen(
+                [sys.executable, "-c", script, str(tmp_path), str(writer)], cwd=root
+            )
+            for writer in range(4)
+        ]
+        assert [writer.wait(60) for writer in writers] == [0] * 4
+
+        cache = DiskCache(tmp_path)
+        assert cache.stats().repaired == 0
+        assert cache.stats().entries == 40
+        assert len(_bodies(tmp_path)) == 40
+        assert all(
+            cache.lookup(example_url(f"{writer}/{i}"))
+            for writer in range(4)
+            for i in range(10)
+        )
+
+    def test_warm_start(self, tmp_path, http_server):
+        """Test a new process is served by the cache of a previous one."""
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head)
+            return (
+                b"HTTP/1.1 200 OK\r\nCache-Control: max-age=60\r\n"
+                b"Content-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+            )
+
+        with http_server(respond) as port:
+            url = Url.parse(f"http://127.0.0.1:{port}/page")
+            HttpHandler(cache=DiskCache(tmp_path)).fetch(url)
+            with navigation_cache() as warm:
+                content = HttpHandler(cache=DiskCache(tmp_path)).fetch(url)
+            HttpHandler(cache=MemoryCache()).fetch(url)
+        assert content == PlainTextContent("ok")
+        assert [lookup.status for lookup in warm.lookups] == [CacheStatus.HIT]
+        assert len(requests) == 2
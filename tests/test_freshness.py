@@ -0,0 +1,165 @@
+from email.utils import formatdate
+
+import pytest
+
+from browser.protocols.http.freshness import (
+    MAX_HEURISTIC_LIFETIME,
+    calculate_freshness,
+    parse_http_date,
+)
+from browser.protocols.http.headers.cache_control.response import (
+    MaxAge,
+    MustRevalidate,
+    NoCache,
+    NoStore,
+    Private,
+    Public,
+    SMaxAge,
+    StaleIfError,
+    StaleWhileRevalidate,
+    UnknownToken,
+    parse_response_cache_control,
+)
+
+# Response received at NOW, one second after the request was sent
+NOW = 1_700_000_000
+DAY = 24 * 60 * 60
+
+
+def _date(epoch: float) -> str:
+    return formatdate(epoch, usegmt=True)
+
+
+def _freshness(headers: dict[str, str], status_code: int = 200, shared: bool = False):
+    return calculate_freshness(status_code, headers, NOW - 1, NOW, shared=shared)
+
+
+class TestResponseCacheControl:
+    """Test parsing the directives freshness depends on."""
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("max-age=60", [MaxAge(60)]),
+            ('max-age="60"', [MaxAge(60)]),
+            ("s-maxage=30, public", [SMaxAge(30), Public()]),
+            ("private, no-store", [Private(), NoStore()]),
+            ("no-cache, must-revalidate", [NoCache([]), MustRevalidate()]),
+            ("max-age=later", [UnknownToken("max-age=later", "later")]),
+            (
+                "stale-while-revalidate=30, stale-if-error=600",
+                [StaleWhileRevalidate(30), StaleIfError(600)],
+            ),
+        ],
+    )
+    def test_directives(self, value, expected):
+        assert parse_response_cache_control(value) == expected
+
+
+class TestFreshnessLifetime:
+    """Test the freshness lifetime (ref RFC 9111 section 4.2.1)."""
+
+    @pytest.mark.parametrize(
+        "headers, lifetime",
+        [
+            ({"cache-control": "max-age=60"}, 60),
+            ({"cache-control": "max-age=60, s-maxage=600"}, 60),
+            ({"cache-control": "max-age=60", "expires": _date(NOW + 600)}, 60),
+            ({"cache-control": "no-cache, max-age=60"}, 0),
+            ({"cache-control": "private, max-age=60"}, 60),
+            ({"cache-control": "must-revalidate, max-age=60"}, 60),
+            ({"expires": _date(NOW + 600), "date": _date(NOW)}, 600),
+            # Expires is relative to Date, not to our clock
+            ({"expires": _date(NOW + 600), "date": _date(NOW - 3600)}, 4200),
+            ({"expires": _date(NOW + 600)}, 600),
+            ({"expires": "0"}, 0),
+            ({"expires": _date(NOW - 600), "date": _date(NOW)}, 0),
+            ({}, 0),
+        ],
+    )
+    def test_explicit(self, headers, lifetime):
+        freshness = _freshness(headers)
+        assert freshness.lifetime == lifetime
+        assert not freshness.heuristic
+
+    def test_stale_extensions(self):
+        freshness = _freshness(
+            {
+                "cache-control": "max-age=60, stale-while-revalidate=30, stale-if-error=600"
+            }
+        )
+        assert freshness.lifetime == 60
+        assert freshness.stale_while_revalidate == 30
+        assert freshness.stale_if_error == 600
+
+    def test_s_maxage_in_shared_cache(self):
+        headers = {"cache-control": "max-age=60, s-maxage=600"}
+        freshness = _freshness(headers, shared=True)
+        assert freshness.lifetime == 600
+        assert freshness.must_revalidate
+
+    @pytest.mark.parametrize(
+        "headers, status_code, lifetime",
+        [
+            ({"last-modified": _date(NOW - 10 * DAY)}, 200, DAY),
+            ({"last-modified": _date(NOW - 10 * DAY), "date": _date(NOW)}, 404, DAY),
+            ({"last-modified": _date(NOW - 1000 * DAY)}, 200, MAX_HEURISTIC_LIFETIME),
+            # Not heuristically cacheable, unless marked public
+            ({"last-modified": _date(NOW - 10 * DAY)}, 302, 0),
+            (
+                {"last-modified": _date(NOW - 10 * DAY), "cache-control": "public"},
+                302,
+                DAY,
+            ),
+        ],
+    )
+    def test_heuristic(self, headers, status_code, lifetime):
+        freshness = _freshness(headers, status_code)
+        assert freshness.lifetime == pytest.approx(lifetime)
+        assert freshness.heuristic == (lifetime > 0)
+
+
+class TestAge:
+    """Test the current age (ref RFC 9111 section 4.2.3)."""
+
+    @pytest.mark.parametrize(
+        "headers, initial_age",
+        [
+            # Only the response delay of one second
+            ({}, 1),
+            ({"age": "100"}, 101),
+            ({"date": _date(NOW - 30)}, 30),
+            ({"date": _date(NOW - 30), "age": "100"}, 101),
+            # A Date ahead of our clock does not make the age negative
+            ({"date": _date(NOW + 30)}, 1),
+            ({"age": "soon"}, 1),
+        ],
+    )
+    def test_initial_age(self, headers, initial_age):
+        assert _freshness(headers).initial_age == initial_age
+
+    def test_aging(self):
+        freshness = _freshness({"cache-control": "max-age=60", "age": "9"})
+        assert freshness.current_age(NOW) == 10
+        assert freshness.expires == NOW + 50
+        assert freshness.is_fresh(NOW + 49)
+        assert not freshness.is_fresh(NOW + 50)
+        assert freshness.remaining(NOW + 60) == -10
+
+
+class TestHttpDate:
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "Sun, 06 Nov 1994 08:49:37 GMT",
+            "Sunday, 06-Nov-94 08:49:37 GMT",
+            "Sun Nov  6 08:49:37 1994",
+        ],
+    )
+    def test_formats(self, value):
+        """Test the three formats recipients must accept."""
+        assert parse_http_date(value) == 784111777
+
+    @pytest.mark.parametrize("value", ["0", "-1", "", None, "yesterday"])
+    def test_invalid(self, value):
+        assert parse_http_date(value) is None
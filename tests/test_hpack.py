@@ -0,0 +1,118 @@
+import pytest
+
+from browser.protocols.http.hpack import (
+    HpackDecoder,
+    HpackEncoder,
+    HpackError,
+    huffman_decode,
+    huffman_encode,
+)
+
+# Requests of https://www.rfc-editor.org/rfc/rfc7541#appendix-C.3 and C.4,
+# sent on one connection
+REQUESTS = [
+    [
+        (":method", "GET"),
+        (":scheme", "http"),
+        (":path", "/"),
+        (":authority", "www.example.com"),
+    ],
+    [
+        (":method", "GET"),
+        (":scheme", "http"),
+        (":path", "/"),
+        (":authority", "www.example.com"),
+        ("cache-control", "no-cache"),
+    ],
+    [
+        (":method", "GET"),
+        (":scheme", "https"),
+        (":path", "/index.html"),
+        (":authority", "www.example.com"),
+        ("custom-key", "custom-value"),
+    ],
+]
+
+
+class TestHuffman:
+    """Test the Huffman code of HPACK."""
+
+    @pytest.mark.parametrize(
+        "text, encoded",
+        [
+            (b"www.example.com", "f1e3c2e5f23a6ba0ab90f4ff"),
+            (b"no-cache", "a8eb10649cbf"),
+            (b"custom-value", "25a849e95bb8e8b4bf"),
+            (
+                b"Mon, 21 Oct 2013 20:13:21 GMT",
+                "d07abe941054d444a8200595040b8166e082a62d1bff",
+            ),
+        ],
+    )
+    def test_rfc_examples(self, text, encoded):
+        """Test strings of RFC 7541 Appendix C."""
+        assert huffman_encode(text).hex() == encoded
+        assert huffman_decode(bytes.fromhex(encoded)) == text
+
+    def test_every_byte(self):
+        """Test every byte value survives encoding."""
+        data = bytes(range(256)) * 2
+        assert huffman_decode(huffman_encode(data)) == data
+
+    def test_invalid_padding(self):
+        """Test padding must be the most significant bits of EOS."""
+        with pytest.raises(HpackError):
+            huffman_decode(huffman_encode(b"a")[:-1] + b"\x00")
+
+
+class TestHpack:
+    """Test header block encoding and decoding."""
+
+    @pytest.mark.parametrize(
+        "blocks",
+        [
+            [
+                "828684410f7777772e6578616d706c652e636f6d",
+                "828684be58086e6f2d6361636865",
+                "828785bf400a637573746f6d2d6b65790c637573746f6d2d76616c7565",
+            ],
+            [
+                "828684418cf1e3c2e5f23a6ba0ab90f4ff",
+                "828684be5886a8eb10649cbf",
+                "828785bf408825a849e95ba97d7f8925a849e95bb8e8b4bf",
+            ],
+        ],
+        ids=["plain", "huffman"],
+    )
+    def test_rfc_requests(self, blocks):
+        """Test decoding the requests of RFC 7541 Appendix C.3 and C.4."""
+        decoder = HpackDecoder()
+        for block, headers in zip(blocks, REQUESTS):
+            assert decoder.decode(bytes.fromhex(block)) == headers
+
+    def test_round_trip(self):
+        """Test repeated fields are indexed and secrets are never indexed."""
+        encoder, decoder = HpackEncoder(), HpackDecoder()
+        headers = [*REQUESTS[2], ("cookie", "session=secret")]
+        first = encoder.encode(headers)
+        second = encoder.encode(headers)
+        assert decoder.decode(first) == headers
+        assert decoder.decode(second) == headers
+        # The cookie is never indexed (0x1f 0x11: static name 32), so it is
+        # the only field not sent as a single index the second time
+        cookie = first[first.index(bytes([0x1F, 0x11])) :]
+        assert second == bytes.fromhex("828785bfbe") + cookie
+
+    def test_resize(self):
+        """Test a smaller table size is signalled and applied."""
+        encoder, decoder = HpackEncoder(), HpackDecoder()
+        decoder.decode(encoder.encode(REQUESTS[2]))
+        encoder.resize(0)
+        block = encoder.encode(REQUESTS[2])
+        assert block[0] == 0x20
+        assert decoder.decode(block) == REQUESTS[2]
+
+    def test_invalid_index(self):
+        """Test indexes past the dynamic table are rejected."""
+        with pytest.raises(HpackError):
+            HpackDecoder().decode(bytes([0x80 | 62]))
@@ -0,0 +1,125 @@
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from browser.connection import (
+    Connection,
+    Http2Connection,
+    request_http,
+    request_http_pipelined,
+    request_http_stream,
+)
+from browser.tls import configure_tls
+from tests.h2_server import H2Server
+from tests.helpers import get_request, local_url
+
+
+def _echo_path(fields: dict[str, str]) -> tuple[int, list[tuple[str, str]], bytes]:
+    return 200, [("content-type", "text/plain")], fields[":path"].encode()
+
+
+@pytest.fixture
+def serve(tls_certificate):
+    """Factory of H2Server instances trusted by the shared SSLContext."""
+    certfile, keyfile = tls_certificate
+    configure_tls(partial(ssl.create_default_context, cafile=certfile))
+
+    def _serve(respond, **kwargs) -> H2Server:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        return H2Server(respond, context, **kwargs)
+
+    yield _serve
+    configure_tls(None)
+
+
+class TestHttp2Connection:
+    """Test HTTP/2 connections against a local server."""
+
+    def test_alpn_selects_http2(self, serve):
+        """Test the server picking h2 gives an Http2Connection."""
+        with serve(_echo_path) as server:
+            connection = Connection.open("https", "127.0.0.1", server.port)
+            assert isinstance(connection, Http2Connection)
+            response = connection.request(get_request("/a"))
+            connection.close()
+        assert response.version == "HTTP/2"
+        assert response.status_code == 200
+        assert response.status_message == "OK"
+        assert response.headers["content-type"] == "text/plain"
+        assert response.body == b"/a"
+
+    @pytest.mark.parametrize(
+        "alpn_protocols, http2",
+        [(("http/1.1",), None), (("h2", "http/1.1"), False)],
+        ids=["server without h2", "h2 disabled"],
+    )
+    def test_fallback_to_http1(self, serve, alpn_protocols, http2):
+        """Test HTTP/1.1 is used unless both sides want HTTP/2."""
+        with serve(_echo_path, alpn_protocols=alpn_protocols) as server:
+            connection = Connection.open("https", "127.0.0.1", server.port, http2=http2)
+            assert not isinstance(connection, Http2Connection)
+            response = connection.request(get_request("/a"))
+            connection.close()
+        assert response.version == "HTTP/1.1"
+        assert response.body == b"/a"
+
+    def test_concurrent_requests_share_connection(self, serve):
+        """Test requests from many threads are multiplexed on one connection."""
+        with serve(_echo_path, delay=0.05) as server:
+            paths = [f"/{i}" for i in range(32)]
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                bodies = list(
+                    executor.map(
+                        lambda path: (
+                            request_http(
+                                local_url(server.port, path, scheme="https"),
+                                get_request(path),
+                            ).body
+                        ),
+                        paths,
+                    )
+                )
+        assert bodies == [path.encode() for path in paths]
+        assert server.connections == 1
+        assert server.peak_streams > 1
+
+    def test_body_larger_than_window(self, serve):
+        """Test the receive window is given back while a large body arrives."""
+        body = bytes(range(256)) * (24 * 1024)
+        with serve(lambda _: (200, [], body)) as server:
+            connection = Connection.open("https", "127.0.0.1", server.port)
+            assert connection.request(get_request()).body == body
+            with connection.request_stream(get_request()).body as stream:
+                assert b"".join(stream) == body
+            connection.close()
+
+    def test_cancelled_stream(self, serve):
+        """Test closing a body early leaves the connection usable."""
+        body = b"x" * (8 * 1024 * 1024)
+        with serve(
+            lambda fields: (200, [], body if fields[":path"] == "/big" else b"ok")
+        ) as server:
+            url = local_url(server.port, scheme="https")
+            response = request_http_stream(
+                local_url(server.port, "/big", scheme="https"), get_request("/big")
+            )
+            assert len(response.body.read(1024)) == 1024
+            response.body.close()
+            assert request_http(url, get_request()).body == b"ok"
+        assert server.connections == 1
+
+    def test_pipelined_beyond_stream_limit(self, serve):
+        """Test requests past the server's stream limit wait for a free stream."""
+        with serve(_echo_path, delay=0.02, max_concurrent_streams=2) as server:
+            paths = [f"/{i}" for i in range(7)]
+            responses = request_http_pipelined(
+                local_url(server.port, scheme="https"),
+                [get_request(path) for path in paths],
+            )
+        assert [response.body for response in responses] == [
+            path.encode() for path in paths
+        ]
+        assert server.peak_streams == 2
@@ -0,0 +1,244 @@
+import pytest
+
+from browser.protocols.http.body import BodyBuffer
+from browser.protocols.http.parser import (
+    BodyChunk,
+    EndOfMessage,
+    Headers,
+    HttpParseError,
+    HttpResponseParser,
+    ResponseEvent,
+    StatusLine,
+)
+
+
+def _feed_all(
+    parser: HttpResponseParser, raw: bytes, step: int | None = None
+) -> list[ResponseEvent]:
+    step = step or len(raw) or 1
+    events: list[ResponseEvent] = []
+    for i in range(0, len(raw), step):
+        events += parser.feed(raw[i : i + step])
+    return events
+
+
+def _body(events: list[ResponseEvent]) -> bytes:
+    return b"".join(event.data for event in events if isinstance(event, BodyChunk))
+
+
+CHUNKED = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Transfer-Encoding: chunked\r\n"
+    b"\r\n"
+    b"4\r\n pad\r\n"
+    b"3;name=value\r\nded\r\n"
+    b"2\r\n \n\r\n"
+    b"0\r\n"
+    b"\r\n"
+)
+
+
+class TestHttpResponseParser:
+    """Test the sans-IO HTTP/1.1 response parser."""
+
+    @pytest.mark.parametrize("step", [1, 2, 7, None])
+    def test_content_length(self, step):
+        """Test a Content-Length body fed in slices of any size."""
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\nX-A: b\r\n\r\nhello"
+        parser = HttpResponseParser()
+        events = _feed_all(parser, raw, step)
+
+        assert events[0] == StatusLine("HTTP/1.1", 200, "OK")
+        assert events[1] == Headers({"content-length": "5", "x-a": "b"})
+        assert _body(events) == b"hello"
+        assert events[-1] == EndOfMessage()
+        assert parser.is_complete
+
+    @pytest.mark.parametrize("step", [1, 3, None])
+    def test_chunked_preserves_whitespace(self, step):
+        """Test chunk data is kept byte for byte, including whitespace."""
+        events = _feed_all(HttpResponseParser(), CHUNKED, step)
+        assert _body(events) == b" padded \n"
+        assert events[-1] == EndOfMessage()
+
+    def test_small_chunks_are_batched(self):
+        """Test small chunks that arrive together become one body chunk."""
+        chunks = [b"%d" % i for i in range(100)] + [b"x" * 2000, b"end"]
+        raw = (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + b"".join(b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks)
+            + b"0\r\n\r\n"
+        )
+        events = HttpResponseParser().feed(raw)
+        body = [event.data for event in events if isinstance(event, BodyChunk)]
+        assert body == [b"".join(chunks[:100]), chunks[100], chunks[101]]
+        assert events[-1] == EndOfMessage()
+
+    def test_body_until_eof(self):
+        """Test a body without framing ends when the peer closes."""
+        parser = HttpResponseParser()
+        events = parser.feed(b"HTTP/1.0 200 OK\r\n\r\nsome body")
+        assert EndOfMessage() not in events
+        events += parser.feed_eof()
+        assert _body(events) == b"some body"
+        assert parser.framing is None
+
+    def test_eof_in_the_middle_of_body(self):
+        """Test a truncated response is an error."""
+        parser = HttpResponseParser()
+        parser.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nshort")
+        with pytest.raises(HttpParseError):
+            parser.feed_eof()
+
+    def test_no_body_responses(self):
+        """Test HEAD, 204 and 304 responses end after the head."""
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n"
+        assert HttpResponseParser("HEAD").feed(raw)[-1] == EndOfMessage()
+        raw = b"HTTP/1.1 304 Not Modified\r\nContent-Length: 5\r\n\r\n"
+        assert HttpResponseParser().feed(raw)[-1] == EndOfMessage()
+
+    def test_skips_interim_responses(self):
+        """Test 1xx responses are not reported."""
+        raw = (
+            b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+        )
+        events = HttpResponseParser().feed(raw)
+        assert events[0] == StatusLine("HTTP/1.1", 200, "OK")
+
+    def test_repeated_headers_are_combined(self):
+        """Test repeated header fields are joined with a comma."""
+        raw = b"HTTP/1.1 200 OK\r\nVary: a\r\nvary: b\r\nContent-Length: 0\r\n\r\n"
+        assert HttpResponseParser().feed(raw)[1] == Headers(
+            {"vary": "a, b", "content-length": "0"}
+        )
+
+    def test_keeps_bytes_of_the_next_response(self):
+        """Test bytes past the end of a response are parsed after start()."""
+        first = b"HTTP/1.1 200 OK\r\nContent-Length: 1\r\n\r\na"
+        second = b"HTTP/1.1 404 Not Found\r\nContent-Length: 1\r\n\r\nb"
+        parser = HttpResponseParser()
+        assert _body(parser.feed(first + second[:10])) == b"a"
+
+        parser.start()
+        events = parser.feed(second[10:])
+        assert events[0] == StatusLine("HTTP/1.1", 404, "Not Found")
+        assert _body(events) == b"b"
+
+    def test_start_before_end_of_message(self):
+        """Test start() refuses to drop an incomplete response."""
+        parser = HttpResponseParser()
+        parser.feed(b"HTTP/1.1 200 OK\r\n")
+        with pytest.raises(HttpParseError):
+            parser.start()
+
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            b"garbage\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nno colon\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n1\r\nabc\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: abc\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: -3\r\n\r\nabc",
+            b"HTTP/1.1 200 OK\r\nContent-Length: 5, 6\r\n\r\nabcde",
+            b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\nContent-Length: 6\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: \r\n\r\n",
+        ],
+    )
+    def test_malformed(self, raw):
+        """Test malformed responses raise HttpParseError."""
+        with pytest.raises(HttpParseError):
+            HttpResponseParser().feed(raw)
+
+    @pytest.mark.parametrize(
+        "content_length",
+        [b"Content-Length: 5, 5", b"Content-Length: 5\r\nContent-Length: 5"],
+    )
+    def test_repeated_content_length(self, content_length):
+        """Test repeated identical Content-Length values are collapsed."""
+        raw = b"HTTP/1.1 200 OK\r\n" + content_length + b"\r\n\r\nabcdeNEXT"
+        parser = HttpResponseParser()
+        events = parser.feed(raw)
+        assert _body(events) == b"abcde"
+        assert isinstance(events[-1], EndOfMessage)
+
+    def test_transfer_coding_case_insensitive(self):
+        """Test the chunked transfer coding is recognised in any case."""
+        raw = CHUNKED.replace(b"chunked", b"Chunked")
+        events = _feed_all(HttpResponseParser(), raw)
+        assert _body(events) == b" padded \n"
+
+    def test_head_too_large(self):
+        """Test an endless head is rejected."""
+        parser = HttpResponseParser(max_head_size=100)
+        with pytest.raises(HttpParseError):
+            parser.feed(b"HTTP/1.1 200 OK\r\n" + b"X: y\r\n" * 100)
+
+    def test_chunk_size_line_too_long(self):
+        """Test a chunk-size line without an end is rejected as it arrives."""
+        parser = HttpResponseParser(max_head_size=100)
+        parser.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+        parser.feed(b"f" * 60)
+        with pytest.raises(HttpParseError, match="Chunk size line"):
+            parser.feed(b"f" * 60)
+
+    def test_trailer_section_too_large(self):
+        """Test trailer fields are bounded in total, not only per line."""
+        parser = HttpResponseParser(max_head_size=100)
+        parser.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n0\r\n")
+        parser.feed(b"X-A: b\r\n" * 10)
+        with pytest.raises(HttpParseError, match="Trailer section"):
+            parser.feed(b"X-A: b\r\n" * 10)
+
+    def test_unterminated_line_is_searched_once(self):
+        """Test each feed only searches the bytes that are new."""
+        parser = HttpResponseParser(max_head_size=1 << 30)
+        parser.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for _ in range(1024):
+            parser.feed(b"f" * 1024)
+        assert parser._scanned == 1024 * 1024
+
+    def test_trailers(self):
+        """Test trailer fields after a chunked body are reported."""
+        raw = CHUNKED.removesuffix(b"\r\n") + b"Digest: abc\r\nX-A: 1\r\n\r\n"
+        events = _feed_all(HttpResponseParser(), raw, 5)
+        assert events[-1] == EndOfMessage({"digest": "abc", "x-a": "1"})
+
+    def test_direct_body(self):
+        """Test body bytes received outside the parser are accounted for."""
+        parser = HttpResponseParser()
+        parser.feed(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nab")
+        # "ab" went through feed, the rest of the chunk may bypass the parser
+        assert parser.direct_body_size() == 3
+        assert parser.consume_body(3) == []
+        assert parser.direct_body_size() == 0
+        assert parser.feed(b"\r\n0\r\n\r\n") == [EndOfMessage()]
+
+    def test_direct_body_does_not_overrun(self):
+        """Test consume_body refuses more bytes than the body has."""
+        parser = HttpResponseParser()
+        parser.feed(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n")
+        with pytest.raises(HttpParseError):
+            parser.consume_body(3)
+        assert parser.consume_body(2) == [EndOfMessage()]
+
+
+class TestBodyBuffer:
+    """Test the growable body buffer."""
+
+    def test_reserve_and_commit(self):
+        """Test bytes written into reserved space become the body."""
+        buffer = BodyBuffer()
+        for part in (b"abc", b"", b"defgh"):
+            with buffer.reserve(len(part)) as view:
+                view[:] = part
+            buffer.commit(len(part))
+        buffer.extend(memoryview(b"ij"))
+        assert buffer.getvalue() == b"abcdefghij"
+        assert len(buffer) == 10
+
+    def test_commit_beyond_reserved(self):
+        """Test committing unreserved bytes is an error."""
+        buffer = BodyBuffer(4)
+        with pytest.raises(ValueError):
+            buffer.commit(5)
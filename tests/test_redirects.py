@@ -0,0 +1,230 @@
+import pytest
+
+from browser.cache import CacheStatus, MemoryCache, navigation_cache
+from browser.content import PlainTextContent
+from browser.content_fetcher import fetch_content
+from browser.handler import RedirectInfo
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.handler import HttpHandler
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.hsts import (
+    HstsStore,
+    StrictTransportSecurity,
+    parse_strict_transport_security,
+)
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.redirect_cache import RedirectCache
+from browser.url import Url
+from tests.helpers import http_family_url
+
+NOW = 1_000_000.0
+
+
+def _redirect(status_code: int, **headers: str) -> HttpResponse:
+    return HttpResponse(
+        version="HTTP/1.1",
+        status_code=status_code,
+        status_message="Redirect",
+        headers=HeaderMap({"location": "https://example.com/", **headers}),
+        body=b"",
+        request=HttpRequest(method="GET", path="/", headers={}),
+    )
+
+
+class TestParseStrictTransportSecurity:
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("max-age=31536000", StrictTransportSecurity(31536000)),
+            (
+                'Max-Age="60"; includeSubDomains',
+                StrictTransportSecurity(60, include_subdomains=True),
+            ),
+            ("max-age=0; preload", StrictTransportSecurity(0)),
+            ("includeSubDomains", None),
+            ("max-age=soon", None),
+            ("max-age=1; max-age=2", None),
+        ],
+    )
+    def test_values(self, value, expected):
+        assert parse_strict_transport_security(value) == expected
+
+
+class TestHstsStore:
+    def test_known_hosts(self):
+        now = NOW
+        store = HstsStore(clock=lambda: now)
+        store.update("Example.com", "max-age=60; includeSubDomains")
+        store.update("other.test", "max-age=60")
+        assert store.is_known("example.com")
+        assert store.is_known("www.EXAMPLE.com")
+        assert store.is_known("other.test")
+        assert not store.is_known("www.other.test")
+        now += 60
+        assert not store.is_known("example.com")
+
+    def test_forget(self):
+        store = HstsStore()
+        store.update("example.com", "max-age=60")
+        store.update("example.com", "max-age=0")
+        assert not store.is_known("example.com")
+
+    def test_ip_literals_ignored(self):
+        store = HstsStore()
+        store.update("127.0.0.1", "max-age=60")
+        store.update("[::1]", "max-age=60")
+        assert not store.is_known("127.0.0.1")
+        assert not store.is_known("[::1]")
+
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            ("http://example.com/a?b", "https://example.com/a?b"),
+            ("http://example.com:80/", "https://example.com/"),
+            ("http://example.com:8080/", "https://example.com:8080/"),
+            ("https://example.com/", None),
+            ("http://example.org/", None),
+        ],
+    )
+    def test_upgrade(self, url, expected):
+        store = HstsStore()
+        store.update("example.com", "max-age=60")
+        upgraded = store.upgrade(http_family_url(url))
+        assert upgraded == (None if expected is None else http_family_url(expected))
+
+
+class TestRedirectCache:
+    FRESHNESS = Freshness(lifetime=60, initial_age=0, response_time=NOW)
+
+    def _remember(self, response: HttpResponse, now: float = NOW) -> RedirectCache:
+        cache = RedirectCache(clock=lambda: now)
+        cache.remember(
+            http_family_url("http://example.com/#top"),
+            response,
+            "https://example.com/",
+            self.FRESHNESS,
+        )
+        return cache
+
+    def test_permanent(self):
+        cache = self._remember(_redirect(301), now=NOW + 10**9)
+        assert (
+            cache.get(http_family_url("http://example.com/")) == "https://example.com/"
+        )
+        assert self._remember(_redirect(308)).get(
+            http_family_url("http://example.com/")
+        )
+        assert cache.stats().hits == 1
+
+    def test_explicit_freshness(self):
+        cache = self._remember(_redirect(301, **{"cache-control": "max-age=60"}))
+        assert cache.get(http_family_url("http://example.com/"))
+        cache = self._remember(
+            _redirect(301, **{"cache-control": "max-age=60"}), now=NOW + 60
+        )
+        assert cache.get(http_family_url("http://example.com/")) is None
+        cache = self._remember(_redirect(308, **{"cache-control": "no-cache"}))
+        assert cache.get(http_family_url("http://example.com/")) is None
+
+    @pytest.mark.parametrize("status_code", [302, 307])
+    def test_temporary(self, status_code):
+        assert self._remember(_redirect(status_code)).stats().entries == 0
+        cache = self._remember(
+            _redirect(status_code, expires="Thu, 01 Jan 2099 00:00:00 GMT")
+        )
+        assert cache.get(http_family_url("http://example.com/"))
+
+    def test_other_status(self):
+        assert self._remember(_redirect(303)).stats().entries == 0
+
+    def test_expiry(self):
+        now = NOW
+        cache = RedirectCache(clock=lambda: now)
+        cache.remember(
+            http_family_url("http://example.com/"),
+            _redirect(307, **{"cache-control": "max-age=60"}),
+            "https://example.com/",
+            self.FRESHNESS,
+        )
+        assert cache.get(http_family_url("http://example.com/"))
+        now += 60
+        assert cache.get(http_family_url("http://example.com/")) is None
+        assert cache.stats().entries == 0
+
+
+class TestHttpHandler:
+    def test_remembered_redirect(self, http_server):
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head.split(b" ")[1])
+            if head.startswith(b"GET /old "):
+                return (
+                    b"HTTP/1.1 301 Moved Permanently\r\nLocation: /new\r\n"
+                    b"Content-Length: 0\r\n\r\n"
+                )
+            return (
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+                b"Content-Length: 3\r\n\r\nnew"
+            )
+
+        redirects = RedirectCache()
+        handler = HttpHandler(cache=MemoryCache(), redirects=redirects)
+        with http_server(respond) as port:
+            old = Url.parse(f"http://127.0.0.1:{port}/old")
+            for _ in range(2):
+                redirect = handler.fetch(old)
+                assert isinstance(redirect, RedirectInfo)
+                assert handler.fetch(redirect.url) == PlainTextContent("new")
+        assert requests == [b"/old", b"/new", b"/new"]
+        assert redirects.stats().hits == 1
+
+    @pytest.mark.parametrize("cache_control", ["no-cache", "max-age=0"])
+    def test_reload_skips_remembered_redirect(self, http_server, cache_control):
+        requests = []
+
+        def respond(head: bytes) -> bytes:
+            requests.append(head.split(b" ")[1])
+            return (
+                b"HTTP/1.1 301 Moved Permanently\r\nLocation: /new\r\n"
+                b"Content-Length: 0\r\n\r\n"
+            )
+
+        handler = HttpHandler(cache=MemoryCache(), redirects=RedirectCache())
+        with http_server(respond) as port:
+            old = Url.parse(f"http://127.0.0.1:{port}/old")
+            with navigation_cache() as visit:
+                assert isinstance(handler.fetch(old), RedirectInfo)
+                assert isinstance(handler.fetch(old), RedirectInfo)
+            with navigation_cache(cache_control) as reload:
+                assert isinstance(handler.fetch(old), RedirectInfo)
+        assert requests == [b"/old", b"/old"]
+        assert [lookup.status for lookup in visit.lookups] == [
+            CacheStatus.MISS,
+            CacheStatus.REMEMBERED_REDIRECT,
+        ]
+        assert [lookup.status for lookup in reload.lookups] == [CacheStatus.MISS]
+
+    def test_hsts_upgrade(self):
+        hsts = HstsStore()
+        hsts.update("example.test", "max-age=60")
+        handler = HttpHandler(hsts=hsts)
+        # Answered without a connection, which could not be made
+        assert handler.fetch(Url.parse("http://example.test/page?q")) == RedirectInfo(
+            url=Url.parse("https://example.test/page?q")
+        )
+
+    def test_redirect_loop(self, http_server):
+        def respond(head: bytes) -> bytes:
+            target = b"/b" if head.startswith(b"GET /a ") else b"/a"
+            return (
+                b"HTTP/1.1 302 Found\r\nLocation: %s\r\nContent-Length: 0\r\n\r\n"
+                % target
+            )
+
+        with (
+            http_server(respond) as port,
+            pytest.raises(ValueError, match="Redirect loop"),
+        ):
+            fetch_content(f"http://127.0.0.1:{port}/a")
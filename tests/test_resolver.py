@@ -0,0 +1,147 @@
+import contextlib
+import socket
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from browser.connection import Connection, Timeouts
+from browser.resolver import (
+    CachingResolver,
+    ResolvedAddress,
+    interleave_addresses,
+    race_connect,
+)
+from tests.helpers import get_request
+
+V4 = socket.AF_INET
+V6 = socket.AF_INET6
+
+
+class StubResolver:
+    def __init__(self, addresses: list[ResolvedAddress]) -> None:
+        self.addresses = addresses
+        self.calls = 0
+
+    def resolve(self, host: str, port: int) -> list[ResolvedAddress]:
+        self.calls += 1
+        return self.addresses
+
+
+@contextlib.contextmanager
+def _unresponsive(family: socket.AddressFamily) -> Iterator[ResolvedAddress]:
+    """
+    Address whose connection attempts hang: its listen queue is already
+    full, so the kernel ignores new SYNs.
+    """
+    host = "::1" if family == V6 else "127.0.0.1"
+    with socket.socket(family) as listener:
+        listener.bind((host, 0))
+        listener.listen(0)
+        filler = socket.socket(family)
+        filler.connect(listener.getsockname())
+        try:
+            yield ResolvedAddress(family, listener.getsockname())
+        finally:
+            filler.close()
+
+
+def _refused(family: socket.AddressFamily) -> ResolvedAddress:
+    host = "::1" if family == V6 else "127.0.0.1"
+    with socket.socket(family) as sock:
+        sock.bind((host, 0))
+        return ResolvedAddress(family, sock.getsockname())
+
+
+class TestResolver:
+    """Test resolving and caching addresses."""
+
+    def test_cache_ttl(self):
+        """Test cached addresses are reused until their TTL passes."""
+        now = [0.0]
+        stub = StubResolver([ResolvedAddress(V4, ("127.0.0.1", 80))])
+        resolver = CachingResolver(stub, ttl=60, clock=lambda: now[0])
+        for _ in range(3):
+            assert resolver.resolve("example.com", 80) == stub.addresses
+        assert stub.calls == 1
+        now[0] = 60
+        resolver.resolve("example.com", 80)
+        assert stub.calls == 2
+
+    def test_interleave(self):
+        """Test families alternate, starting with the preferred one."""
+        a6, b6, c6 = (ResolvedAddress(V6, (f"::{i}", 80, 0, 0)) for i in (1, 2, 3))
+        a4, b4 = (ResolvedAddress(V4, (f"10.0.0.{i}", 80)) for i in (1, 2))
+        assert interleave_addresses([a6, b6, c6, a4, b4, a6]) == [a6, a4, b6, b4, c6]
+
+
+class TestRaceConnect:
+    """Test racing connection attempts over loopback addresses."""
+
+    def test_slow_address_is_raced(self, http_server):
+        """Test the next address is tried while a preferred one hangs."""
+        with (
+            http_server(lambda _: b"") as port,
+            _unresponsive(V6) as hanging,
+        ):
+            start = time.monotonic()
+            sock = race_connect(
+                [hanging, ResolvedAddress(V4, ("127.0.0.1", port))],
+                timeout=5,
+                attempt_delay=0.05,
+            )
+            elapsed = time.monotonic() - start
+            assert sock.getpeername() == ("127.0.0.1", port)
+            assert sock.getblocking()
+            sock.close()
+        assert elapsed < 1
+
+    def test_refused_address_is_skipped(self, http_server):
+        """Test a failed attempt starts the next one without waiting."""
+        with http_server(lambda _: b"") as port:
+            start = time.monotonic()
+            sock = race_connect(
+                [_refused(V6), ResolvedAddress(V4, ("127.0.0.1", port))],
+                attempt_delay=10,
+            )
+            sock.close()
+        assert time.monotonic() - start < 1
+
+    def test_all_refused(self):
+        """Test the error of the last attempt is raised."""
+        with pytest.raises(ConnectionRefusedError):
+            race_connect([_refused(V6), _refused(V4)])
+
+    def test_timeout(self):
+        """Test the connect deadline."""
+        with _unresponsive(V4) as hanging, pytest.raises(TimeoutError):
+            race_connect([hanging], timeout=0.1)
+
+
+class TestConnectionOpen:
+    """Test Connection.open with a stub resolver."""
+
+    def test_stub_resolver(self, http_server):
+        """Test names are resolved through the given resolver."""
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+        with http_server(lambda _: raw) as port:
+            resolver = StubResolver([ResolvedAddress(V4, ("127.0.0.1", port))])
+            connection = Connection.open("http", "localhost", port, resolver=resolver)
+            assert connection.request(get_request(host="localhost")).body == b"ok"
+            connection.close()
+        assert resolver.calls == 1
+
+    def test_read_timeout(self, http_server):
+        """Test waiting for a response is bounded by the read timeout."""
+        with http_server(lambda _: b"HTTP/1.1 200 OK\r\n") as port:
+            resolver = StubResolver([ResolvedAddress(V4, ("127.0.0.1", port))])
+            connection = Connection.open(
+                "http",
+                "localhost",
+                port,
+                resolver=resolver,
+                timeouts=Timeouts(connect=1, read=0.1),
+            )
+            with pytest.raises(TimeoutError):
+                connection.request(get_request(host="localhost"))
+            connection.close()
@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+
+from browser.content import PlainTextContent
+from browser.content_fetcher import schedule_fetch
+from browser.scheduler import FetchScheduler, Priority
+from browser.url import Url
+
+
+class _Gate:
+    """A fetch function recording the order of fetches, held until opened."""
+
+    def __init__(self) -> None:
+        self.started = list[str]()
+        self.opened = threading.Event()
+        self._condition = threading.Condition()
+
+    def fetch(self, url: Url) -> str:
+        with self._condition:
+            self.started.append(str(url.path))
+            self._condition.notify_all()
+        if url.path == "/fail":
+            raise OSError("unreachable")
+        assert self.opened.wait(5)
+        return f"content of {url.path}"
+
+    def wait_started(self, count: int) -> None:
+        with self._condition:
+            assert self._condition.wait_for(lambda: len(self.started) >= count, 5)
+
+
+def _url(path: str, host: str = "example.com") -> Url:
+    return Url(scheme="http", host=host, path=path)
+
+
+class TestFetchScheduler:
+    def test_priority_order(self):
+        gate = _Gate()
+        scheduler = FetchScheduler(gate.fetch, max_per_host=1, max_total=1)
+        # Occupies the only slot while the others queue
+        first = scheduler.submit(_url("/page"))
+        gate.wait_started(1)
+        scheduled = [
+            scheduler.submit(_url("/prefetch"), Priority.PREFETCH),
+            scheduler.submit(_url("/image"), Priority.IMAGE),
+            scheduler.submit(_url("/script"), Priority.SCRIPT),
+            scheduler.submit(_url("/style.css"), Priority.STYLESHEET),
+            scheduler.submit(_url("/frame"), Priority.DOCUMENT),
+            scheduler.submit(_url("/image2"), Priority.IMAGE),
+        ]
+        gate.opened.set()
+        assert scheduled[0].result(5) == "content of /prefetch"
+        assert first.result(5) == "content of /page"
+        assert gate.started == [
+            "/page",
+            "/frame",
+            "/style.css",
+            "/script",
+            "/image",
+            "/image2",
+            "/prefetch",
+        ]
+        scheduler.shutdown()
+
+    def test_limits(self):
+        gate = _Gate()
+        scheduler = FetchScheduler(gate.fetch, max_per_host=2, max_total=3)
+        for i in range(4):
+            scheduler.submit(_url(f"/a{i}", host="a.example"))
+        scheduler.submit(_url("/b0", host="b.example"), Priority.PREFETCH)
+        scheduler.submit(_url("/b1", host="b.example"), Priority.PREFETCH)
+        gate.wait_started(3)
+        # a.example is at its limit, so b.example takes the last slot
+        assert sorted(gate.started) == ["/a0", "/a1", "/b0"]
+        assert scheduler.stats().running == 3
+        assert scheduler.stats().queued == 3
+        gate.opened.set()
+        scheduler.shutdown()
+        assert scheduler.stats().completed == 6
+
+    def test_reprioritize_and_cancel(self):
+        gate = _Gate()
+        scheduler = FetchScheduler(gate.fetch, max_per_host=1, max_total=1)
+        running = scheduler.submit(_url("/page"))
+        gate.wait_started(1)
+        image = scheduler.submit(_url("/image"), Priority.IMAGE)
+        prefetch = scheduler.submit(_url("/prefetch"), Priority.PREFETCH)
+        dropped = scheduler.submit(_url("/dropped"), Priority.DOCUMENT)
+
+        # Scrolled into view
+        assert prefetch.reprioritize(Priority.DOCUMENT)
+        assert dropped.cancel()
+        assert not running.cancel()
+        assert not running.reprioritize(Priority.PREFETCH)
+        gate.opened.set()
+        scheduler.shutdown()
+
+        assert gate.started == ["/page", "/prefetch", "/image"]
+        assert dropped.future.cancelled()
+        assert not dropped.cancel()
+        assert not image.reprioritize(Priority.DOCUMENT)
+        stats = scheduler.stats()
+        assert (stats.cancelled, stats.reprioritized, stats.completed) == (1, 1, 3)
+
+    def test_cancelled_future(self):
+        gate = _Gate()
+        scheduler = FetchScheduler(gate.fetch, max_per_host=1, max_total=1)
+        scheduler.submit(_url("/page"))
+        gate.wait_started(1)
+        queued = scheduler.submit(_url("/image"), Priority.IMAGE)
+        assert queued.future.cancel()
+        gate.opened.set()
+        scheduler.shutdown()
+        assert gate.started == ["/page"]
+        assert scheduler.stats().cancelled == 1
+
+    def test_exception(self):
+        gate = _Gate()
+        scheduler = FetchScheduler(gate.fetch)
+        with pytest.raises(OSError, match="unreachable"):
+            scheduler.submit(_url("/fail")).result(5)
+        # The slot is freed
+        gate.opened.set()
+        assert scheduler.submit(_url("/page")).result(5) == "content of /page"
+        scheduler.shutdown()
+        assert scheduler.stats().running == 0
+
+    def test_shutdown(self):
+        gate = _Gate()
+        scheduler = FetchScheduler(gate.fetch, max_per_host=1, max_total=1)
+        scheduler.submit(_url("/page"))
+        gate.wait_started(1)
+        queued = scheduler.submit(_url("/image"), Priority.IMAGE)
+        scheduler.shutdown(wait=False, cancel_queued=True)
+        with pytest.raises(RuntimeError):
+            scheduler.submit(_url("/late"))
+        gate.opened.set()
+        scheduler.shutdown()
+        assert queued.future.cancelled()
+        assert gate.started == ["/page"]
+
+    def test_limits_checked(self):
+        with pytest.raises(ValueError):
+            FetchScheduler(str, max_per_host=4, max_total=2)
+
+
+def test_schedule_fetch():
+    scheduled = [
+        schedule_fetch("data:text/plain,second", Priority.IMAGE),
+        schedule_fetch("data:text/plain,first"),
+    ]
+    assert [fetch.result(5) for fetch in scheduled] == [
+        PlainTextContent("second"),
+        PlainTextContent("first"),
+    ]
@@ -0,0 +1,173 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from browser.cache import MemoryCache, ShardedMemoryCache
+from browser.connection import connection_pool_stats, request_http
+from browser.content import HtmlContent
+from browser.protocols.http.freshness import Freshness
+from browser.protocols.http.header_map import HeaderMap
+from browser.protocols.http.request import HttpRequest
+from browser.protocols.http.response import HttpResponse
+from browser.renderer import _render_html_to_text, render_cache
+from browser.sharded import ShardedMap
+from tests.helpers import example_url, local_url
+
+# Enough threads to overlap on every shard, whether or not the GIL is enabled
+# (sys._is_gil_enabled() is False on a free-threaded build)
+THREADS = 16
+ROUNDS = 2000
+FRESH = Freshness(lifetime=3600, initial_age=0, response_time=10**10)
+
+
+def _response(body: bytes) -> HttpResponse:
+    return HttpResponse(
+        version="HTTP/1.1",
+        status_code=200,
+        status_message="OK",
+        headers=HeaderMap({"cache-control": "max-age=3600"}),
+        body=body,
+        request=HttpRequest(method="GET", path="/", headers={}),
+    )
+
+
+def _hammer(work, threads: int = THREADS) -> None:
+    """Run `work(thread)` on every thread of a pool, all starting at once."""
+    start = threading.Barrier(threads)
+
+    def run(thread: int) -> None:
+        start.wait()
+        work(thread)
+
+    with ThreadPoolExecutor(threads) as pool:
+        # Raises what a worker raised
+        list(pool.map(run, range(threads)))
+
+
+class TestShardedMap:
+    def test_get_or_compute(self):
+        values = ShardedMap[str, int]()
+        assert values.get_or_compute("a", lambda: 1) == 1
+        assert values.get_or_compute("a", lambda: 2) == 1
+        assert values.get("a") == 1
+        assert "b" not in values
+
+    def test_bounded(self):
+        values = ShardedMap[int, int](max_entries=4, shards=1)
+        for key in range(4):
+            values.set(key, key)
+        values.get(0)
+        values.set(4, 4)
+        assert 1 not in values
+        assert len(values) == 4
+
+    def test_shards(self):
+        with pytest.raises(ValueError):
+            ShardedMap(shards=0)
+
+    def test_concurrent_compute(self):
+        """Test every thread gets the value stored first."""
+        values = ShardedMap[int, object]()
+        seen = [set[int]() for _ in range(64)]
+
+        def work(_: int) -> None:
+            for i in range(ROUNDS):
+                key = i % 64
+                seen[key].add(id(values.get_or_compute(key, object)))
+
+        _hammer(work)
+        assert len(values) == 64
+        assert all(len(ids) == 1 for ids in seen)
+
+
+class TestShardedMemoryCache:
+    def test_budgets_split(self):
+        cache = ShardedMemoryCache(max_bytes=800, shards=4)
+        stats = cache.stats()
+        assert (stats.max_bytes, stats.entries) == (800, 0)
+
+    def test_round_trip(self):
+        cache = ShardedMemoryCache()
+        for path in "abcdef":
+            cache.set(example_url(path), _response(path.encode()), FRESH)
+        assert all(
+            cache.get(example_url(path)).body == path.encode()  # type: ignore[union-attr]
+            for path in "abcdef"
+        )
+        assert cache.stats().entries == 6
+        assert cache.stats().hits == 6
+
+    @pytest.mark.parametrize("cache_type", [MemoryCache, ShardedMemoryCache])
+    def test_concurrent_use(self, cache_type):
+        """Test threads storing, reading and sweeping the same URLs."""
+        cache = cache_type(max_bytes=64 * 1024)
+        urls = [example_url(str(i)) for i in range(256)]
+
+        def work(thread: int) -> None:
+            for i in range(ROUNDS):
+                url = urls[(i * 7 + thread) % len(urls)]
+                if i % 3 == 0:
+                    body = url.path.encode() * (i % 50 + 1)
+                    cache.set(url, _response(body), FRESH)
+                elif (entry := cache.lookup(url)) is not None:
+                    # Never the body of another URL
+                    assert set(entry.response.body) <= set(url.path.encode())
+                if i % 500 == 0:
+                    cache.sweep()
+
+        _hammer(work)
+        stats = cache.stats()
+        assert stats.bytes <= 64 * 1024
+        lookups = sum(i % 3 != 0 for i in range(ROUNDS))
+        assert stats.hits + stats.misses == THREADS * lookups
+        assert stats.entries == sum(cache.lookup(url) is not None for url in urls)
+
+
+class TestSharedState:
+    def test_concurrent_render(self):
+        render_cache.clear()
+        documents = [HtmlContent(b"<p>%d &lt;3</p>" % i) for i in range(100)]
+
+        def work(thread: int) -> None:
+            for i in range(ROUNDS // 4):
+                document = documents[(i + thread) % len(documents)]
+                text = _render_html_to_text(document)
+                assert text == re.sub(r"<p>|</p>", "", document.data.decode()).replace(
+                    "&lt;", "<"
+                )
+
+        _hammer(work)
+        assert len(render_cache) == len(documents)
+
+    def test_concurrent_requests(self, http_server):
+        """Test threads sharing pooled connections to one origin."""
+
+        def respond(head: bytes) -> bytes:
+            path = head.split(b" ")[1]
+            return b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (
+                len(path),
+                path,
+            )
+
+        before = connection_pool_stats()
+        with http_server(respond) as port:
+            url = local_url(port)
+
+            def work(thread: int) -> None:
+                for i in range(20):
+                    path = f"/{thread}/{i}"
+                    request = HttpRequest(
+                        method="GET",
+                        path=path,
+                        headers={"Host": "127.0.0.1", "Connection": "keep-alive"},
+                        version="1.1",
+                    )
+                    assert request_http(url, request).body == path.encode()
+
+            _hammer(work)
+        stats = connection_pool_stats()
+        assert stats.hits + stats.misses - before.hits - before.misses == THREADS * 20
+        # The pool caps connections per origin, and reuses them
+        assert stats.misses - before.misses < THREADS * 20
@@ -0,0 +1,112 @@
+import gzip
+import tempfile
+
+import pytest
+
+from browser.connection import connection_pool_stats, request_http_stream
+from browser.content import HtmlContent
+from browser.protocols.http.body import BodyStream, iter_text
+from browser.renderer import _render_html_to_text, iter_html_text
+from tests.helpers import get_request, local_url
+
+
+def _split(data: bytes, size: int) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class TestBodyStream:
+    """Test reading a BodyStream."""
+
+    def test_read_sizes(self):
+        """Test read(size) regroups chunks."""
+        stream = BodyStream(iter([b"ab", b"cde", b"f"]))
+        assert stream.read(1) == b"a"
+        assert stream.read(3) == b"bcd"
+        assert stream.read() == b"ef"
+        assert stream.read(1) == b""
+        assert stream.complete
+
+    def test_close_callback(self):
+        """Test close callbacks learn whether the body was fully received."""
+        calls = []
+        stream = BodyStream(iter([b"a", b"b"]), calls.append)
+        stream.add_close_callback(calls.append)
+        next(iter(stream))
+        stream.close()
+        stream.close()
+        assert calls == [False, False]
+
+    def test_spool_moves_large_bodies_to_a_file(self):
+        """Test spool() keeps small bodies in memory and rolls large ones over."""
+        small = BodyStream(iter([b"x" * 10])).spool(max_memory=100)
+        large = BodyStream(iter([b"x" * 60, b"x" * 60])).spool(max_memory=100)
+        assert not small._rolled
+        assert large._rolled
+        assert large.read() == b"x" * 120
+
+    def test_spool_closes_file_when_receiving_fails(self, monkeypatch):
+        """Test spool() does not leave its file open when the body breaks off."""
+        files = []
+
+        class RecordedFile(tempfile.SpooledTemporaryFile):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                files.append(self)
+
+        def chunks():
+            yield b"x" * 10
+            raise ConnectionResetError
+
+        monkeypatch.setattr(tempfile, "SpooledTemporaryFile", RecordedFile)
+        with pytest.raises(ConnectionResetError):
+            BodyStream(chunks()).spool()
+        assert files[0].closed
+
+
+class TestStreamingResponse:
+    """Test streaming responses from a local server."""
+
+    def test_gzip_body_is_decompressed_while_read(self, http_server):
+        """Test a chunked gzip body arrives as decompressed chunks."""
+        body = b"".join(b"line %d\n" % i for i in range(20_000))
+        encoded = gzip.compress(body)
+        chunks = b"".join(b"%x\r\n%s\r\n" % (len(c), c) for c in _split(encoded, 4096))
+        raw = (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n"
+            b"Content-Encoding: gzip\r\n\r\n" + chunks + b"0\r\n\r\n"
+        )
+
+        with http_server(lambda _: raw) as port:
+            idle_before = connection_pool_stats().idle
+            response = request_http_stream(local_url(port), get_request())
+            received = list(response.body)
+
+            assert len(received) > 1
+            assert b"".join(received) == body
+            # Fully read bodies give the connection back to the pool
+            assert connection_pool_stats().idle == idle_before + 1
+
+    def test_read_buffers_the_rest(self, http_server):
+        """Test StreamingHttpResponse.read() returns an HttpResponse."""
+        raw = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+        with http_server(lambda _: raw) as port:
+            response = request_http_stream(local_url(port), get_request())
+            assert response.status_code == 200
+            assert response.read().body == b"hello"
+
+
+class TestLazyConsumers:
+    """Test consumers that work chunk by chunk."""
+
+    def test_iter_text_multibyte_split(self):
+        """Test a character split between chunks is decoded once."""
+        data = "héllo wörld ✓".encode()
+        assert "".join(iter_text(_split(data, 1), "utf-8")) == "héllo wörld ✓"
+
+    def test_iter_html_text_matches_buffered_rendering(self):
+        """Test incremental tag stripping matches the buffered renderer."""
+        html = "<html><body><p class='a'>1 &lt; 2</p>\n<b>x &gt; y</b></body></html>"
+        expected = _render_html_to_text(HtmlContent(html.encode()))
+        for size in (1, 2, 3, 5, len(html)):
+            chunks = [html[i : i + size] for i in range(0, len(html), size)]
+            assert "".join(iter_html_text(chunks)) == expected
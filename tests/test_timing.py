@@ -0,0 +1,119 @@
+import asyncio
+
+from browser.cache import InFlightFetches, MemoryCache
+from browser.connection import Connection
+from browser.content import PlainTextContent
+from browser.protocols.http.handler import HttpHandler
+from browser.protocols.http.request import HttpRequest, HttpRequestEncoder
+from browser.protocols.http.timing import (
+    ConnectTiming,
+    Phase,
+    ResourceTiming,
+    ResourceTimings,
+)
+from browser.url import HttpFamilyUrl, Url
+
+URL = HttpFamilyUrl.from_url(Url.parse("http://example.com/"))
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nok"
+
+
+def _timing(total: float, reused: bool = False) -> ResourceTiming:
+    return ResourceTiming(
+        fetch_start=0,
+        connect=None if reused else ConnectTiming(0, 1, 1, 3, 3, 6),
+        request_start=6,
+        response_start=6 + total / 2,
+        response_end=6 + total,
+        reused_connection=reused,
+        bytes_sent=10,
+        bytes_received=100,
+    )
+
+
+class TestResourceTiming:
+    def test_durations(self):
+        timing = _timing(4)
+        assert [timing.duration(phase) for phase in Phase] == [1, 2, 3, 2, 2, 10]
+
+    def test_reused_connection(self):
+        timing = _timing(4, reused=True)
+        assert timing.duration(Phase.DNS) is None
+        assert timing.duration(Phase.CONNECT) is None
+        assert timing.duration(Phase.TTFB) == 2
+
+    def test_started_at(self):
+        timing = _timing(4)
+        assert timing.started_at(-2).duration(Phase.TOTAL) == 12
+        assert timing.started_at(2) is timing
+
+
+class TestResourceTimings:
+    def test_percentiles(self):
+        timings = ResourceTimings()
+        for total in range(1, 101):
+            timings.record(URL, _timing(total, reused=total > 10))
+
+        assert timings.percentiles(Phase.TOTAL) == {50: 56, 90: 96, 99: 105}
+        assert timings.percentiles(Phase.TTFB, (0, 100)) == {0: 0.5, 100: 50}
+        assert timings.percentiles(Phase.DNS) == {50: 1, 90: 1, 99: 1}
+        stats = timings.stats()
+        assert (stats.entries, stats.reused_connections) == (100, 90)
+        assert (stats.bytes_sent, stats.bytes_received) == (1000, 10_000)
+
+    def test_bounded(self):
+        timings = ResourceTimings(max_entries=2)
+        for total in (1, 2, 3):
+            timings.record(URL, _timing(total))
+        assert [timing for _, timing in timings.entries()] == [_timing(2), _timing(3)]
+        timings.clear()
+        assert timings.percentiles(Phase.TOTAL) == {}
+
+
+class TestConnectionTiming:
+    def test_phases(self, http_server):
+        request = HttpRequest(
+            method="GET", path="/", headers={"Host": "127.0.0.1"}, version="1.1"
+        )
+        with http_server(lambda _: RESPONSE) as port:
+            connection = Connection.open("http", "127.0.0.1", port)
+            first = connection.request(request).timing
+            second = connection.request(request).timing
+            connection.close()
+
+        assert first is not None and second is not None
+        assert not first.reused_connection
+        assert first.connect == connection.connect_timing
+        assert first.duration(Phase.TLS) is None
+        assert first.bytes_sent == len(HttpRequestEncoder().encode(request))
+        assert first.bytes_received == len(RESPONSE)
+        assert (
+            first.fetch_start
+            <= first.request_start
+            <= first.response_start
+            <= first.response_end
+            <= second.request_start
+        )
+
+        assert second.reused_connection
+        assert second.connect is None
+        assert second.fetch_start == second.request_start
+
+    def test_handler_records(self, http_server):
+        timings = ResourceTimings()
+        handler = HttpHandler(
+            cache=MemoryCache(), in_flight=InFlightFetches(), timings=timings
+        )
+        with http_server(lambda _: RESPONSE) as port:
+            url = Url.parse(f"http://127.0.0.1:{port}/")
+            assert handler.fetch(url) == PlainTextContent("ok")
+            assert asyncio.run(
+                handler.fetch_async(Url.parse(f"http://127.0.0.1:{port}/async"))
+            ) == (PlainTextContent("ok"))
+
+        [(first_url, first), (second_url, second)] = timings.entries()
+        assert (first_url.path, second_url.path) == ("/", "/async")
+        for timing in (first, second):
+            assert timing.bytes_received == len(RESPONSE)
+            assert timing.connect is not None
+            # Started before the connection, when the cache was looked up
+            assert timing.fetch_start <= timing.connect.connect_start
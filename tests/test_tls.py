@@ -0,0 +1,74 @@
+import ssl
+from functools import partial
+
+import pytest
+
+from browser.connection import Connection
+from browser.tls import TlsSessionCache, configure_tls, get_ssl_context, tls_stats
+from tests.helpers import get_request
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+
+@pytest.fixture
+def tls_contexts(tls_certificate):
+    certfile, keyfile = tls_certificate
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(certfile, keyfile)
+    configure_tls(partial(ssl.create_default_context, cafile=certfile))
+    yield server_context, certfile
+    configure_tls(None)
+
+
+class TestTls:
+    """Test the shared SSLContext and session resumption."""
+
+    def test_contexts_are_shared(self, tls_contexts):
+        """Test connections offering the same ALPN protocols share a context."""
+        assert get_ssl_context() is get_ssl_context()
+        assert get_ssl_context(("h2",)) is get_ssl_context(("h2",))
+        assert get_ssl_context() is not get_ssl_context(("h2",))
+        configure_tls(None)
+        assert get_ssl_context().verify_mode == ssl.CERT_REQUIRED
+
+    @pytest.mark.parametrize(
+        "version", [ssl.TLSVersion.TLSv1_2, ssl.TLSVersion.TLSv1_3]
+    )
+    def test_reconnect_resumes_session(self, http_server, tls_contexts, version):
+        """Test a second connection to an origin does an abbreviated handshake."""
+        server_context, _ = tls_contexts
+        server_context.maximum_version = version
+        with http_server(lambda _: RESPONSE, server_context) as port:
+            before = tls_stats()
+            for _ in range(3):
+                connection = Connection.open("https", "127.0.0.1", port)
+                assert connection.request(get_request()).body == b"ok"
+                connection.close()
+            after = tls_stats()
+
+        assert after.full_handshakes - before.full_handshakes == 1
+        assert after.resumed_handshakes - before.resumed_handshakes == 2
+
+
+class TestTlsSessionCache:
+    """Test the per-origin session cache."""
+
+    def test_expired_and_evicted_sessions(self, http_server, tls_contexts):
+        """Test sessions past their timeout or beyond max_size are dropped."""
+        server_context, _ = tls_contexts
+        server_context.maximum_version = ssl.TLSVersion.TLSv1_2
+        with http_server(lambda _: RESPONSE, server_context) as port:
+            connection = Connection.open("https", "127.0.0.1", port)
+            session = connection._socket.session
+            connection.close()
+        assert isinstance(session, ssl.SSLSession)
+
+        now = [float(session.time)]
+        cache = TlsSessionCache(max_size=1, clock=lambda: now[0])
+        cache.set("a", 443, session)
+        cache.set("b", 443, session)
+        assert cache.get("a", 443) is None
+        assert cache.get("b", 443) is session
+        now[0] += session.timeout
+        assert cache.get("b", 443) is None
+        assert tls_stats().cached_sessions == 1